@@ -0,0 +1,138 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+Behavioral sequences coded with integers
+
+Each token of a sequence is a behavior or a co-occurrence of behaviors:
+    point event: the current states and the point behavior ("state1+state2+point")
+    start of state: the current states including the started behavior ("state1+state2")
+    stop of state: the remaining current states (no token if no remaining state)
+If modifiers are included, they are added to the token ("behavior&modifier1+modifier2").
+
+The tokens are coded with integers: vocabulary[code] is the text of token.
+"""
+
+from config import *
+import project_functions
+from lazy_modules import lazy_import
+
+np = lazy_import("numpy")
+
+TOKEN_BEHAVIORS_SEPARATOR = "+"
+TOKEN_MODIFIERS_SEPARATOR = "&"
+
+
+def _token(behaviors, modifiers, include_modifiers):
+    """
+    text of token
+    """
+    token = TOKEN_BEHAVIORS_SEPARATOR.join(behaviors)
+    if include_modifiers:
+        token += TOKEN_MODIFIERS_SEPARATOR + modifiers.replace("|", TOKEN_BEHAVIORS_SEPARATOR)
+    return token
+
+
+def subject_tokens(ethogram, events, subject, include_modifiers, codes):
+    """
+    codes of tokens of subject from events
+
+    Args:
+        ethogram (dict): ethogram of project
+        events (list): events of observation
+        subject (str): subject name (NO_FOCAL_SUBJECT for events without subject)
+        include_modifiers (bool): True for adding the modifiers to tokens
+        codes (dict): code of tokens by (current states, point behavior, modifiers). Updated with new tokens
+
+    Returns:
+        np.array: codes of tokens
+    """
+
+    subject_name = "" if subject == NO_FOCAL_SUBJECT else subject
+    current_states = []
+    sequence = []
+    for event in project_functions.events_start_stop(ethogram, events):
+        if event[EVENT_SUBJECT_FIELD_IDX] != subject_name:
+            continue
+
+        behavior, flag = event[EVENT_BEHAVIOR_FIELD_IDX], event[-1]
+        modifiers = event[EVENT_MODIFIER_FIELD_IDX] if include_modifiers else ""
+
+        if flag == POINT:
+            key = (tuple(current_states), behavior, modifiers)
+        elif flag == START:
+            current_states.append(behavior)
+            key = (tuple(current_states), "", modifiers)
+        else:  # STOP
+            if behavior in current_states:
+                current_states.remove(behavior)
+            if not current_states:
+                continue
+            key = (tuple(current_states), "", modifiers)
+
+        sequence.append(codes.setdefault(key, len(codes)))
+
+    return np.array(sequence, dtype=np.int32)
+
+
+def encode_sequences(pj, selected_observations, subject, include_modifiers, extra_tokens=[]):
+    """
+    behavioral sequences of subject in the selected observations (one sequence by observation)
+
+    Args:
+        pj (dict): project
+        selected_observations (list): list of observations id
+        subject (str): subject name
+        include_modifiers (bool): True for adding the modifiers to tokens
+        extra_tokens (list): tokens to add to vocabulary (e.g. not observed behaviors)
+
+    Returns:
+        list: list of np.array with codes of tokens
+        list: vocabulary (sorted text of tokens)
+    """
+
+    codes = {}
+    sequences = [subject_tokens(pj[ETHOGRAM], pj[OBSERVATIONS][obs_id][EVENTS], subject, include_modifiers, codes)
+                 for obs_id in selected_observations]
+
+    texts = [_token(list(states) + ([behavior] if behavior else []), modifiers, include_modifiers)
+             for states, behavior, modifiers in codes]
+
+    # sorted vocabulary: codes are remapped
+    vocabulary = sorted(set(texts) | set(extra_tokens))
+    vocabulary_idx = {token: idx for idx, token in enumerate(vocabulary)}
+    remap = np.array([vocabulary_idx[text] for text in texts], dtype=np.int32)
+
+    return [remap[sequence] for sequence in sequences], vocabulary
+
+
+def sequence_to_string(sequence, vocabulary, separator):
+    """
+    text of behavioral sequence (behavioral string)
+
+    Args:
+        sequence (np.array): codes of tokens
+        vocabulary (list): text of tokens
+        separator (str): separator between tokens
+
+    Returns:
+        str: behavioral string
+    """
+    return separator.join([vocabulary[code] for code in sequence])
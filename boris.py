@@ -24,6 +24,12 @@ This file is part of BORIS.
 
 import os
 import sys
+
+# import times of modules (must be started before the other imports)
+if "--profile-startup" in sys.argv:
+    import startup_profile
+    startup_profile.start()
+
 import platform
 import logging
 from optparse import OptionParser
@@ -31,20 +37,16 @@ import time
 import json
 from decimal import *
 import re
-import numpy as np
 import hashlib
 import subprocess
 import sqlite3
 import urllib.parse
-import urllib.request
 import urllib.error
 import tempfile
 import glob
-import statistics
 import datetime
-import multiprocessing
-import socket
 import copy
+import itertools
 import pathlib
 
 try:
@@ -62,13 +64,6 @@ except:
         logging.critical("PyQt4 not installed!\nTry PyQt4")
         sys.exit()
 
-
-import matplotlib
-matplotlib.use("Qt4Agg" if QT_VERSION_STR[0] == "4" else "Qt5Agg")
-import matplotlib.pyplot as plt
-import matplotlib.transforms as mtransforms
-from matplotlib import dates
-
 import select_observations
 import dialog
 from edit_event import *
@@ -81,8 +76,8 @@ import map_creator
 import behav_coding_map_creator
 import select_modifiers
 from utilities import *
-import tablib
 import observations_list
+import observations_summary
 import plot_spectrogram
 import coding_pad
 import subjects_pad
@@ -93,20 +88,36 @@ import qrc_boris
 from time_budget_widget import timeBudgetResults
 import select_modifiers
 import behaviors_coding_map
-import plot_events
 import project_functions
-import plot_data_module
+import ethogram_index
 import measurement_widget
 import irr
 import db_functions
 import export_observation
+import media_offsets
+import ffmpeg_jobs
+import time_budget_functions
+import behavioral_sequences
+import lag_sequential
+import project_server
+import observations_sync
+import observations_import
+from lazy_modules import lazy_import
+
+# heavy modules are loaded at their first use (faster start)
+np = lazy_import("numpy")
+tablib = lazy_import("tablib", required=True)
+matplotlib = lazy_import("matplotlib")
+plot_events = lazy_import("plot_events")
+plot_data_module = lazy_import("plot_data_module")
+vlc = lazy_import("vlc")
 
 
 __version__ = "6.1.1"
 __version_date__ = "2018-03-01"
 
-if platform.python_version() < "3.4":
-    logging.critical("BORIS requires Python 3.4+! You are using v. {}")
+if sys.version_info < (3, 7):
+    logging.critical("BORIS requires Python 3.7+! You are using v. {}".format(platform.python_version()))
     sys.exit()
 
 if sys.platform == "darwin":  # for MacOS
@@ -121,6 +132,8 @@ parser.add_option("-v", "--version", action="store_true", default=False, dest="v
 parser.add_option("-n", "--nosplashscreen", action="store_true", default=False, help="No splash screen")
 parser.add_option("-p", "--project", action="store", help="Project file")
 parser.add_option("-o", "--observation", action="store",  help="Observation id")
+parser.add_option("--profile-startup", action="store_true", default=False, dest="profile_startup",
+                  help="Print the import times of modules and the duration of the start steps")
 '''
 parser.add_option("-i", "--project-info", action="store_true", default=False, help="Project information")
 parser.add_option("-l", "--observations-list", action="store_true", default=False, help="List of observations")
@@ -140,79 +153,59 @@ if options.version:
     sys.exit(0)
 
 video, live = 0, 1
-FLAG_MATPLOTLIB_INSTALLED = True
+FLAG_MATPLOTLIB_INSTALLED = matplotlib is not None
+
+if options.profile_startup:
+    startup_profile.mark("imports")
+
+
+def check_vlc():
+    """
+    check if the VLC media player is available.
+    The VLC bindings are loaded at the first call (before the first media observation)
+
+    Returns:
+        bool: True if VLC is available
+        str: error message
+    """
+
+    try:
+        flag_vlc = vlc.dll is not None
+    except:
+        flag_vlc = False
+    if not flag_vlc:
+        logging.critical("VLC media player not found")
+        return False, "This program requires the VLC media player.<br>Go to http://www.videolan.org/vlc"
+
+    logging.debug("VLC version {}".format(vlc.libvlc_get_version().decode("utf-8")))
+    if vlc.libvlc_get_version().decode("utf-8") < VLC_MIN_VERSION:
+        logging.critical(("The VLC media player seems a little bit old... ({})."
+                          "Go to http://www.videolan.org/vlc to update it").format(vlc.libvlc_get_version()))
+        return False, ("The VLC media player seems very old ({}).<br>"
+                       "Go to http://www.videolan.org/vlc to update it").format(vlc.libvlc_get_version())
+
+    return True, ""
 
 
 class ProjectServerThread(QThread):
     """
-    thread for serving project to BORIS mobile app
+    thread for serving project to BORIS mobile app (see project_server)
     """
 
     signal = pyqtSignal(dict)
 
-    def __init__(self, message):
+    def __init__(self, message, observations=None):
         QThread.__init__(self)
-        self.message = message
+        self.server = project_server.ProjectServer(message, observations=observations, callback=self.signal.emit)
 
     def __del__(self):
         self.wait()
 
     def run(self):
+        self.server.run()
 
-        BUFFER_SIZE = 1024
-
-        s = socket.socket()
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.settimeout(1800)
-
-        s.bind((get_ip_address(), 0))
-        self.signal.emit({"URL": "{}:{}".format(s.getsockname()[0], s.getsockname()[1])})
-
-        s.listen(5)
-        while True:
-            try:
-                c, addr = s.accept()
-                logging.debug("Got connection from {}".format(addr))
-            except socket.timeout:
-                s.close()
-                logging.debug("Project server timeout")
-                self.signal.emit({"MESSAGE": "Project server timeout"})
-                return
-
-            rq = c.recv(BUFFER_SIZE)
-            logging.debug("request: {}".format(rq))
-
-            if rq == b"get":
-                msg = self.message
-                while msg:
-                    c.send(msg[0:BUFFER_SIZE])
-                    msg = msg[BUFFER_SIZE:]
-                c.close()
-                logging.debug("Project sent")
-                self.signal.emit({"MESSAGE": "Project sent to {}".format(addr[0])})
-
-            if rq == b"stop":
-                c.close()
-                logging.debug("server stopped")
-                self.signal.emit({"MESSAGE": "The server is now stopped"})
-                return
-
-            # receive an observation
-            if rq == b"put":
-                c.send(b"SEND")
-                c.close()
-                c2, addr = s.accept()
-                rq2 = b""
-                while 1:
-                    d = c2.recv(BUFFER_SIZE)
-                    if d:
-                        rq2 += d
-                        if rq2.endswith(b"#####"):
-                            break
-                    else:
-                        break
-                c2.close()
-                self.signal.emit({"RECEIVED": "{}".format(rq2.decode("utf-8")), "SENDER": addr})
+    def stop(self):
+        self.server.stop()
 
 
 class TempDirCleanerThread(QThread):
@@ -268,7 +261,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     pj = dict(EMPTY_PROJECT)
     project = False
-    ffmpeg_recode_process = None
+    recode_queue = None
     observationId = ""   # current observation id
     timeOffset = 0.0
     wrongTimeResponse = ""
@@ -318,6 +311,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     duration = []
     duration2 = []
+    # index of media files of players (durations in ms)
+    media_offsets_index = {PLAYER1: media_offsets.MediaOffsets([], []), PLAYER2: media_offsets.MediaOffsets([], [])}
 
     simultaneousMedia = False  # if second player was created
 
@@ -349,6 +344,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     ffmpeg_cache_dir = ""
     ffmpeg_cache_dir_max_size = 0
     frame_resize = 0
+    # number of FFmpeg processes running simultaneously
+    ffmpeg_jobs_number = ffmpeg_jobs.default_jobs_number()
 
     # dictionary for FPS storing
     fps, fps2 = {}, {}
@@ -622,7 +619,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.actionBehaviors_coding_map.setEnabled(flagObs)
 
         # Analysis
-        for w in [self.actionTime_budget, self.actionTime_budget_by_behaviors_category, self.actionTime_budget_report]: 
+        for w in [self.actionTime_budget, self.actionTime_budget_by_behaviors_category, self.actionTime_budget_report,
+                  self.actionTime_budget_by_time_windows]:
             w.setEnabled(self.pj[OBSERVATIONS] != {})
         # plot events
         self.menuPlot_events.setEnabled(FLAG_MATPLOTLIB_INSTALLED and self.pj[OBSERVATIONS] != {})
@@ -694,6 +692,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         self.actionAll_transitions.triggered.connect(lambda: self.transitions_matrix("frequency"))
         self.actionNumber_of_transitions.triggered.connect(lambda: self.transitions_matrix("number"))
+        self.actionLag_sequential_analysis.triggered.connect(self.lag_sequential_analysis)
         self.actionFrequencies_of_transitions_after_behaviors.triggered.connect(lambda: self.transitions_matrix(
                                                                                         "frequencies_after_behaviors"))
 
@@ -724,6 +723,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.actionTime_budget.triggered.connect(lambda: self.time_budget("by_behavior"))
         self.actionTime_budget_by_behaviors_category.triggered.connect(lambda: self.time_budget("by_category"))
         self.actionTime_budget_report.triggered.connect(lambda: self.time_budget("synthetic"))
+        self.actionTime_budget_by_time_windows.triggered.connect(self.time_budget_by_time_windows)
 
         self.actionPlot_events1.triggered.connect(self.plot_events1_triggered)
         self.actionPlot_events2.triggered.connect(self.plot_events2_triggered)
@@ -992,11 +992,50 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         send project to a device via socket
         """
 
+        def add_received_observation(obsId, observation, sender):
+            """
+            add an observation received from a device.
+            The user chooses to overwrite or rename the observation if the id already exists
+
+            Returns:
+                bool: False if canceled by user
+            """
+
+            if obsId in self.pj[OBSERVATIONS]:
+                response = dialog.MessageDialog(programName, ("An observation with the same id<br><b>{}</b><br>"
+                                                              "received from<br><b>{}</b><br>"
+                                                              "already exists in the current project.").format(
+                                                                                 obsId, sender[0]),
+                                                ["Overwrite it", "Rename received observation",
+                                                CANCEL])
+                if response == CANCEL:
+                    return False
+                self.projectChanged = True
+                if response == "Overwrite it":
+                    self.pj[OBSERVATIONS][obsId] = dict(observation)
+
+                if response == "Rename received observation":
+                    new_id = obsId
+                    while new_id in self.pj[OBSERVATIONS]:
+                        new_id, ok = QInputDialog.getText(self,
+                                                          "Rename observation received from {}".format(sender[0]),
+                                                          "New observation id:",
+                                                          QLineEdit.Normal,
+                                                          new_id)
+
+                    self.pj[OBSERVATIONS][new_id] = dict(observation)
+
+            else:
+                self.pj[OBSERVATIONS][obsId] = dict(observation)
+                self.projectChanged = True
+
+            return True
+
         def receive_signal(msg_dict):
 
             if "RECEIVED" in msg_dict:
                 try:
-                    sent_obs = json.loads(msg_dict["RECEIVED"][:-5])  # cut final
+                    sent_obs = json.loads(msg_dict["RECEIVED"])
                 except:
                     logging.debug("error receiving observation")
                     del self.w
@@ -1005,8 +1044,6 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
                 logging.debug("decoded {} length: {}".format(type(sent_obs), len(sent_obs)))
 
-                flag_msg = False
-                mem_obsid = ""
                 for obsId in sent_obs:
 
                     self.w.lwi.addItem(QListWidgetItem("{}: Observation {} received".format(
@@ -1014,36 +1051,37 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                                                     obsId)))
                     self.w.lwi.scrollToBottom()
 
-                    if obsId in self.pj[OBSERVATIONS]:
-                        flag_msg = True
-                        response = dialog.MessageDialog(programName, ("An observation with the same id<br><b>{}</b><br>"
-                                                                      "received from<br><b>{}</b><br>"
-                                                                      "already exists in the current project.").format(
-                                                                                         obsId, msg_dict["SENDER"][0]),
-                                                        ["Overwrite it", "Rename received observation",
-                                                        CANCEL])
-                        if response == CANCEL:
-                            return
-                        self.projectChanged = True
-                        if response == "Overwrite it":
-                            self.pj[OBSERVATIONS][obsId] = dict(sent_obs[obsId])
-
-                        if response == "Rename received observation":
-                            new_id = obsId
-                            while new_id in self.pj[OBSERVATIONS]:
-                                new_id, ok = QInputDialog.getText(self,
-                                                                  "Rename observation received from {}".format(
-                                                                                               msg_dict["SENDER"][0]),
-                                                                  "New observation id:",
-                                                                  QLineEdit.Normal,
-                                                                  new_id)
+                    if not add_received_observation(obsId, sent_obs[obsId], msg_dict["SENDER"]):
+                        return
 
-                            self.pj[OBSERVATIONS][new_id] = dict(sent_obs[obsId])
+            # observations synchronized by the project server: the new events are merged with the current events
+            elif "SYNCED" in msg_dict:
+                for obsId, change in msg_dict["SYNCED"].items():
+
+                    # times received in JSON are float
+                    if "observation" in change:
+                        observation_time_to_decimal(change["observation"])
+                    for event in change.get("events", []):
+                        event[EVENT_TIME_FIELD_IDX] = Decimal(str(event[EVENT_TIME_FIELD_IDX]))
+
+                    if obsId in self.pj[OBSERVATIONS] and "events" in change:
+                        merged, added = observations_sync.merge_events(self.pj[OBSERVATIONS][obsId][EVENTS],
+                                                                       change["events"])
+                        if merged is not None:
+                            if added:
+                                self.pj[OBSERVATIONS][obsId][EVENTS] = merged
+                                self.projectChanged = True
+                            continue
 
-                    else:
-                        self.pj[OBSERVATIONS][obsId] = dict(sent_obs[obsId])
+                    elif (obsId in self.pj[OBSERVATIONS] and change["status"] == observations_sync.UPDATED
+                          and observations_sync.observation_version(self.pj[OBSERVATIONS][obsId]) == change["version"]):
+                        self.pj[OBSERVATIONS][obsId] = dict(change["observation"])
                         self.projectChanged = True
-                        mem_obsid = obsId
+                        continue
+
+                    # new observation or observation modified in BORIS after the start of the server
+                    if not add_received_observation(obsId, change["observation"], msg_dict["SENDER"]):
+                        return
 
             elif "URL" in msg_dict:
                 self.tcp_port = int(msg_dict["URL"].split(":")[-1])
@@ -1080,53 +1118,78 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.server_thread = ProjectServerThread(message=str.encode(str(json.dumps(cp_project,
                                                                             indent=None,
                                                                             separators=(",", ":"),
-                                                                            default=decimal_default))))
+                                                                            default=decimal_default))),
+                                                     observations=copy.deepcopy(cp_project[OBSERVATIONS]))
             self.server_thread.signal.connect(receive_signal)
 
             self.server_thread.start()
 
             self.actionSend_project.setText("Stop serving project")
 
-        # send stop msg to project server
+        # stop the project server
         elif "serving" in self.actionSend_project.text():
-
-            s = socket.socket()
-            s.connect((get_ip_address(), self.tcp_port))
-            s.send(str.encode("stop"))
-            received = ""
-            while 1:
-                data = s.recv(20)  # BUFFER_SIZE = 20
-                if not data:
-                    break
-                received += data
-            s.close
+            self.server_thread.stop()
 
 
     def recode_resize_video(self):
         """
         re-encode video with ffmpeg
+        The videos are re-encoded by a queue of concurrent FFmpeg jobs.
+        The state of the queue is saved in RECODE_QUEUE_STATE_FILE: an interrupted queue can be resumed
+        (the videos already re-encoded are skipped)
         """
 
-        timerFFmpegRecoding = QTimer()
-
         def timerFFmpegRecoding_timeout():
             """
-            check if process finished
+            show progress of jobs and check if queue finished
             """
-            if not self.ffmpeg_recode_process.is_alive():
-                timerFFmpegRecoding.stop()
+            for idx, job in enumerate(self.recode_queue.jobs):
+                self.w.lwi.item(idx).setText("{status}{progress}\t{file_name}".format(
+                    status=job["status"],
+                    progress=" {:.0%}".format(job.get("progress", 0)) if job["status"] == ffmpeg_jobs.RUNNING else "",
+                    file_name=job["input"]))
+
+            if self.recode_queue.is_finished():
+                self.timerFFmpegRecoding.stop()
                 self.w.hide()
                 del(self.w)
-                self.ffmpeg_recode_process = None
 
-        if self.ffmpeg_recode_process:
+                failed_jobs = [job for job in self.recode_queue.jobs if job["status"] == ffmpeg_jobs.FAILED]
+                if self.recode_queue.count(ffmpeg_jobs.DONE) == len(self.recode_queue.jobs):
+                    self.recode_queue.remove_state()
+                QMessageBox.information(self, programName,
+                                        ("Re-encoding finished.\n\n"
+                                         "{done} file(s) re-encoded\n{failed} failed\n{canceled} canceled").format(
+                                             done=self.recode_queue.count(ffmpeg_jobs.DONE),
+                                             failed=len(failed_jobs),
+                                             canceled=self.recode_queue.count(ffmpeg_jobs.CANCELED))
+                                        + ("\n\n" + "\n".join(["{}: {}".format(job["input"], job["error"])
+                                                                 for job in failed_jobs]) if failed_jobs else ""))
+                self.recode_queue = None
+
+        if self.recode_queue:
             QMessageBox.warning(self, programName, "BORIS is already re-encoding a video...")
             return
 
-        fn = QFileDialog(self).getOpenFileNames(self, "Select one or more media files to re-encode/resize", "", "Media files (*)")
-        fileNames = fn[0] if type(fn) is tuple else fn
+        state_file = str(pathlib.Path(os.path.expanduser("~")) / RECODE_QUEUE_STATE_FILE)
+        jobs = ffmpeg_jobs.load_state(state_file)
+        if ffmpeg_jobs.unfinished_jobs(jobs):
+            response = dialog.MessageDialog(programName,
+                                            ("A previous re-encoding was interrupted "
+                                             "({} file(s) to re-encode).\n\nResume it?").format(len(ffmpeg_jobs.unfinished_jobs(jobs))),
+                                            [YES, NO, CANCEL])
+            if response == CANCEL:
+                return
+            if response == NO:
+                jobs = []
+        else:
+            jobs = []
 
-        if fileNames:
+        if not jobs:
+            fn = QFileDialog(self).getOpenFileNames(self, "Select one or more media files to re-encode/resize", "", "Media files (*)")
+            fileNames = fn[0] if type(fn) is tuple else fn
+            if not fileNames:
+                return
 
             horiz_resol, ok = QInputDialog.getInt(self, "", ("Horizontal resolution (in pixels)\nThe aspect ratio will be maintained"),
                                                   1024, 352, 2048, 20)
@@ -1134,12 +1197,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 return
 
             # check if recoded files already exist
-            files_list = []
-            for file_name in fileNames:
-                if os.path.isfile("{input}.re-encoded.{horiz_resol}px.avi".format(input=file_name,
-                                                                                  horiz_resol=horiz_resol)):
-                    files_list.append("{input}.re-encoded.{horiz_resol}px.avi".format(input=file_name,
-                                                                                      horiz_resol=horiz_resol))
+            files_list = [ffmpeg_jobs.recode_output(file_name, horiz_resol) for file_name in fileNames
+                          if os.path.isfile(ffmpeg_jobs.recode_output(file_name, horiz_resol))]
             if files_list:
                 response = dialog.MessageDialog(programName, "Some file(s) already exist.\n\n" + "\n".join(files_list),
                                                 ["Overwrite all",
@@ -1147,27 +1206,30 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 if response == CANCEL:
                     return
 
-            self.w = recode_widget.Info_widget()
-            self.w.lwi.setVisible(False)
-            self.w.resize(350, 100)
-            self.w.setWindowFlags(Qt.WindowStaysOnTopHint)
-            self.w.setWindowTitle("Re-encoding and resizing with FFmpeg")
-            self.w.label.setText("This operation can be long. Be patient...\n\n" + "\n".join(fileNames))
-            self.w.show()
+            jobs = ffmpeg_jobs.recode_jobs(fileNames, horiz_resol, ffmpeg_bin)
 
-            # check in platform win and program frozen by pyinstaller
-            if sys.platform.startswith("win") and getattr(sys, "frozen", False):
-                app.processEvents()
-                ffmpeg_recode(fileNames, horiz_resol, ffmpeg_bin)
-                self.w.hide()
-            else:
+        jobs_number, ok = QInputDialog.getInt(self, "Re-encoding", "Number of files re-encoded at the same time",
+                                              self.ffmpeg_jobs_number, 1, 64, 1)
+        if not ok:
+            return
+        self.ffmpeg_jobs_number = jobs_number
 
-                self.ffmpeg_recode_process = multiprocessing.Process(target=ffmpeg_recode,
-                                                                     args=(fileNames, horiz_resol, ffmpeg_bin,))
-                self.ffmpeg_recode_process.start()
+        self.recode_queue = ffmpeg_jobs.JobQueue(jobs, max_workers=jobs_number, state_file=state_file)
 
-                timerFFmpegRecoding.timeout.connect(timerFFmpegRecoding_timeout)
-                timerFFmpegRecoding.start(15000)
+        self.w = recode_widget.Info_widget()
+        self.w.resize(500, 300)
+        self.w.setWindowFlags(Qt.WindowStaysOnTopHint)
+        self.w.setWindowTitle("Re-encoding and resizing with FFmpeg")
+        self.w.label.setText("This operation can be long. Be patient...")
+        for job in self.recode_queue.jobs:
+            self.w.lwi.addItem("{}\t{}".format(job["status"], job["input"]))
+        self.w.show()
+
+        self.recode_queue.start()
+
+        self.timerFFmpegRecoding = QTimer()
+        self.timerFFmpegRecoding.timeout.connect(timerFFmpegRecoding_timeout)
+        self.timerFFmpegRecoding.start(1000)
 
 
     def click_signal_from_coding_pad(self, behaviorCode):
@@ -1437,11 +1499,26 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             QMessageBox.warning(self, programName, "<b>{}</b> is not recognized as time offset".format(text))
             return
 
+        response = dialog.MessageDialog(programName, ("Extract the events by copying the media streams "
+                                                      "(fast, the clips start at the keyframe preceding the event) "
+                                                      "or by re-encoding the media (slow, accurate)?"),
+                                        [COPY_STREAMS, RE_ENCODE, CANCEL])
+        if response == CANCEL:
+            return
+        stream_copy = (response == COPY_STREAMS)
+
+        jobs_number, ok = QInputDialog.getInt(self, programName, "Number of events extracted simultaneously:",
+                                              self.ffmpeg_jobs_number, 1, 64, 1)
+        if not ok:
+            return
+        self.ffmpeg_jobs_number = jobs_number
+
         flagUnpairedEventFound = False
 
         cursor = db_functions.load_events_in_db(self.pj, plot_parameters["selected subjects"],
                                                 selectedObservations, plot_parameters["selected behaviors"])
 
+        jobs = []
         for obsId in selectedObservations:
 
             for nplayer in [PLAYER1, PLAYER2]:
@@ -1449,17 +1526,18 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 if not self.pj[OBSERVATIONS][obsId][FILE][nplayer]:
                     continue
 
-                duration1 = []   # in seconds
-                for mediaFile in self.pj[OBSERVATIONS][obsId][FILE][nplayer]:
-                    duration1.append(self.pj[OBSERVATIONS][obsId]["media_info"]["length"][mediaFile])
+                media_index = media_offsets.observation_media_offsets(self.pj[OBSERVATIONS][obsId], nplayer)
 
-                logging.debug("duration player {}: {}".format(nplayer, duration1))
+                logging.debug("duration player {}: {}".format(nplayer, media_index.durations))
+                if not len(media_index):
+                    logging.warning("media info not found for player {} in observation {}".format(nplayer, obsId))
+                    continue
 
                 for subject in plot_parameters["selected subjects"]:
 
                     for behavior in plot_parameters["selected behaviors"]:
 
-                        cursor.execute("SELECT occurence FROM events WHERE observation = ? AND subject = ? AND code = ?",
+                        cursor.execute("SELECT occurence FROM events WHERE observation = ? AND subject = ? AND code = ? ORDER BY occurence",
                                        (obsId, subject, behavior))
                         rows = [{"occurence": float2decimal(r["occurence"])} for r in cursor.fetchall()]
 
@@ -1469,12 +1547,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
                         for idx, row in enumerate(rows):
 
-                            mediaFileIdx = [idx1 for idx1, x in enumerate(duration1)
-                                            if row["occurence"] >= sum(duration1[0:idx1])][-1]
+                            mediaFileIdx = media_index.media_index(row["occurence"])
+                            media_file = self.pj[OBSERVATIONS][obsId][FILE][nplayer][mediaFileIdx]
 
                             globalStart = Decimal("0.000") if row["occurence"] < timeOffset else round(
                                                                                        row["occurence"] - timeOffset, 3)
-                            start = round(row["occurence"] - timeOffset - float2decimal(sum(duration1[0:mediaFileIdx])), 3)
+                            start = round(row["occurence"] - timeOffset - float2decimal(media_index.offset(mediaFileIdx)), 3)
                             if start < timeOffset:
                                 start = Decimal("0.000")
 
@@ -1482,66 +1560,91 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
                                 globalStop = round(row["occurence"] + timeOffset, 3)
 
-                                stop = round(row["occurence"] + timeOffset - float2decimal(sum(duration1[0:mediaFileIdx])), 3)
-
-                                ffmpeg_command = ('"{ffmpeg_bin}" -i "{input}" -y -ss {start} -to {stop}'
-                                                  ' "{dir}{sep}{obsId}_{player}_{subject}_{behavior}_{globalStart}'
-                                                  '-{globalStop}{extension}" ').format(
-                                                          ffmpeg_bin=ffmpeg_bin,
-                                                          input=self.pj[OBSERVATIONS][obsId][FILE][nplayer][mediaFileIdx],
-                                                          start=start,
-                                                          stop=stop,
-                                                          globalStart=globalStart,
-                                                          globalStop=globalStop,
-                                                          dir=exportDir,
-                                                          sep=os.sep,
-                                                          obsId=obsId,
-                                                          player="PLAYER{}".format(nplayer),
-                                                          subject=subject,
-                                                          behavior=behavior,
-                                                          extension=".mp4")
-
-                                logging.debug("ffmpeg command: {}".format(ffmpeg_command))
-                                p = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                                     shell=True)
-                                out, error = p.communicate()
+                                stop = round(row["occurence"] + timeOffset - float2decimal(media_index.offset(mediaFileIdx)), 3)
 
-                            if STATE in self.eventType(behavior).upper():
-                                if idx % 2 == 0:
+                            elif STATE in self.eventType(behavior).upper():
+                                if idx % 2:
+                                    continue
 
-                                    globalStop = round(rows[idx + 1]["occurence"] + timeOffset, 3)
-
-                                    stop = round(rows[idx + 1]["occurence"] + timeOffset -
-                                                 float2decimal(sum(duration1[0:mediaFileIdx])), 3)
-
-                                    # check if start after length of media
-                                    if start > self.pj[OBSERVATIONS][obsId]["media_info"]["length"][self.pj[OBSERVATIONS]
-                                                                                                           [obsId][FILE]
-                                                                                                           [nplayer]
-                                                                                                           [mediaFileIdx]]:
-                                        continue
-
-                                    ffmpeg_command = ('"{ffmpeg_bin}" -i "{input}" -y -ss {start} -to {stop} '
-                                                      '"{dir}{sep}{obsId}_{player}_{subject}_{behavior}_{globalStart}'
-                                                      '-{globalStop}{extension}" ').format(
-                                                      ffmpeg_bin=ffmpeg_bin,
-                                                      input=self.pj[OBSERVATIONS][obsId][FILE][nplayer][mediaFileIdx],
-                                                      start=start,
-                                                      stop=stop,
-                                                      globalStart=globalStart,
-                                                      globalStop=globalStop,
-                                                      dir=exportDir,
-                                                      sep=os.sep,
-                                                      obsId=obsId,
-                                                      player="PLAYER{}".format(nplayer),
-                                                      subject=subject,
-                                                      behavior=behavior,
-                                                      extension=".mp4")
-
-                                    logging.debug("ffmpeg command: {}".format(ffmpeg_command))
-                                    p = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                                         shell=True)
-                                    out, error = p.communicate()
+                                globalStop = round(rows[idx + 1]["occurence"] + timeOffset, 3)
+
+                                stop = round(rows[idx + 1]["occurence"] + timeOffset -
+                                             float2decimal(media_index.offset(mediaFileIdx)), 3)
+
+                                # check if start after length of media
+                                if start > self.pj[OBSERVATIONS][obsId]["media_info"]["length"][media_file]:
+                                    continue
+                            else:
+                                continue
+
+                            # streams copied in the container of media file
+                            extension = pathlib.Path(media_file).suffix if stream_copy else ".mp4"
+
+                            output_file = ("{dir}{sep}{obsId}_{player}_{subject}_{behavior}_{globalStart}"
+                                           "-{globalStop}{extension}").format(dir=exportDir,
+                                                                              sep=os.sep,
+                                                                              obsId=obsId,
+                                                                              player="PLAYER{}".format(nplayer),
+                                                                              subject=subject,
+                                                                              behavior=behavior,
+                                                                              globalStart=globalStart,
+                                                                              globalStop=globalStop,
+                                                                              extension=extension)
+
+                            jobs.append({"command": ffmpeg_jobs.clip_command(self.ffmpeg_bin, media_file, start, stop,
+                                                                             output_file, stream_copy=stream_copy),
+                                         "output": output_file,
+                                         "info": {"observation": obsId,
+                                                  "player": nplayer,
+                                                  "subject": subject,
+                                                  "behavior": behavior,
+                                                  "start": globalStart,
+                                                  "stop": globalStop,
+                                                  "media file": media_file,
+                                                  "media start": start,
+                                                  "media stop": stop}})
+
+        if not jobs:
+            QMessageBox.warning(self, programName, "No event to extract" +
+                                ("<br>Some state events are not paired" if flagUnpairedEventFound else ""))
+            return
+
+        queue = ffmpeg_jobs.JobQueue(jobs, jobs_number)
+
+        progress = QProgressDialog("Extracting events with FFmpeg...", "Cancel", 0, len(jobs), self)
+        progress.setWindowTitle(programName)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.setAutoClose(False)
+
+        queue.start()
+        while not queue.is_finished():
+            if progress.wasCanceled() and not queue.canceled:
+                queue.cancel()
+            progress.setValue(len(jobs) - queue.count(ffmpeg_jobs.PENDING) - queue.count(ffmpeg_jobs.RUNNING))
+            app.processEvents()
+            time.sleep(0.05)
+        queue.wait()
+        progress.close()
+
+        manifest_file = str(pathlib.Path(exportDir) / ffmpeg_jobs.MANIFEST_FILE_NAME)
+        r, msg = ffmpeg_jobs.write_manifest(manifest_file, jobs,
+                                            ["observation", "player", "subject", "behavior", "start", "stop",
+                                             "media file", "media start", "media stop"])
+
+        out = ("{done} event(s) extracted<br>"
+               "{failed} error(s)<br>"
+               "{canceled} canceled").format(done=queue.count(ffmpeg_jobs.DONE),
+                                             failed=queue.count(ffmpeg_jobs.FAILED),
+                                             canceled=queue.count(ffmpeg_jobs.CANCELED))
+        if flagUnpairedEventFound:
+            out += "<br><br>Some state events are not paired and were not extracted"
+        if r:
+            out += "<br><br>The list of extracted events was saved in <b>{}</b>".format(manifest_file)
+        else:
+            out += "<br><br>Error writing the list of extracted events:<br>{}".format(msg)
+
+        QMessageBox.information(self, programName, out)
 
 
     def generate_spectrogram(self):
@@ -1905,9 +2008,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             if not selectedObservations:
                 return
     
+            checks = project_functions.check_state_events(self.pj, selectedObservations, self.timeFormat)
             for obsId in sorted(selectedObservations):
-                r, msg = project_functions.check_state_events_obs(obsId, self.pj[ETHOGRAM],
-                                                                  self.pj[OBSERVATIONS][obsId], self.timeFormat)
+                r, msg = checks[obsId]
 
                 tot_out += "<strong>{}</strong><br>{}<br>".format(obsId, msg)
 
@@ -1963,6 +2066,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """
         check BORIS web site for updates
         """
+        import urllib.request
         try:
             versionURL = "http://www.boris.unito.it/static/ver4.dat"
             lastVersion = urllib.request.urlopen(versionURL).read().strip().decode("utf-8")
@@ -2028,7 +2132,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
                     elif self.media_list.count() > 1:
 
-                        if newTime < sum(self.duration):
+                        if newTime < self.media_offsets_index[PLAYER1].total:
 
                             # remember if player paused (go previous will start playing)
                             flagPaused = self.mediaListPlayer.get_state() == vlc.State.Paused
@@ -2047,15 +2151,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                                         self.mediaListPlayer.pause()
 
                                     self.mediaplayer.set_time(newTime -
-                                                              sum(self.duration[0: self.media_list.index_of_item(
-                                                                                     self.mediaplayer.get_media())]))
+                                                              self.media_offsets_index[PLAYER1].offset(self.media_list.index_of_item(
+                                                                                     self.mediaplayer.get_media())))
 
                                     break
                                 tot += d
                         else:
                             QMessageBox.warning(self, programName,
                                                 "The indicated position is behind the total media duration ({})".format(
-                                                      seconds2time(sum(self.duration)/1000)))
+                                                      seconds2time(self.media_offsets_index[PLAYER1].total/1000)))
 
                     self.timer_out()
                     self.timer_spectro_out()
@@ -2403,14 +2507,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             currentMedia
             frameCurrentMedia
         """
-        currentMedia, frameCurrentMedia = "", 0
         frameMs = 1000 / fps
-        for idx, media in enumerate(self.pj[OBSERVATIONS][self.observationId][FILE][player]):
-            if requiredFrame * frameMs < sum(self.duration[0:idx + 1]):
-                currentMedia = media
-                frameCurrentMedia = requiredFrame - sum(self.duration[0:idx]) / frameMs
-                break
-        return currentMedia, round(frameCurrentMedia)
+        media_index = self.media_offsets_index[player]
+        if requiredFrame * frameMs >= media_index.total:
+            return "", 0
+        idx = media_index.media_index(requiredFrame * frameMs)
+        return media_index.media_files[idx], round(requiredFrame - media_index.offset(idx) / frameMs)
 
 
     def getCurrentMediaByTime(self, player, obsId, globalTime):
@@ -2423,14 +2525,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         currentMedia
         frameCurrentMedia
         """
-        currentMedia, currentMediaTime = '', 0
         globalTimeMs = globalTime * 1000
-
-        for idx, media in enumerate(self.pj[OBSERVATIONS][obsId][FILE][player]):
-            if globalTimeMs < sum(self.duration[0:idx + 1]):
-                currentMedia = media
-                currentMediaTime = globalTimeMs - sum(self.duration[0:idx])
-                break
+        currentMedia, currentMediaTime = self.media_offsets_index[player].locate(globalTimeMs)
 
         return currentMedia, round(currentMediaTime/1000, 3)
 
@@ -2494,10 +2590,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         requiredFrame = self.FFmpegGlobalFrame + 1
 
         logging.debug("required frame 1: {}".format(requiredFrame))
-        logging.debug("sum self.duration1 {}".format(sum(self.duration)))
+        logging.debug("sum self.duration1 {}".format(self.media_offsets_index[PLAYER1].total))
 
         # check if end of last media
-        if requiredFrame * frameMs >= sum(self.duration):
+        if requiredFrame * frameMs >= self.media_offsets_index[PLAYER1].total:
             logging.debug("end of last media 1 frame: {}".format(requiredFrame))
             return
 
@@ -2699,8 +2795,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.lb_current_media_time.setText(time_str)
 
         # extract State events
-        StateBehaviorsCodes = [self.pj[ETHOGRAM][x]["code"] for x in [y for y in self.pj[ETHOGRAM]
-                               if "State" in self.pj[ETHOGRAM][y][TYPE]]]
+        StateBehaviorsCodes = self.ethogram_index().state_codes
 
         self.currentStates = {}
 
@@ -3032,6 +3127,11 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         logging.debug("initialize new observation for VLC")
 
+        ok, msg = check_vlc()
+        if not ok:
+            QMessageBox.critical(self, programName, msg)
+            return False
+
         useMediaFromProjectDirectory = NO
 
         #if not self.check_if_media_available():
@@ -3145,6 +3245,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.fps[mediaFile] = mediaFPS
             self.media_list.add_media(media)
 
+        self.media_offsets_index = {PLAYER1: media_offsets.MediaOffsets(self.pj[OBSERVATIONS][self.observationId][FILE][PLAYER1],
+                                                                        self.duration),
+                                    PLAYER2: media_offsets.MediaOffsets([], [])}
+
         # add media list to media player list
         self.mediaListPlayer.set_media_list(self.media_list)
 
@@ -3248,6 +3352,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
                     self.media_list2.add_media(media)
 
+                self.media_offsets_index[PLAYER2] = media_offsets.MediaOffsets(
+                                                        self.pj[OBSERVATIONS][self.observationId][FILE][PLAYER2], self.duration2)
+
                 self.mediaListPlayer2.set_media_list(self.media_list2)
 
                 if self.embedPlayer:
@@ -3351,77 +3458,29 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.plot_data = {}
             self.ext_data_timer_list = []
 
-            count = 0
-
-            for idx in self.pj[OBSERVATIONS][self.observationId][PLOT_DATA]:
-                
-                if count == 0:
-                    
-                    w1 = plot_data_module.Plot_data(self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["file_path"],
-                                                                 int(self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["time_interval"]),
-                                                                 int(self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["time_offset"]),
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["color"],
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["title"],
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["variable_name"],
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["columns"],
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["substract_first_value"],
-                                                                 self.pj[CONVERTERS] if CONVERTERS in self.pj else {},
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["converters"],
-                                                                 log_level=logging.getLogger().getEffectiveLevel()
-                                                                 )
-
-                    if w1.error_msg:
-                        QMessageBox.critical(self, programName, "Impossibile to plot data from file {}:\n{}".format(os.path.basename(self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["file_path"]),
-                                                                                                             w1.error_msg))
-                        del w1
-                        return False
-
-                    w1.setWindowFlags(Qt.WindowStaysOnTopHint)
-                    w1.sendEvent.connect(self.signal_from_widget)
-
-                    w1.show()
+            # all external data files are displayed in one window sharing the time axis
+            w = plot_data_module.Plot_data_multi([self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]
+                                                  for idx in sorted_keys(self.pj[OBSERVATIONS][self.observationId][PLOT_DATA])],
+                                                 self.pj[CONVERTERS] if CONVERTERS in self.pj else {},
+                                                 log_level=logging.getLogger().getEffectiveLevel()
+                                                 )
 
-                    self.ext_data_timer_list.append(QTimer())
-                    self.ext_data_timer_list[-1].setInterval(w1.time_out)
-                    self.ext_data_timer_list[-1].timeout.connect(lambda: self.timer_plot_data_out(w1))
-                    self.ext_data_timer_list[-1].start()
-                    
-                    self.plot_data[count] = w1
+            if w.error_msg:
+                QMessageBox.critical(self, programName, "Impossibile to plot external data:\n{}".format(w.error_msg))
+                del w
+                return False
 
-                
-                if count == 1:
-                    w2 = plot_data_module.Plot_data(self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["file_path"],
-                                                                 int(self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["time_interval"]),
-                                                                 int(self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["time_offset"]),
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["color"],
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["title"],
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["variable_name"],
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["columns"],
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["substract_first_value"],
-                                                                 self.pj[CONVERTERS] if CONVERTERS in self.pj else {},
-                                                                 self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["converters"],
-                                                                 log_level=logging.getLogger().getEffectiveLevel()
-                                                                 )
-
-                    if w2.error_msg:
-                        QMessageBox.critical(self, programName, "Impossibile to plot data from file {}:\n{}".format(os.path.basename(self.pj[OBSERVATIONS][self.observationId][PLOT_DATA][idx]["file_path"]),
-                                                                                                             w2.error_msg))
-                        del w2
-                        return False
+            w.setWindowFlags(Qt.WindowStaysOnTopHint)
+            w.sendEvent.connect(self.signal_from_widget)
 
-                    w2.setWindowFlags(Qt.WindowStaysOnTopHint)
-                    w2.sendEvent.connect(self.signal_from_widget)
+            w.show()
 
-                    w2.show()
-                    self.ext_data_timer_list.append(QTimer())
-                    self.ext_data_timer_list[-1].setInterval(w2.time_out)
-                    self.ext_data_timer_list[-1].timeout.connect(lambda: self.timer_plot_data_out(w2))
-                    self.ext_data_timer_list[-1].start()
-                    
-                    self.plot_data[count] = w2
+            self.ext_data_timer_list.append(QTimer())
+            self.ext_data_timer_list[-1].setInterval(w.time_out)
+            self.ext_data_timer_list[-1].timeout.connect(lambda: self.timer_plot_data_out(w))
+            self.ext_data_timer_list[-1].start()
 
-
-                count += 1
+            self.plot_data[0] = w
 
         # check if "filtered behaviors"
         if FILTERED_BEHAVIORS in self.pj[OBSERVATIONS][self.observationId]:
@@ -3432,7 +3491,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def timer_plot_data_out(self, w):
         """
-        update plot in w (Plot_data class)
+        update plot in w (Plot_data_multi class)
         triggered by timers in self.ext_data_timer_list
         """
         w.update_plot(self.getLaps())
@@ -3464,6 +3523,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         load events in table widget and update START/STOP
         """
 
+        # events may have been modified in place
+        observations_summary.invalidate(obsId)
+
         self.twEvents.setRowCount(len(self.pj[OBSERVATIONS][obsId][EVENTS]))
         row = 0
 
@@ -3922,7 +3984,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                     if mode == EDIT:
                         self.loadEventsInTW(self.observationId)
 
-                    self.initialize_new_observation_vlc()
+                    if not self.initialize_new_observation_vlc():
+                        self.observationId = ""
+                        self.twEvents.setRowCount(0)
 
                 self.menu_options()
 
@@ -4295,6 +4359,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             except:
                 self.ffmpeg_cache_dir_max_size = 0
 
+            try:
+                self.ffmpeg_jobs_number = int(settings.value("ffmpeg_jobs_number"))
+                if self.ffmpeg_jobs_number < 1:
+                    self.ffmpeg_jobs_number = ffmpeg_jobs.default_jobs_number()
+            except:
+                self.ffmpeg_jobs_number = ffmpeg_jobs.default_jobs_number()
+
             # frame-by-frame
             try:
                 self.frame_resize = int(settings.value("frame_resize"))
@@ -4403,6 +4474,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # FFmpeg
         settings.setValue("ffmpeg_cache_dir", self.ffmpeg_cache_dir)
         settings.setValue("ffmpeg_cache_dir_max_size", self.ffmpeg_cache_dir_max_size)
+        settings.setValue("ffmpeg_jobs_number", self.ffmpeg_jobs_number)
         # frame-by-frame
         settings.setValue("frame_resize", self.frame_resize)
 
@@ -4443,14 +4515,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.lbTimeOffset.clear()
 
 
+    def ethogram_index(self):
+        """
+        lookup indexes of ethogram and subjects of current project (see ethogram_index module)
+
+        Returns:
+            ethogram_index.EthogramIndex: index
+        """
+        return ethogram_index.get_index(self.pj[ETHOGRAM], self.pj[SUBJECTS])
+
+
     def eventType(self, code):
         """
         returns type of event for code
         """
-        for idx in self.pj[ETHOGRAM]:
-            if self.pj[ETHOGRAM][idx]['code'] == code:
-                return self.pj[ETHOGRAM][idx][TYPE]
-        return None
+        behavior = self.ethogram_index().behavior(code)
+        return behavior[TYPE] if behavior is not None else None
 
 
     def extract_observed_behaviors(self, selected_observations, selectedSubjects):
@@ -4663,341 +4743,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         mode must be in ("by_behavior", "by_category", "synthetic")
         """
 
-        def time_budget_analysis(cursor, plot_parameters, by_category=False):
-            """
-            extract number of occurrences, total duration, mean ...
-            if start_time = 0 and end_time = 0 all events are extracted
-            """
-
-            categories, out = {}, []
-            for subject in plot_parameters["selected subjects"]:
-                out_cat, categories[subject] = [], {}
-
-                for behavior in plot_parameters["selected behaviors"]:
-
-                    if plot_parameters["include modifiers"]:
-
-                        cursor.execute("SELECT distinct modifiers FROM events WHERE subject = ? AND code = ?", (subject, behavior))
-                        distinct_modifiers = list(cursor.fetchall())
-
-                        if not distinct_modifiers:
-                            if not plot_parameters["exclude behaviors"]:
-
-                                if {self.pj[ETHOGRAM][idx]["type"] for idx in self.pj[ETHOGRAM] if self.pj[ETHOGRAM][idx]["code"] == behavior} == {"State event"}:
-                                    out.append({"subject": subject,
-                                            "behavior": behavior,
-                                            "modifiers": "-",
-                                            "duration": 0,
-                                            "duration_mean": 0,
-                                            "duration_stdev": "NA",
-                                            "number": "0",
-                                            "inter_duration_mean": "NA",
-                                            "inter_duration_stdev": "NA"})
-                                else: # point 
-                                    out.append({"subject": subject,
-                                            "behavior": behavior,
-                                            "modifiers": "-",
-                                            "duration": "NA",
-                                            "duration_mean": "NA",
-                                            "duration_stdev": "NA",
-                                            "number": "0",
-                                            "inter_duration_mean": "NA",
-                                            "inter_duration_stdev": "NA"})
-                            continue
-
-                        if POINT in self.eventType(behavior).upper():
-                            for modifier in distinct_modifiers:
-
-                                cursor.execute(("SELECT occurence, observation FROM events "
-                                                "WHERE subject = ? "
-                                                "AND code = ? "
-                                                "AND modifiers = ? "
-                                                "ORDER BY observation, occurence"),
-                                               (subject, behavior, modifier[0]))
-
-                                '''
-                                if not plot_parameters["start time"] and not plot_parameters["end time"]:
-                                    cursor.execute("""SELECT occurence, observation FROM events
-                                                        WHERE subject = ? 
-                                                            AND code = ? 
-                                                            AND modifiers = ? 
-                                                            ORDER BY observation, occurence""",
-                                                   (subject, behavior, modifier[0]))
-
-                                else:
-                                    cursor.execute("""SELECT occurence,observation FROM events 
-                                                        WHERE subject = ? 
-                                                            AND code = ?
-                                                            AND modifiers = ?
-                                                            AND occurence BETWEEN ? and ? 
-                                                            ORDER BY observation, occurence""",
-                                                   (subject, behavior, modifier[0], str(plot_parameters["start time"]), str(plot_parameters["end time"])))
-                                '''
-
-                                rows = cursor.fetchall()
-
-                                # inter events duration
-                                all_event_interdurations = []
-                                for idx, row in enumerate(rows):
-                                    if idx and row[1] == rows[idx - 1][1]:
-                                        all_event_interdurations.append(float(row[0]) - float(rows[idx - 1][0]))
-
-                                out_cat.append({"subject": subject,
-                                            "behavior": behavior,
-                                            "modifiers": modifier[0],
-                                            "duration": "NA",
-                                            "duration_mean": "NA",
-                                            "duration_stdev": "NA",
-                                            "number": len(rows),
-                                            "inter_duration_mean": round(statistics.mean(all_event_interdurations), 3) if len(all_event_interdurations) else "NA",
-                                            "inter_duration_stdev": round(statistics.stdev(all_event_interdurations), 3) if len(all_event_interdurations) > 1 else "NA"
-                                            })
-
-
-                        if STATE in self.eventType(behavior).upper():
-                            for modifier in distinct_modifiers:
-
-                                cursor.execute(("SELECT occurence, observation FROM events "
-                                                 "WHERE subject = ? "
-                                                 "AND code = ? "
-                                                 "AND modifiers = ? "
-                                                 "ORDER BY observation, occurence"),
-                                               (subject, behavior, modifier[0]))
-
-
-                                '''
-                                if not plot_parameters["start time"] and not plot_parameters["end time"]:
-                                    cursor.execute("""SELECT occurence, observation FROM events
-                                                        WHERE subject = ? 
-                                                            AND code = ? 
-                                                            AND modifiers = ? 
-                                                            ORDER BY observation, occurence""",
-                                                   (subject, behavior, modifier[0]))
-
-                                else:
-                                    cursor.execute("""SELECT occurence,observation FROM events 
-                                                        WHERE subject = ? 
-                                                            AND code = ?
-                                                            AND modifiers = ?
-                                                            AND occurence BETWEEN ? and ? 
-                                                            ORDER BY observation, occurence""",
-                                                   (subject, behavior, modifier[0], str(plot_parameters["start time"]), str(plot_parameters["end time"])))
-                                '''
-
-                                rows = list(cursor.fetchall())
-                                if len(rows) % 2:
-                                    out.append({"subject": subject, "behavior": behavior,
-                                                "modifiers": modifier[0], "duration": UNPAIRED,
-                                                "duration_mean": UNPAIRED, "duration_stdev": UNPAIRED,
-                                                "number": UNPAIRED, "inter_duration_mean": UNPAIRED,
-                                                "inter_duration_stdev": UNPAIRED})
-                                else:
-                                    all_event_durations, all_event_interdurations = [], []
-                                    for idx, row in enumerate(rows):
-                                        # event
-                                        if idx % 2 == 0:
-                                            new_init, new_end = float(row[0]), float(rows[idx + 1][0])
-                                            
-                                            '''
-                                            if len(selectedObservations) == 1:
-                                                if (new_init < plot_parameters["start time"] and new_end < plot_parameters["start time"]) \
-                                                   or \
-                                                   (new_init > plot_parameters["end time"] and new_end > plot_parameters["end time"]):
-                                                    continue
-
-                                                if new_init < plot_parameters["start time"]:
-                                                    new_init = float(plot_parameters["start time"])
-                                                if new_end > plot_parameters["end time"]:
-                                                    new_end = float(plot_parameters["end time"])
-                                            '''
-
-                                            all_event_durations.append(new_end - new_init)
-
-                                        # inter event if same observation
-                                        if idx % 2 and idx != len(rows) - 1 and row[1] == rows[idx + 1][1]:
-                                            if plot_parameters["start time"] <= row[0] <= plot_parameters["end time"] and plot_parameters["start time"] <= rows[idx + 1][0] <= plot_parameters["end time"]:
-                                                all_event_interdurations.append(float(rows[idx + 1][0]) - float(row[0]))
-
-                                            #all_event_interdurations.append(float(rows[idx + 1][0]) - float(row[0]))
-
-                                    out_cat.append({"subject": subject,
-                                                "behavior": behavior,
-                                                "modifiers": modifier[0],
-                                                "duration": round(sum(all_event_durations), 3),
-                                                "duration_mean": round(statistics.mean(all_event_durations), 3) if len(all_event_durations) else "NA",
-                                                "duration_stdev": round(statistics.stdev(all_event_durations), 3) if len(all_event_durations) > 1 else "NA",
-                                                "number": len(all_event_durations),
-                                                "inter_duration_mean": round(statistics.mean(all_event_interdurations), 3) if len(all_event_interdurations) else "NA",
-                                                "inter_duration_stdev": round(statistics.stdev(all_event_interdurations), 3) if len(all_event_interdurations) > 1 else "NA"
-                                                })
-
-                    else:  # no modifiers
-
-                        if POINT in self.eventType(behavior).upper():
-
-                            #if len(selectedObservations) > 1:
-                            cursor.execute("SELECT occurence,observation FROM events WHERE subject = ? AND code = ? ORDER BY observation, occurence", (subject, behavior))
-                            '''
-                            if not plot_parameters["start time"] and not plot_parameters["end time"]:
-                                cursor.execute("SELECT occurence,observation FROM events WHERE subject = ? AND code = ? ORDER BY observation, occurence", (subject, behavior))
-                            else:
-                                cursor.execute("SELECT occurence,observation FROM events WHERE subject = ? AND code = ? AND occurence BETWEEN ? and ? ORDER BY observation, occurence",
-                                               (subject, behavior, str(plot_parameters["start time"]), str(plot_parameters["end time"])))
-                            '''
-
-                            rows = list(cursor.fetchall())
-
-                            if len(selectedObservations) == 1:
-                                new_rows = []
-                                for occurence, observation in rows:
-                                    new_occurence = max(float(plot_parameters["start time"]), occurence)
-                                    new_occurence = min(new_occurence, float(plot_parameters["end time"]))
-                                    new_rows.append([new_occurence, observation])
-                                rows = list(new_rows)
-
-                            if not len(rows):
-                                if not plot_parameters["exclude behaviors"]:
-
-                                    if {self.pj[ETHOGRAM][idx]["type"] for idx in self.pj[ETHOGRAM] if self.pj[ETHOGRAM][idx]["code"] == behavior} == {"State event"}:
-                                        out.append({"subject": subject,
-                                                "behavior": behavior,
-                                                "modifiers": "",
-                                                "duration": 0,
-                                                "duration_mean": 0,
-                                                "duration_stdev": "NA",
-                                                "number": "0",
-                                                "inter_duration_mean": "NA",
-                                                "inter_duration_stdev": "NA"})
-                                    else: # point 
-                                        out.append({"subject": subject,
-                                                "behavior": behavior,
-                                                "modifiers": "",
-                                                "duration": "NA",
-                                                "duration_mean": "NA",
-                                                "duration_stdev": "NA",
-                                                "number": "0",
-                                                "inter_duration_mean": "NA",
-                                                "inter_duration_stdev": "NA"})
-                                continue
-
-                            # inter events duration
-                            all_event_interdurations = []
-                            for idx, row in enumerate(rows):
-                                if idx and row[1] == rows[idx - 1][1]:
-                                    all_event_interdurations.append(float(row[0]) - float(rows[idx - 1][0]))
-
-                            out_cat.append({"subject": subject,
-                                            "behavior": behavior,
-                                            "modifiers": "-",
-                                            "duration": "NA",
-                                            "duration_mean": "NA",
-                                            "duration_stdev": "NA",
-                                            "number": len(rows),
-                                            "inter_duration_mean": round(statistics.mean(all_event_interdurations), 3) if len(all_event_interdurations) else "NA",
-                                            "inter_duration_stdev": round(statistics.stdev(all_event_interdurations), 3) if len(all_event_interdurations) > 1 else "NA"
-                                            })
-
-                        if STATE in self.eventType(behavior).upper():
-
-                            cursor.execute("SELECT occurence, observation FROM events WHERE subject = ? AND code = ? ORDER BY observation, occurence", (subject, behavior))
-                            '''
-                            if not plot_parameters["start time"] and not plot_parameters["end time"]:
-                                cursor.execute("SELECT occurence, observation FROM events WHERE subject = ? AND code = ? ORDER BY observation, occurence", (subject, behavior))
-                            else:
-                                cursor.execute("SELECT occurence, observation FROM events WHERE subject = ? AND code = ? AND occurence BETWEEN ? and ? ORDER BY observation, occurence",
-                                               (subject, behavior, str(plot_parameters["start time"]), str(plot_parameters["end time"])))
-                            '''
-
-                            rows = list(cursor.fetchall())
-                            if not len(rows):
-                                if not plot_parameters["exclude behaviors"]: # include behaviors without events
-                                    out.append({"subject": subject, "behavior": behavior,
-                                                "modifiers": "-", "duration": 0, "duration_mean": 0,
-                                                "duration_stdev": "NA", "number": 0, "inter_duration_mean": "-",
-                                                "inter_duration_stdev": "-"})
-                                continue
-
-                            if len(rows) % 2:
-                                out.append({"subject": subject, "behavior": behavior, "modifiers": "NA",
-                                            "duration": UNPAIRED, "duration_mean": UNPAIRED, "duration_stdev": UNPAIRED,
-                                            "number": UNPAIRED, "inter_duration_mean": UNPAIRED,
-                                            "inter_duration_stdev": UNPAIRED})
-                            else:
-                                all_event_durations, all_event_interdurations = [], []
-                                for idx, row in enumerate(rows):
-                                    # event
-                                    if idx % 2 == 0:
-                                        new_init, new_end = float(row[0]), float(rows[idx + 1][0])
-                                        
-                                        '''
-                                        if len(selectedObservations) == 1:
-                                            if ((new_init < plot_parameters["start time"] and new_end < plot_parameters["start time"])
-                                               or
-                                               (new_init > plot_parameters["end time"] and new_end > plot_parameters["end time"])):
-                                                continue
-
-                                            if new_init < plot_parameters["start time"]:
-                                                new_init = float(plot_parameters["start time"])
-                                            if new_end > plot_parameters["end time"]:
-                                                new_end = float(plot_parameters["end time"])
-                                        '''
-
-                                        all_event_durations.append(new_end - new_init)
-
-                                    # inter event if same observation
-                                    if idx % 2 and idx != len(rows) - 1 and row[1] == rows[idx + 1][1]:
-                                        if plot_parameters["start time"] <= row[0] <= plot_parameters["end time"] and plot_parameters["start time"] <= rows[idx + 1][0] <= plot_parameters["end time"]:
-                                            all_event_interdurations.append(float(rows[idx + 1][0]) - float(row[0]))
-
-                                out_cat.append({"subject": subject,
-                                            "behavior": behavior,
-                                            "modifiers": "-",
-                                            "duration": round(sum(all_event_durations), 3),
-                                            "duration_mean": round(statistics.mean(all_event_durations), 3) if len(all_event_durations) else "NA",
-                                            "duration_stdev": round(statistics.stdev(all_event_durations), 3) if len(all_event_durations) > 1 else "NA",
-                                            "number": len(all_event_durations),
-                                            "inter_duration_mean": round(statistics.mean(all_event_interdurations), 3) if len(all_event_interdurations) else "NA",
-                                            "inter_duration_stdev": round(statistics.stdev(all_event_interdurations), 3) if len(all_event_interdurations) > 1 else "NA"
-                                            })
-
-                out += out_cat
-
-                if by_category: # and flagCategories:
-
-                    for behav in out_cat:
-
-                        try:
-                            category = [self.pj[ETHOGRAM][x]["category"] for x in self.pj[ETHOGRAM] if "category" in self.pj[ETHOGRAM][x] and self.pj[ETHOGRAM][x]["code"] == behav['behavior']][0]
-                        except:
-                            category = ""
-
-                        if category in categories[subject]:
-                            if behav["duration"] != "-" and categories[subject][category]["duration"] != "-":
-                                categories[subject][category]["duration"] += behav["duration"]
-                            else:
-                                categories[subject][category]["duration"] = "-"
-                            categories[subject][category]["number"] += behav["number"]
-                        else:
-                            categories[subject][category] = {"duration": behav["duration"], "number": behav["number"]}
-
-            out_sorted = []
-            for subject in plot_parameters["selected subjects"]:
-                for behavior in plot_parameters["selected behaviors"]:
-                    for row in out:
-                        if row["subject"] == subject and row["behavior"] == behavior:
-                            out_sorted.append(row)
-
-
-            ### http://stackoverflow.com/questions/673867/python-arbitrary-order-by
-            return out_sorted, categories
-
-
         def default_value(behav, param):
             """
             return value for duration in case of point event
             """
             default_value_ = 0
-            if ({self.pj[ETHOGRAM][idx]["type"] for idx in self.pj[ETHOGRAM] if self.pj[ETHOGRAM][idx]["code"] == behav} == {"Point event"} 
+            if (self.eventType(behav) == "Point event"
                and param in ["duration"]):
                    default_value_ = "-"
             return default_value_
@@ -5039,9 +4790,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         # check if state events are paired
         out = ""
+        checks = project_functions.check_state_events(self.pj, selectedObservations, self.timeFormat)
         for obsId in selectedObservations:
-            r, msg = project_functions.check_state_events_obs(obsId, self.pj[ETHOGRAM],
-                                                              self.pj[OBSERVATIONS][obsId], self.timeFormat)
+            r, msg = checks[obsId]
 
             if not r:
                 out += "Observation: <strong>{obsId}</strong><br>{msg}<br>".format(obsId=obsId, msg=msg)
@@ -5107,81 +4858,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # check if time_budget window must be used
         if mode in ["by_behavior", "by_category"] and (flagGroup or len(selectedObservations) == 1):
 
-            '''
-            cursor = self.loadEventsInDB(plot_parameters["selected subjects"], selectedObservations, plot_parameters["selected behaviors"])
-            '''
-            cursor = db_functions.load_events_in_db(self.pj, plot_parameters["selected subjects"], selectedObservations, plot_parameters["selected behaviors"])
-
-            total_observation_time = 0
-            for obsId in selectedObservations:
-
-                '''TO BE REMOVED  obs_length = self.observationTotalMediaLength(obsId)'''
-                
-                obs_length = project_functions.observation_total_length(self.pj[OBSERVATIONS][obsId])
-                
-                if obs_length == -1:
-                    obs_length = 0
-
-                if plot_parameters["time"] == TIME_FULL_OBS:
-                    min_time = float(0)
-                    max_time = float(obs_length)
-
-                if plot_parameters["time"] == TIME_EVENTS:
-                    try:
-                        min_time = float(self.pj[OBSERVATIONS][obsId]["events"][0][0])
-                    except:
-                        min_time = float(0)
-                    try:
-                        max_time = float(self.pj[OBSERVATIONS][obsId]["events"][-1][0])
-                    except:
-                        max_time = float(obs_length)
-    
-                if plot_parameters["time"] == TIME_ARBITRARY_INTERVAL:
-                    min_time = float(plot_parameters["start time"])
-                    max_time = float(plot_parameters["end time"])
-
-                    # check intervals
-                    for subj in plot_parameters["selected subjects"]:
-                        for behav in plot_parameters["selected behaviors"]:
-                            if POINT in self.eventType(behav).upper():
-                                continue
-                            # extract modifiers
-                            #if plot_parameters["include modifiers"]:
-
-                            cursor.execute("SELECT distinct modifiers FROM events WHERE observation = ? AND subject = ? AND code = ?", (obsId, subj, behav))
-                            distinct_modifiers = list(cursor.fetchall())
-                            
-                            logging.debug("distinct_modifiers: {}".format(distinct_modifiers))
-
-                            for modifier in distinct_modifiers:
-
-                                #if not modifier[0]:
-                                #    continue
-
-                                logging.debug("modifier #{}#".format(modifier[0]))
-
-                                if len(cursor.execute("""SELECT * FROM events WHERE observation = ? AND subject = ? AND code = ? AND modifiers = ? AND occurence < ?""",
-                                               (obsId, subj, behav, modifier[0], min_time)).fetchall()) % 2:
-
-                                    cursor.execute("INSERT INTO events (observation, subject, code, type, modifiers, occurence) VALUES (?,?,?,?,?,?)",
-                                                   (obsId, subj, behav, "STATE", modifier[0], min_time))
-
-                                if len(cursor.execute("""SELECT * FROM events WHERE observation = ? AND subject = ? AND code = ? AND modifiers = ? AND occurence > ?""",
-                                               (obsId, subj, behav, modifier[0], max_time)).fetchall()) % 2:
-
-                                    cursor.execute("INSERT INTO events (observation, subject, code, type, modifiers, occurence) VALUES (?,?,?,?,?,?)",
-                                                   (obsId, subj, behav, "STATE", modifier[0], max_time))
-                            try:
-                                cursor.execute("COMMIT")
-                            except:
-                                pass
-
-                total_observation_time += (max_time - min_time)
-
-                cursor.execute("""DELETE FROM events WHERE observation = ? AND (occurence < ? OR occurence > ?)""", (obsId, min_time, max_time))
-#                cursor.execute("commit")
-
-            out, categories = time_budget_analysis(cursor, plot_parameters, by_category=(mode == "by_category"))
+            out, categories, total_observation_time = time_budget_functions.time_budget(self.pj, selectedObservations, plot_parameters,
+                                                                                       by_category=(mode == "by_category"))
+            min_time, max_time = time_budget_functions.observation_interval(self.pj[OBSERVATIONS][selectedObservations[0]],
+                                                                            plot_parameters)
 
             # widget for results visualization
             self.tb = timeBudgetResults(logging.getLogger().getEffectiveLevel(), self.pj)
@@ -5227,10 +4907,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                         column += 1
     
                     # % of total time
-                    if row["duration"] not in ["NA", "-", UNPAIRED, 0] and selectedObsTotalMediaLength:
-                        item = QTableWidgetItem(str(round(row["duration"] / float(total_observation_time) * 100, 1)))
-                    else:
-                        item = QTableWidgetItem("NA")
+                    item = QTableWidgetItem(str(row["percent_total_length"]) if selectedObsTotalMediaLength else "NA")
     
                     item.setFlags(Qt.ItemIsEnabled)
                     self.tb.twTB.setItem(self.tb.twTB.rowCount() - 1, column, item)
@@ -5403,64 +5080,32 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 fields = ["subject", "category",  "number", "duration"]
 
 
-            for obsId in selectedObservations:
-
-                cursor = db_functions.load_events_in_db(self.pj, plot_parameters["selected subjects"], [obsId], plot_parameters["selected behaviors"])
-
-                '''TO BE REMOVED  obs_length = self.observationTotalMediaLength(obsId)'''
-                
-                obs_length = project_functions.observation_total_length(self.pj[OBSERVATIONS][obsId])
-                
-                if obs_length == -1:
-                    obs_length = 0
-
-                if plot_parameters["time"] == TIME_FULL_OBS:
-                    min_time = float(0)
-                    max_time = float(obs_length)
-    
-                if plot_parameters["time"] == TIME_EVENTS:
-                    try:
-                        min_time = float(self.pj[OBSERVATIONS][obsId]["events"][0][0])
-                    except:
-                        min_time = float(0)
-                    try:
-                        max_time = float(self.pj[OBSERVATIONS][obsId]["events"][-1][0])
-                    except:
-                        max_time = float(obs_length)
-
-                if plot_parameters["time"] == TIME_ARBITRARY_INTERVAL:
-                    min_time = float(plot_parameters["start time"])
-                    max_time = float(plot_parameters["end time"])
-
-                    # check intervals
-                    for subj in plot_parameters["selected subjects"]:
-                        for behav in plot_parameters["selected behaviors"]:
-                            if POINT in self.eventType(behav).upper():
-                                continue
-                            # extract modifiers
-                            #if plot_parameters["include modifiers"]:
-
-                            cursor.execute("SELECT distinct modifiers FROM events WHERE observation = ? AND subject = ? AND code = ?", (obsId, subj, behav))
-                            distinct_modifiers = list(cursor.fetchall())
-
-                            for modifier in distinct_modifiers:
+            # analysis of observations with a pool of processes, the results are shown as they finish
+            self.tb_progress = dialog.ResultsWidget()
+            self.tb_progress.setWindowTitle(programName + " - Time budget analysis")
+            self.tb_progress.ptText.setReadOnly(True)
+            self.tb_progress.pbSave.setVisible(False)
+            self.tb_progress.lb.setText("Analysis of {} observations".format(len(selectedObservations)))
+            self.tb_progress.show()
+            app.processEvents()
 
-                                if len(cursor.execute("""SELECT * FROM events WHERE observation = ? AND subject = ? AND code = ? AND modifiers = ? AND occurence < ?""",
-                                               (obsId, subj, behav, modifier[0], min_time)).fetchall()) % 2:
-                                    cursor.execute("INSERT INTO events (observation, subject, code, type, modifiers, occurence) VALUES (?,?,?,?,?,?)",
-                                                   (obsId, subj, behav, "STATE", modifier[0], min_time))
-                                if len(cursor.execute("""SELECT * FROM events WHERE observation = ? AND subject = ? AND code = ? AND modifiers = ? AND occurence > ?""",
-                                               (obsId, subj, behav, modifier[0], max_time)).fetchall()) % 2:
-                                    cursor.execute("INSERT INTO events (observation, subject, code, type, modifiers, occurence) VALUES (?,?,?,?,?,?)",
-                                                   (obsId, subj, behav, "STATE", modifier[0], max_time))
-                            try:
-                                cursor.execute("COMMIT")
-                            except:
-                                pass
+            results = {}
+            for obsId, out, categories, min_time, max_time in time_budget_functions.parallel_time_budget(self.pj,
+                                                                                                       selectedObservations,
+                                                                                                       plot_parameters,
+                                                                                                       by_category=(mode == "by_category")):
+                results[obsId] = (out, categories, min_time, max_time)
+                self.tb_progress.lb.setText("Analysis of {} observations: {} done".format(len(selectedObservations), len(results)))
+                self.tb_progress.ptText.appendPlainText(("{obsId}\tfrom {min_time:0.3f} to {max_time:0.3f} s\t"
+                                                         "{n_rows} row(s), {n_unpaired} unpaired").format(
+                                                            obsId=obsId, min_time=min_time, max_time=max_time,
+                                                            n_rows=len(out),
+                                                            n_unpaired=len([row for row in out if row["number"] == UNPAIRED])))
+                app.processEvents()
 
-                cursor.execute("""DELETE FROM events WHERE observation = ? AND (occurence < ? OR occurence > ?)""", (obsId, min_time,max_time))
+            for obsId in selectedObservations:
 
-                out, categories = time_budget_analysis(cursor, plot_parameters, by_category=(mode == "by_category"))
+                out, categories, min_time, max_time = results[obsId]
 
                 if mode == "synthetic":
 
@@ -5537,22 +5182,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                                 values.append(str(row[field]).replace(" ()", ""))
     
                             # % of total time
-                            if row["duration"] not in ["NA", "-", UNPAIRED, 0] and selectedObsTotalMediaLength:
-                            #if row["duration"] != "-" and row["duration"] != 0 and row["duration"] != UNPAIRED and selectedObsTotalMediaLength:
-                                values.append(round(row["duration"] / float(max_time - min_time) * 100, 1))
-                                '''
-                                if len(selectedObservations) > 1:
-                                    values.append(round(row["duration"] / float(selectedObsTotalMediaLength) * 100, 1))
-                                else:
-                                    values.append(round(row["duration"] / float(max_time - min_time) * 100, 1))
-                                '''
-                            else:
-                                values.append("-")
+                            values.append(row["percent_total_length"] if selectedObsTotalMediaLength else "-")
 
                             rows.append(values)
     
                     if mode == "by_category":
-                        rows.append = fields
+                        rows.append(fields)
                         #data.headers = fields # + ["% of total media length"]
                         for subject in categories:
     
@@ -5629,6 +5264,75 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                         f.write(workbook.ods)
 
 
+    def time_budget_by_time_windows(self):
+        """
+        time budget (total duration and number of occurrences) in consecutive time windows
+        """
+
+        result, selectedObservations = self.selectObservations(MULTIPLE)
+        if not selectedObservations:
+            return
+
+        # check if state events are paired
+        out = ""
+        checks = project_functions.check_state_events(self.pj, selectedObservations, self.timeFormat)
+        for obsId in selectedObservations:
+            r, msg = checks[obsId]
+            if not r:
+                out += "Observation: <strong>{obsId}</strong><br>{msg}<br>".format(obsId=obsId, msg=msg)
+        if out:
+            self.results = dialog.ResultsWidget()
+            self.results.setWindowTitle(programName + " - Check selected observations")
+            self.results.ptText.setReadOnly(True)
+            self.results.ptText.appendHtml(out)
+            self.results.show()
+
+        max_obs_length = max([project_functions.observation_total_length(self.pj[OBSERVATIONS][obsId])
+                              for obsId in selectedObservations])
+
+        plot_parameters = self.choose_obs_subj_behav_category(selectedObservations,
+                                                              maxTime=max(max_obs_length, 0),
+                                                              by_category=False)
+        if not plot_parameters["selected subjects"] or not plot_parameters["selected behaviors"]:
+            return
+
+        window_length, ok = QInputDialog.getDouble(self, "Time budget by time windows", "Length of time windows (in seconds)",
+                                                   300, 0.001, 86400, 3)
+        if not ok:
+            return
+
+        edges, keys, duration, number, unpaired = time_budget_functions.windowed_time_budget(self.pj,
+                                                                                             selectedObservations,
+                                                                                             plot_parameters,
+                                                                                             window_length)
+
+        self.tb = timeBudgetResults(logging.getLogger().getEffectiveLevel(), self.pj)
+        self.tb.setWindowTitle("Time budget by time windows")
+        self.tb.label.setText("Selected observations")
+        for obsId in selectedObservations:
+            self.tb.lw.addItem(obsId)
+        self.tb.lbTotalObservedTime.setText("Time windows of {:0.3f} s from {:0.3f} to {:0.3f} s".format(window_length, edges[0], edges[-1])
+                                            + ("\nUnpaired state events not analyzed: {}".format(
+                                                ", ".join(["{} {} {}".format(*key).strip() for key in unpaired])) if unpaired else ""))
+
+        tb_fields = ["Subject", "Behavior", "Modifiers", "Parameter"] + ["{:0.3f}-{:0.3f}".format(edges[idx], edges[idx + 1])
+                                                                        for idx in range(len(edges) - 1)]
+        self.tb.twTB.setColumnCount(len(tb_fields))
+        self.tb.twTB.setHorizontalHeaderLabels(tb_fields)
+
+        for key, key_duration, key_number in zip(keys, duration, number):
+            for parameter, values in [("Total duration (s)", ["NA" if np.isnan(x) else str(round(x, 3)) for x in key_duration]),
+                                      ("Number of occurrences", [str(x) for x in key_number])]:
+                self.tb.twTB.setRowCount(self.tb.twTB.rowCount() + 1)
+                for column, value in enumerate(list(key) + [parameter] + values):
+                    item = QTableWidgetItem(value)
+                    item.setFlags(Qt.ItemIsEnabled)
+                    self.tb.twTB.setItem(self.tb.twTB.rowCount() - 1, column, item)
+
+        self.tb.twTB.resizeColumnsToContents()
+        self.tb.show()
+
+
     def plot_events1_triggered(self):
         """
         plot events with matplotlib (legacy version)
@@ -5754,9 +5458,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # check if state events are paired
         out = ""
         not_paired_obs_list = []
+        checks = project_functions.check_state_events(self.pj, selectedObservations, self.timeFormat)
         for obsId in selectedObservations:
-            r, msg = project_functions.check_state_events_obs(obsId, self.pj[ETHOGRAM],
-                                                              self.pj[OBSERVATIONS][obsId], self.timeFormat)
+            r, msg = checks[obsId]
 
             if not r:
                 out += "Observation: <strong>{obsId}</strong><br>{msg}<br>".format(obsId=obsId, msg=msg)
@@ -6248,6 +5952,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
             # retrieve project dict from window
             self.pj = copy.deepcopy(newProjectWindow.pj)
+            ethogram_index.invalidate()
             self.project = True
 
             # time format
@@ -6370,7 +6075,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.lbTimeLive.setText(self.convertTime(currentTime))
 
         # extract State events
-        StateBehaviorsCodes = [self.pj[ETHOGRAM][x]['code'] for x in [y for y in self.pj[ETHOGRAM] if 'State' in self.pj[ETHOGRAM][y][TYPE]]]
+        StateBehaviorsCodes = self.ethogram_index().state_codes
 
         self.currentStates = {}
         # add states for no focal subject
@@ -6478,10 +6183,88 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             QMessageBox.critical(None, programName, msg, QMessageBox.Ok | QMessageBox.Default, QMessageBox.NoButton)
 
 
+    def export_observations_files(self, kind, parameters, selectedObservations, exportDir, outputFormat, compression=None):
+        """
+        export the events of each selected observation in its own file with a pool of processes.
+        A progress dialog allows to cancel the export and the errors are shown at the end.
+
+        Args:
+            kind (str): export_observation.EVENTS_EXPORT or export_observation.AGGREGATED_EVENTS_EXPORT
+            parameters (dict): subjects, behaviors
+            selectedObservations (list): list of observations id
+            exportDir (str): directory for the exported files
+            outputFormat (str): output format
+            compression (str): compression for columnar formats
+        """
+
+        progress = QProgressDialog("Exporting {} observations...".format(len(selectedObservations)),
+                                   "Cancel", 0, len(selectedObservations), self)
+        progress.setWindowTitle(programName)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.setAutoClose(False)
+
+        done, errors = 0, []
+        results = export_observation.parallel_export(self.pj, parameters, selectedObservations, kind, exportDir,
+                                                     outputFormat, compression=compression)
+        for result in results:
+            if progress.wasCanceled():
+                results.close()
+                break
+            if result is not None:
+                obsId, fileName, r, msg = result
+                done += 1
+                if not r:
+                    errors.append((obsId, msg))
+                progress.setValue(done)
+            app.processEvents()
+        progress.close()
+
+        out = ("{exported} observation(s) exported in <b>{exportDir}</b><br>"
+               "{errors} error(s)").format(exported=done - len(errors), exportDir=exportDir, errors=len(errors))
+        if done < len(selectedObservations):
+            out += "<br>{} canceled".format(len(selectedObservations) - done)
+
+        if not errors:
+            QMessageBox.information(self, programName, out)
+            return
+
+        out += "<br><br>" + "<br>".join(["Observation: <strong>{obsId}</strong>: {msg}".format(obsId=obsId, msg=msg)
+                                         for obsId, msg in errors])
+        self.results = dialog.ResultsWidget()
+        self.results.setWindowTitle(programName + " - Export errors")
+        self.results.ptText.setReadOnly(True)
+        self.results.ptText.appendHtml(out)
+        self.results.show()
+
+
+    def arrow_compression(self, output_format):
+        """
+        check if the columnar formats (Parquet, Feather) are available and ask the user for the compression
+
+        Args:
+            output_format (str): output format
+
+        Returns:
+            bool: True if export can continue
+            str: compression (see export_observation.ARROW_COMPRESSIONS)
+        """
+
+        if not export_observation.flag_pyarrow:
+            QMessageBox.warning(self, programName, "The pyarrow module is required for the {} format.".format(output_format),
+                                QMessageBox.Ok | QMessageBox.Default, QMessageBox.NoButton)
+            return False, ""
+
+        item, ok = QInputDialog.getItem(self, programName, "Compression of {} file".format(output_format),
+                                        export_observation.ARROW_COMPRESSIONS[output_format], 0, False)
+        return ok, item
+
+
     def export_aggregated_events(self):
         """
         export aggregated events.
-        Formats can be SQL (sql), SDIS (sds) or Tabular format (tsv, csv, ods, xlsx, xls, html)
+        Formats can be SQL (sql), SDIS (sds), Tabular format (tsv, csv, ods, xlsx, xls, html)
+        or columnar format (parquet, feather)
         format is selected using the filename extension
         """
 
@@ -6491,9 +6274,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         # check if state events are paired
         out, not_paired_obs_list = "", []
+        checks = project_functions.check_state_events(self.pj, selectedObservations, self.timeFormat)
         for obsId in selectedObservations:
-            r, msg = project_functions.check_state_events_obs(obsId, self.pj[ETHOGRAM],
-                                                              self.pj[OBSERVATIONS][obsId], self.timeFormat)
+            r, msg = checks[obsId]
             if not r:
                 out += "Observation: <strong>{obsId}</strong><br>{msg}<br>".format(obsId=obsId, msg=msg)
                 not_paired_obs_list.append(obsId)
@@ -6522,11 +6305,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                                  "Microsoft Excel Spreadsheet XLSX (*.xlsx)",
                                  "Legacy Microsoft Excel Spreadsheet XLS (*.xls)",
                                  "HTML (*.html)",
+                                 "Apache Parquet (*.parquet)",
+                                 "Apache Feather (*.feather)",
                                  "SDIS (*.sds)",
                                  "SQL dump file (*.sql)"]
 
         if flag_group:
-            file_formats = ["tsv", "csv", "ods", "xlsx", "xls", "html", "sds", "sql"] # must be in same order than extended_file_formats
+            file_formats = ["tsv", "csv", "ods", "xlsx", "xls", "html", "parquet", "feather", "sds", "sql"] # must be in same order than extended_file_formats
     
             if QT_VERSION_STR[0] == "4":
                 fileName, filter_ = QFileDialog(self).getSaveFileNameAndFilter(self, "Export aggregated events", "", ";;".join(extended_file_formats))
@@ -6547,7 +6332,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                      "Open Document Spreadsheet (*.ods)",
                      "Microsoft Excel Spreadsheet XLSX (*.xlsx)",
                      "Legacy Microsoft Excel Spreadsheet XLS (*.xls)",
-                     "HTML (*.html)")
+                     "HTML (*.html)",
+                     "Apache Parquet (*.parquet)",
+                     "Apache Feather (*.feather)")
             item, ok = QInputDialog.getItem(self, "Export events format", "Available formats", items, 0, False)
             if not ok:
                 return
@@ -6558,12 +6345,29 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             if not exportDir:
                 return
 
+        if outputFormat in export_observation.ARROW_FORMATS:
+            ok, compression = self.arrow_compression(outputFormat)
+            if not ok:
+                return
+            columns = export_observation.aggregated_events_columns(self.pj)
+            # one row group by observation
+            if flag_group:
+                r, msg = export_observation.write_arrow(columns,
+                                                        (export_observation.export_aggregated_events(self.pj, parameters, obsId)
+                                                         for obsId in selectedObservations),
+                                                        fileName, outputFormat, compression)
+                if not r:
+                    QMessageBox.warning(None, programName, msg, QMessageBox.Ok | QMessageBox.Default, QMessageBox.NoButton)
+            else:
+                self.export_observations_files(export_observation.AGGREGATED_EVENTS_EXPORT, parameters, selectedObservations,
+                                               exportDir, outputFormat, compression)
+            return
 
         if outputFormat == "sql":
             _, _, conn = db_functions.load_aggregated_events_in_db(self.pj,
-                                                             plot_parameters["selected subjects"],
+                                                             parameters["selected subjects"],
                                                              selectedObservations,
-                                                             plot_parameters["selected behaviors"])
+                                                             parameters["selected behaviors"])
             try:
                 with open(fileName, "w") as f:
                     for line in conn.iterdump():
@@ -6574,61 +6378,43 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 QMessageBox.critical(None, programName, str(errorMsg), QMessageBox.Ok | QMessageBox.Default, QMessageBox.NoButton)
             return
 
-        data_header = tablib.Dataset()
-        data_header.title = "Aggregated events"
-        header = ["Observation id", "Observation date", "Media file", "Total length", "FPS"]
-        if INDEPENDENT_VARIABLES in self.pj:
-            for idx in sorted_keys(self.pj[INDEPENDENT_VARIABLES]):
-                header.append(self.pj[INDEPENDENT_VARIABLES][idx]["label"])
-        header.extend(["Subject", "Behavior"])
-        header.extend(["Modifiers"]) 
-        header.extend(["Behavior type", "Start (s)", "Stop (s)", "Duration (s)", "Comment start", "Comment stop"])
-        data_header.append(header)
-
-        data = copy.deepcopy(data_header)
-        for obsId in selectedObservations:
-            d = export_observation.export_aggregated_events(self.pj, parameters, obsId)
-            data.extend(d)
-
-            if not flag_group:
-                fileName = str(pathlib.Path(pathlib.Path(exportDir) / safeFileName(obsId)).with_suffix("." + outputFormat))
-                r, msg = export_observation.dataset_write(data, fileName, outputFormat)
-                if not r:
-                    QMessageBox.warning(None, programName, msg, QMessageBox.Ok | QMessageBox.Default, QMessageBox.NoButton)
-                data = copy.deepcopy(data_header)
-
-
         if outputFormat == "sds": # SDIS format
             out = "% SDIS file created by BORIS (www.boris.unito.it) at {}\nTimed <seconds>;\n".format(datetime_iso8601())
             for obsId in selectedObservations:
                 # observation id
                 out += "\n<{}>\n".format(obsId)
-                dataList = list(data[1:])
-                for event in sorted(dataList, key=lambda x: x[-4]):  # sort events by start time
-                    if event[0] == obsId:
-                        behavior = event[-7]
-                        # replace various char by _
-                        for char in [" ", "-", "/"]:
-                            behavior = behavior.replace(char, "_")
-                        subject = event[-8]
-                        # replace various char by _
-                        for char in [" ", "-", "/"]:
-                            subject = subject.replace(char, "_")
-                        event_start = "{0:.3f}".format(round(event[-4], 3))  # start event (from end for independent variables)
-                        if not event[-3]:  # stop event (from end)
-                            event_stop = "{0:.3f}".format(round(event[-4] + 0.001, 3))
-                        else:
-                            event_stop = "{0:.3f}".format(round(event[-3], 3))
-                        out += "{subject}_{behavior},{start}-{stop} ".format(subject=subject, behavior=behavior, start=event_start, stop=event_stop)
+                dataList = list(export_observation.export_aggregated_events(self.pj, parameters, obsId))
+                for event in sorted(dataList, key=lambda x: float(x[-5])):  # sort events by start time
+                    behavior = event[-8]
+                    # replace various char by _
+                    for char in [" ", "-", "/"]:
+                        behavior = behavior.replace(char, "_")
+                    subject = event[-9]
+                    # replace various char by _
+                    for char in [" ", "-", "/"]:
+                        subject = subject.replace(char, "_")
+                    event_start = "{0:.3f}".format(round(float(event[-5]), 3))  # start event (from end for independent variables)
+                    if event[-6] == POINT:  # no stop event for point events
+                        event_stop = "{0:.3f}".format(round(float(event[-5]) + 0.001, 3))
+                    else:
+                        event_stop = "{0:.3f}".format(round(float(event[-4]), 3))
+                    out += "{subject}_{behavior},{start}-{stop} ".format(subject=subject, behavior=behavior, start=event_start, stop=event_stop)
                 out += "/\n\n"
             with open(fileName, "wb") as f:
                 f.write(str.encode(out))
             return
 
+        # rows are written one by one
+        header = export_observation.aggregated_events_header(self.pj)
         if flag_group:
-            r, msg = export_observation.dataset_write(data, fileName, outputFormat)
+            rows = itertools.chain([header], *[export_observation.export_aggregated_events(self.pj, parameters, obsId)
+                                               for obsId in selectedObservations])
+            r, msg = export_observation.write_rows(rows, fileName, outputFormat, title="Aggregated events")
             if not r:
                 QMessageBox.warning(None, programName, msg, QMessageBox.Ok | QMessageBox.Default, QMessageBox.NoButton)
+        else:
+            self.export_observations_files(export_observation.AGGREGATED_EVENTS_EXPORT, parameters, selectedObservations,
+                                           exportDir, outputFormat)
 
 
     def export_state_events_as_textgrid(self):
@@ -6849,7 +6635,7 @@ item []:
                             format(media_full_path, self.convertTime(duration), fps, hasVideo, hasAudio))
 
             self.results.ptText.appendHtml("Total duration: {} (hh:mm:ss.sss)".
-                format(self.convertTime(sum(self.duration) / 1000)))
+                format(self.convertTime(self.media_offsets_index[PLAYER1].total / 1000)))
 
             self.results.show()
 
@@ -6896,34 +6682,32 @@ item []:
             globalCurrentTime = int(self.FFmpegGlobalFrame * (1000 / list(self.fps.values())[0]))
 
             # set on media player end
-            currentMediaTime = int(sum(self.duration))
+            currentMediaTime = int(self.media_offsets_index[PLAYER1].total)
 
-            for idx, media in enumerate(self.pj[OBSERVATIONS][self.observationId][FILE][PLAYER1]):
-                if globalCurrentTime < sum(self.duration[0:idx + 1]):
-                    self.mediaListPlayer.play_item_at_index(idx)
-                    while True:
-                        if self.mediaListPlayer.get_state() in [vlc.State.Playing, vlc.State.Ended]:
-                            break
-                    self.mediaListPlayer.pause()
-                    currentMediaTime = int(globalCurrentTime - sum(self.duration[0:idx]))
-                    break
+            if globalCurrentTime < self.media_offsets_index[PLAYER1].total:
+                idx = self.media_offsets_index[PLAYER1].media_index(globalCurrentTime)
+                self.mediaListPlayer.play_item_at_index(idx)
+                while True:
+                    if self.mediaListPlayer.get_state() in [vlc.State.Playing, vlc.State.Ended]:
+                        break
+                self.mediaListPlayer.pause()
+                currentMediaTime = int(globalCurrentTime - self.media_offsets_index[PLAYER1].offset(idx))
 
             self.mediaplayer.set_time(currentMediaTime)
 
             if self.second_player():
 
                 # set on media player2 end
-                currentMediaTime2 = int(sum(self.duration2))
+                currentMediaTime2 = int(self.media_offsets_index[PLAYER2].total)
                 globalCurrentTime2 = int(self.FFmpegGlobalFrame2 * (1000 / list(self.fps2.values())[0]))
-                for idx, media in enumerate(self.pj[OBSERVATIONS][self.observationId][FILE][PLAYER2]):
-                    if globalCurrentTime2 < sum(self.duration2[0:idx + 1]):
-                        self.mediaListPlayer2.play_item_at_index(idx)
-                        while True:
-                            if self.mediaListPlayer2.get_state() in [vlc.State.Playing, vlc.State.Ended]:
-                                break
-                        self.mediaListPlayer2.pause()
-                        currentMediaTime2 = int(globalCurrentTime2 - sum(self.duration2[0:idx]))
-                        break
+                if globalCurrentTime2 < self.media_offsets_index[PLAYER2].total:
+                    idx = self.media_offsets_index[PLAYER2].media_index(globalCurrentTime2)
+                    self.mediaListPlayer2.play_item_at_index(idx)
+                    while True:
+                        if self.mediaListPlayer2.get_state() in [vlc.State.Playing, vlc.State.Ended]:
+                            break
+                    self.mediaListPlayer2.pause()
+                    currentMediaTime2 = int(globalCurrentTime2 - self.media_offsets_index[PLAYER2].offset(idx))
                 self.mediaplayer2.set_time(currentMediaTime2)
 
             self.toolBox.setCurrentIndex(VIDEO_TAB)
@@ -6982,7 +6766,7 @@ item []:
             # show frame-by_frame tab
             self.toolBox.setCurrentIndex(1)
 
-            globalTime = (sum(self.duration[0: self.media_list.index_of_item(self.mediaplayer.get_media())]) + self.mediaplayer.get_time())
+            globalTime = (self.media_offsets_index[PLAYER1].offset(self.media_list.index_of_item(self.mediaplayer.get_media())) + self.mediaplayer.get_time())
 
             fps = list(self.fps.values())[0]
 
@@ -6991,7 +6775,7 @@ item []:
             self.FFmpegGlobalFrame = globalCurrentFrame
 
             if self.second_player():
-                globalTime2 = (sum(self.duration2[0: self.media_list2.index_of_item(self.mediaplayer2.get_media())]) + self.mediaplayer2.get_time())
+                globalTime2 = (self.media_offsets_index[PLAYER2].offset(self.media_list2.index_of_item(self.mediaplayer2.get_media())) + self.mediaplayer2.get_time())
                 globalCurrentFrame2 = round(globalTime2 / (1000/fps))
                 self.FFmpegGlobalFrame2 = globalCurrentFrame2
 
@@ -7034,7 +6818,7 @@ item []:
                 if self.playMode == FFMPEG:
 
                     for idx, media in enumerate(self.pj[OBSERVATIONS][self.observationId][FILE][PLAYER1]):
-                        if self.FFmpegGlobalFrame < sum(self.duration[0:idx + 1]):
+                        if self.FFmpegGlobalFrame < self.media_offsets_index[PLAYER1].offset(idx + 1):
 
                             p = pathlib.Path(media)
                             snapshotFilePath = str(p.parent / "{}_{}.png".format(p.stem, self.FFmpegGlobalFrame))
@@ -7048,7 +6832,7 @@ item []:
 
                     if self.second_player():
                         for idx, media in enumerate(self.pj[OBSERVATIONS][self.observationId][FILE][PLAYER2]):
-                            if self.FFmpegGlobalFrame2 < sum(self.duration2[0:idx + 1]):
+                            if self.FFmpegGlobalFrame2 < self.media_offsets_index[PLAYER2].offset(idx + 1):
 
                                 p = pathlib.Path(media)
                                 snapshotFilePath = str(p.parent / "{}_{}.png".format(p.stem, self.FFmpegGlobalFrame2))
@@ -7568,9 +7352,12 @@ item []:
 
         players = []
         players.append("VLC media player")
-        players.append("version {}".format(bytes_to_str(vlc.libvlc_get_version())))
-        if vlc.plugin_path:
-            players.append("VLC libraries path: {}".format(vlc.plugin_path))
+        if not check_vlc()[0]:
+            players.append("not found")
+        else:
+            players.append("version {}".format(bytes_to_str(vlc.libvlc_get_version())))
+            if vlc.plugin_path:
+                players.append("VLC libraries path: {}".format(vlc.plugin_path))
 
         players.append("\nFFmpeg")
         players.append(subprocess.getoutput('"{}" -version'.format(self.ffmpeg_bin)).split("\n")[0])
@@ -7582,7 +7369,7 @@ item []:
 
         # matplotlib
         players.append("\nMatplotlib")
-        players.append("version {}".format(matplotlib.__version__))
+        players.append("version {}".format(matplotlib.__version__) if FLAG_MATPLOTLIB_INSTALLED else "not installed")
 
         # graphviz
         gv_result = subprocess.getoutput("dot -V")
@@ -7782,7 +7569,7 @@ item []:
 
             currentTimeOffset = Decimal(currentTime / 1000) + Decimal(self.pj[OBSERVATIONS][self.observationId][TIME_OFFSET])
 
-            totalGlobalTime = sum(self.duration)
+            totalGlobalTime = self.media_offsets_index[PLAYER1].total
 
             mediaName = ""
 
@@ -7968,7 +7755,7 @@ item []:
         does not return value
         """
 
-        stateEventsList = [self.pj[ETHOGRAM][x][BEHAVIOR_CODE] for x in self.pj[ETHOGRAM] if STATE in self.pj[ETHOGRAM][x][TYPE].upper()]
+        stateEventsList = set(self.ethogram_index().state_codes)
 
         for row in range(0, self.twEvents.rowCount()):
 
@@ -8088,11 +7875,7 @@ item []:
             # update current state
             if "row" not in event: # no editing
                 if self.currentSubject:
-                    csj = []
-                    for idx in self.currentStates:
-                        if idx in self.pj[SUBJECTS] and self.pj[SUBJECTS][idx]["name"] == self.currentSubject:
-                            csj = self.currentStates[idx]
-                            break
+                    csj = self.currentStates.get(self.ethogram_index().subject_by_name.get(self.currentSubject), [])
     
                 else:  # no focal subject
                     try:
@@ -8155,14 +7938,12 @@ item []:
 
         # check if key duplicated
         items = []
-        for idx in self.pj[ETHOGRAM]:
-            if self.pj[ETHOGRAM][idx]["key"] == obs_key:
-
-                code_descr = self.pj[ETHOGRAM][idx]["code"]
-                if  self.pj[ETHOGRAM][idx]["description"]:
-                    code_descr += " - " + self.pj[ETHOGRAM][idx]["description"]
-                items.append(code_descr)
-                self.detailedObs[code_descr] = idx
+        for idx in self.ethogram_index().behaviors_by_key.get(obs_key, []):
+            code_descr = self.pj[ETHOGRAM][idx]["code"]
+            if  self.pj[ETHOGRAM][idx]["description"]:
+                code_descr += " - " + self.pj[ETHOGRAM][idx]["description"]
+            items.append(code_descr)
+            self.detailedObs[code_descr] = idx
 
         items.sort()
 
@@ -8208,7 +7989,7 @@ item []:
                     return memLaps
                 else: # playMode == VLC
                     # cumulative time
-                    memLaps = Decimal(str(round((sum(self.duration[0: self.media_list.index_of_item(self.mediaplayer.get_media())]) +
+                    memLaps = Decimal(str(round((self.media_offsets_index[PLAYER1].offset(self.media_list.index_of_item(self.mediaplayer.get_media())) +
                               self.mediaplayer.get_time()) / 1000, 3)))
                     return memLaps
 
@@ -8393,9 +8174,11 @@ item []:
 
         obs_key = None
 
+        index = self.ethogram_index()
+
         # check if key is function key
         if (ek in function_keys):
-            if function_keys[ek] in [self.pj[ETHOGRAM][x]["key"] for x in self.pj[ETHOGRAM]]:
+            if function_keys[ek] in index.behaviors_by_key:
                 obs_key = function_keys[ek]
 
         # get video time
@@ -8429,37 +8212,28 @@ item []:
                 ek_unichr = ""
 
                 if "#subject#" in event.text():
-                    for idx in self.pj[SUBJECTS]:
-                        if self.pj[SUBJECTS][idx]["name"] == event.text().replace("#subject#", ""):
-                            subj_idx = idx
-                            '''
-                            if self.currentSubject == self.pj[SUBJECTS][subj_idx]["name"]:
-                                self.update_subject("")
-                            else:
-                                self.update_subject(self.pj[SUBJECTS][subj_idx]["name"])
-                            '''
-                            self.update_subject(self.pj[SUBJECTS][subj_idx]["name"])
-                            return
-
+                    subject_name = event.text().replace("#subject#", "")
+                    if subject_name in index.subject_by_name:
+                        subj_idx = index.subject_by_name[subject_name]
+                        self.update_subject(self.pj[SUBJECTS][subj_idx]["name"])
+                        return
 
                 else: # behavior
-                    for o in self.pj[ETHOGRAM]:
-                        if self.pj[ETHOGRAM][o]["code"] == event.text():
-                            obs_idx = o
-                            count += 1
+                    if event.text() in index.behaviors_by_code:
+                        obs_idx = index.behaviors_by_code[event.text()]
+                        count = 1
             else:
                 # count key occurence in ethogram
-                for o in self.pj[ETHOGRAM]:
-                    if self.pj[ETHOGRAM][o]["key"] == ek_unichr:
-                        obs_idx = o
-                        count += 1
+                behaviors_idx = index.behaviors_by_key.get(ek_unichr, [])
+                if behaviors_idx:
+                    obs_idx = behaviors_idx[-1]
+                    count = len(behaviors_idx)
 
             # check if key defines a suject
             if subj_idx == -1:  # subject not selected with subjects pad
                 flag_subject = False
-                for idx in self.pj[SUBJECTS]:
-                    if ek_unichr == self.pj[SUBJECTS][idx]["key"]:
-                        subj_idx = idx
+                if ek_unichr in index.subjects_by_key:
+                    subj_idx = index.subjects_by_key[ek_unichr][-1]
 
             # select between code and subject
             if subj_idx != -1 and count:
@@ -8520,17 +8294,9 @@ item []:
                 if subj_idx != -1:
                     # check if key defines a suject
                     flag_subject = False
-                    for idx in self.pj[SUBJECTS]:
-                        if ek_unichr == self.pj[SUBJECTS][idx]["key"]:
-                            flag_subject = True
-                            # select or deselect current subject
-                            '''
-                            if self.currentSubject == self.pj[SUBJECTS][idx]["name"]:
-                                self.update_subject("")
-                            else:
-                                self.update_subject(self.pj[SUBJECTS][idx]["name"])
-                            '''
-                            self.update_subject(self.pj[SUBJECTS][idx]["name"])
+                    for idx in index.subjects_by_key.get(ek_unichr, []):
+                        flag_subject = True
+                        self.update_subject(self.pj[SUBJECTS][idx]["name"])
 
                 if not flag_subject:
                     self.statusbar.showMessage("Key not assigned ({})".format(ek_unichr), 5000)
@@ -8585,7 +8351,7 @@ item []:
                         '''self.pause_video()'''
 
                     if time_ >= self.mediaplayer.get_media().get_duration() / 1000:
-                        
+                        self.mediaplayer.set_time(self.mediaplayer.get_media().get_duration() - 100)
                     else:
                         self.mediaplayer.set_time(int(newTime))
 
@@ -8622,7 +8388,7 @@ item []:
                                 self.mediaListPlayer.pause()
 
                             self.mediaplayer.set_time(newTime -
-                                                      sum(self.duration[0: self.media_list.index_of_item(self.mediaplayer.get_media())]))
+                                                      self.media_offsets_index[PLAYER1].offset(self.media_list.index_of_item(self.mediaplayer.get_media())))
                             break
 
                         tot += d
@@ -8948,7 +8714,7 @@ item []:
 
     def export_tabular_events(self):
         """
-        export events from selected observations in various formats: TSV, CSV, ODS, XLSX, XLS, HTML
+        export events from selected observations in various formats: TSV, CSV, ODS, XLSX, XLS, HTML, Parquet, Feather
         """
 
         # ask user observations to analyze
@@ -8972,7 +8738,9 @@ item []:
                      "Open Document Spreadsheet (*.ods)",
                      "Microsoft Excel Spreadsheet XLSX (*.xlsx)",
                      "Legacy Microsoft Excel Spreadsheet XLS (*.xls)",
-                     "HTML (*.html)")
+                     "HTML (*.html)",
+                     "Apache Parquet (*.parquet)",
+                     "Apache Feather (*.feather)")
             item, ok = QInputDialog.getItem(self, "Export events format", "Available formats", items, 0, False)
             if not ok:
                 return
@@ -8989,8 +8757,10 @@ item []:
                            "Open Document Spreadsheet ODS (*.ods)",
                            "Microsoft Excel Spreadsheet XLSX (*.xlsx)",
                            "Legacy Microsoft Excel Spreadsheet XLS (*.xls)",
-                           "HTML (*.html)"]
-            file_formats = ["tsv", "csv", "ods", "xlsx", "xls", "html"]
+                           "HTML (*.html)",
+                           "Apache Parquet (*.parquet)",
+                           "Apache Feather (*.feather)"]
+            file_formats = ["tsv", "csv", "ods", "xlsx", "xls", "html", "parquet", "feather"]
 
 
             if QT_VERSION_STR[0] == "4":
@@ -9007,14 +8777,24 @@ item []:
             if pathlib.Path(fileName).suffix != "." + outputFormat:
                 fileName = str(pathlib.Path(fileName)) + "." + outputFormat
 
-        for obsId in selectedObservations:
-            if len(selectedObservations) > 1:
-                fileName = str(pathlib.Path(pathlib.Path(exportDir) / safeFileName(obsId)).with_suffix("." + outputFormat))
+        compression = None
+        if outputFormat in export_observation.ARROW_FORMATS:
+            ok, compression = self.arrow_compression(outputFormat)
+            if not ok:
+                return
 
-            r, msg = export_observation.export_events(parameters, obsId, self.pj[OBSERVATIONS][obsId], self.pj[ETHOGRAM],
-                                                      fileName, outputFormat)
-            if not r:
-                QMessageBox.critical(None, programName, msg, QMessageBox.Ok | QMessageBox.Default, QMessageBox.NoButton)
+        if len(selectedObservations) > 1:
+            self.export_observations_files(export_observation.EVENTS_EXPORT, parameters, selectedObservations,
+                                           exportDir, outputFormat, compression)
+            return
+
+        obsId = selectedObservations[0]
+        r, msg = export_observation.export_events(parameters, obsId, self.pj[OBSERVATIONS][obsId], self.pj[ETHOGRAM],
+                                                  fileName, outputFormat,
+                                                  independent_variables=self.pj.get(INDEPENDENT_VARIABLES, {}),
+                                                  compression=compression)
+        if not r:
+            QMessageBox.critical(None, programName, msg, QMessageBox.Ok | QMessageBox.Default, QMessageBox.NoButton)
 
 
     def create_behavioral_strings(self, obsId, subj, plot_parameters):
@@ -9022,49 +8802,9 @@ item []:
         return the behavioral string for subject in obsId
         """
 
-        s = ""
-        currentStates = []
-        eventsWithStatus = project_function.events_start_stop(self.pj[ETHOGRAM], self.pj[OBSERVATIONS][obsId][EVENTS])
-
-        for event in eventsWithStatus:
-            if event[EVENT_SUBJECT_FIELD_IDX] == subj or (subj == NO_FOCAL_SUBJECT and event[EVENT_SUBJECT_FIELD_IDX] == ""):
+        sequences, vocabulary = behavioral_sequences.encode_sequences(self.pj, [obsId], subj, plot_parameters["include modifiers"])
 
-                if event[-1] == POINT:
-                    if currentStates:
-                        s += "+".join(currentStates) + "+" + event[EVENT_BEHAVIOR_FIELD_IDX]
-                    else:
-                        s += event[EVENT_BEHAVIOR_FIELD_IDX]
-
-                    if plot_parameters["include modifiers"]:
-                        s += "&" + event[EVENT_MODIFIER_FIELD_IDX].replace("|", "+")
-
-                    s += self.behaviouralStringsSeparator
-
-                if event[-1] == START:
-                    currentStates.append(event[EVENT_BEHAVIOR_FIELD_IDX])
-                    s += "+".join(currentStates)
-
-                    if plot_parameters["include modifiers"]:
-                        s += "&" + event[EVENT_MODIFIER_FIELD_IDX].replace("|", "+")
-                    s += self.behaviouralStringsSeparator
-
-                if event[-1] == STOP:
-
-                    if event[EVENT_BEHAVIOR_FIELD_IDX] in currentStates:
-                        currentStates.remove(event[EVENT_BEHAVIOR_FIELD_IDX])
-
-                    if currentStates:
-                        s += "+".join(currentStates)
-
-                        if plot_parameters["include modifiers"]:
-                            s += "&" + event[EVENT_MODIFIER_FIELD_IDX].replace("|", "+")
-                        s += self.behaviouralStringsSeparator
-
-        # remove last separator (if separator not empty)
-        if self.behaviouralStringsSeparator:
-            s = s[0: -len(self.behaviouralStringsSeparator)]
-
-        return s
+        return behavioral_sequences.sequence_to_string(sequences[0], vocabulary, self.behaviouralStringsSeparator)
 
     def export_string_events(self):
         """
@@ -9155,6 +8895,11 @@ item []:
         if not plot_parameters["selected subjects"] or not plot_parameters["selected behaviors"]:
             return
 
+        ngram, ok = QInputDialog.getInt(self, "Transitions", ("Length of behaviors sequences\n"
+                                                             "(2 for transitions between 2 behaviors)"), 2, 2, 10, 1)
+        if not ok:
+            return
+
         flagMulti = False
         if len(plot_parameters["selected subjects"]) == 1:
 
@@ -9173,16 +8918,11 @@ item []:
 
             logging.debug("subjects: {}".format(subject))
 
-            strings_list = []
-            for obsId in selectedObservations:
-                strings_list.append(self.create_behavioral_strings(obsId, subject, plot_parameters))
+            sequences, vocabulary = behavioral_sequences.encode_sequences(self.pj, selectedObservations, subject,
+                                                                          plot_parameters["include modifiers"],
+                                                                          extra_tokens=plot_parameters["selected behaviors"])
 
-            sequences, observed_behaviors = transitions.behavioral_strings_analysis(strings_list, self.behaviouralStringsSeparator)
-
-            observed_matrix = transitions.observed_transitions_matrix(sequences,
-                                                                      sorted(list(set(observed_behaviors +
-                                                                                      plot_parameters["selected behaviors"]))),
-                                                                      mode=mode)
+            observed_matrix = transitions.observed_transitions_matrix(sequences, vocabulary, mode=mode, ngram=ngram)
 
             if not observed_matrix:
                 QMessageBox.warning(self, programName, "No transitions found for <b>{}</b>".format(subject))
@@ -9193,10 +8933,11 @@ item []:
             if flagMulti:
                 try:
 
-                    nf = "{exportDir}{sep}{subject}_transitions_{mode}_matrix.tsv".format(exportDir=exportDir,
-                                                                                          sep=os.sep,
-                                                                                          subject=subject,
-                                                                                          mode=mode)
+                    nf = "{exportDir}{sep}{subject}_transitions_{ngram}{mode}_matrix.tsv".format(exportDir=exportDir,
+                                                                                                   sep=os.sep,
+                                                                                                   subject=subject,
+                                                                                                   ngram="{}-gram_".format(ngram) if ngram > 2 else "",
+                                                                                                   mode=mode)
 
                     if os.path.isfile(nf):
                         if dialog.MessageDialog(programName,
@@ -9217,6 +8958,73 @@ item []:
                     QMessageBox.critical(self, programName, "The file {} can not be saved".format(fileName))
 
 
+    def lag_sequential_analysis(self):
+        """
+        lag sequential analysis of selected observations, subjects and behaviors
+        (observed and expected transitions, adjusted residuals, z-scores and permutation p-values)
+        """
+
+        result, selectedObservations = self.selectObservations(MULTIPLE)
+        if not selectedObservations:
+            return
+
+        plot_parameters = self.choose_obs_subj_behav_category(selectedObservations, maxTime=0, flagShowIncludeModifiers=True,
+                                                              flagShowExcludeBehaviorsWoEvents=False)
+
+        if not plot_parameters["selected subjects"] or not plot_parameters["selected behaviors"]:
+            return
+
+        max_lag, ok = QInputDialog.getInt(self, "Lag sequential analysis", "Maximum lag", 1, 1, 20, 1)
+        if not ok:
+            return
+
+        n_permutations, ok = QInputDialog.getInt(self, "Lag sequential analysis",
+                                                 "Number of permutations for p-values\n(0 for no permutation test)",
+                                                 1000, 0, 1000000, 1000)
+        if not ok:
+            return
+
+        exportDir = QFileDialog(self).getExistingDirectory(self, "Choose a directory to save the lag sequential analysis",
+                                                           os.path.expanduser("~"), options=QFileDialog(self).ShowDirsOnly)
+        if not exportDir:
+            return
+
+        out = ""
+        for subject in plot_parameters["selected subjects"]:
+
+            sequences, vocabulary = behavioral_sequences.encode_sequences(self.pj, selectedObservations, subject,
+                                                                          plot_parameters["include modifiers"],
+                                                                          extra_tokens=plot_parameters["selected behaviors"])
+            if not sum([max(len(sequence) - 1, 0) for sequence in sequences]):
+                out += "No transitions found for <b>{}</b><br>".format(subject)
+                continue
+
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                results = lag_sequential.lag_sequential_analysis(sequences, len(vocabulary), max_lag=max_lag,
+                                                                 n_permutations=n_permutations)
+            finally:
+                QApplication.restoreOverrideCursor()
+
+            file_name = "{exportDir}{sep}{subject}_lag_sequential_analysis.tsv".format(exportDir=exportDir,
+                                                                                       sep=os.sep,
+                                                                                       subject=safeFileName(subject))
+            if os.path.isfile(file_name):
+                if dialog.MessageDialog(programName,
+                                        "A file with same name already exists.<br><b>{}</b>".format(file_name),
+                                        ["Overwrite", CANCEL]) == CANCEL:
+                    continue
+            try:
+                with open(file_name, "w") as outfile:
+                    outfile.write(lag_sequential.results_to_tsv(results, vocabulary))
+                out += "<b>{}</b> created<br>".format(file_name)
+            except:
+                out += "The file {} can not be saved<br>".format(file_name)
+
+        if out:
+            QMessageBox.information(self, programName, out)
+
+
     def transitions_dot_script(self):
         """
         create dot script (graphviz language) from transitions frequencies matrix
@@ -9299,9 +9107,16 @@ item []:
         """
 
         # check if re-encoding
-        if self.ffmpeg_recode_process:
-            QMessageBox.warning(self, programName, "BORIS is re-encoding/resizing a video. Please wait before closing.")
-            event.ignore()
+        if self.recode_queue and not self.recode_queue.is_finished():
+            response = dialog.MessageDialog(programName,
+                                            ("BORIS is re-encoding/resizing video(s).\n"
+                                             "Stop the re-encoding? It can be resumed at the next start."),
+                                            [YES, CANCEL])
+            if response == CANCEL:
+                event.ignore()
+                return
+            self.recode_queue.cancel()
+            self.recode_queue.wait()
 
         if self.projectChanged:
             response = dialog.MessageDialog(programName, "What to do about the current unsaved project?", [SAVE, DISCARD, CANCEL])
@@ -9337,78 +9152,50 @@ item []:
 
         if fileName:
             try:
-                fromProject = json.loads(open(fileName, "r").read())
+                observations_positions = observations_import.observations_positions(fileName)
             except:
                 QMessageBox.critical(self, programName, "This project file seems corrupted")
                 return
 
-            # transform time to decimal
-            fromProject = convert_time_to_decimal(fromProject)  # function in utilities.py
-
-            dbc = dialog.ChooseObservationsToImport("Choose the observations to import:", sorted(list(fromProject[OBSERVATIONS].keys())))
+            dbc = dialog.ChooseObservationsToImport("Choose the observations to import:", sorted(observations_positions))
 
             if dbc.exec_():
 
                 selected_observations = dbc.get_selected_observations()
                 if selected_observations:
-                    flagImported = False
-
-                    # set of behaviors in current projet ethogram
-                    behav_set = set([self.pj[ETHOGRAM][idx]["code"] for idx in self.pj[ETHOGRAM]])
-
-                    # set of subjects in current projet
-                    subjects_set = set([self.pj[SUBJECTS][idx]["name"] for idx in self.pj[SUBJECTS]])
-
-                    for obsId in selected_observations:
-
-                        # check if behaviors are in current project ethogram
-                        new_behav_set = set([event[EVENT_BEHAVIOR_FIELD_IDX] for event in fromProject[OBSERVATIONS][obsId][EVENTS]
-                                             if event[EVENT_BEHAVIOR_FIELD_IDX] not in behav_set])
-                        if new_behav_set:
-                            diag_result = dialog.MessageDialog(programName,
-                                                               ("Some coded behaviors in <b>{}</b> are"
-                                                                "not in the ethogram:<br><b>{}</b>").format(obsId,
-                                                                                                            ", ".join(new_behav_set)),
-                                                               ["Interrupt import", "Skip observation", "Import observation"])
-                            if diag_result == "Interrupt import":
-                                return
-                            if diag_result == "Skip observation":
-                                continue
-
-                        # check if subjects are in current project
-                        new_subject_set = set([event[EVENT_SUBJECT_FIELD_IDX] for event in fromProject[OBSERVATIONS][obsId][EVENTS]
-                                               if event[EVENT_SUBJECT_FIELD_IDX] not in subjects_set])
-                        if new_subject_set and new_subject_set != {""}:
-                            diag_result = dialog.MessageDialog(programName,
-                                                               ("Some coded subjects in <b>{}</b> are not defined in the project:<br>"
-                                                                "<b>{}</b>").format(obsId,
-                                                                                    ", ".join(new_subject_set)),
-                                                               ["Interrupt import", "Skip observation", "Import observation"])
-
-                            if diag_result == "Interrupt import":
-                                return
 
-                            if diag_result == "Skip observation":
-                                continue
+                    try:
+                        observations = observations_import.read_observations(fileName, selected_observations, observations_positions)
+                    except:
+                        QMessageBox.critical(self, programName, "This project file seems corrupted")
+                        return
 
-                        if obsId in self.pj[OBSERVATIONS].keys():
-                            diag_result = dialog.MessageDialog(programName,
-                                                               ("The observation <b>{}</b>"
-                                                                "already exists in the current project.<br>").format(obsId),
-                                                               ["Interrupt import", "Skip observation", "Rename observation"])
-                            if diag_result == "Interrupt import":
-                                return
-
-                            if diag_result == "Rename observation":
-                                self.pj[OBSERVATIONS]["{} (imported at {})".format(obsId,
-                                                                                   datetime_iso8601()
-                                                                                   )] = dict(fromProject[OBSERVATIONS][obsId])
-                                flagImported = True
-                        else:
-                            self.pj[OBSERVATIONS][obsId] = dict(fromProject[OBSERVATIONS][obsId])
-                            flagImported = True
+                    conflicts = observations_import.check_observations(self.pj, observations)
+                    if conflicts:
+                        report = []
+                        for obsId in sorted(conflicts)[:observations_import.REPORT_MAX_OBSERVATIONS]:
+                            problems = []
+                            if conflicts[obsId]["behaviors"]:
+                                problems.append("behaviors not in the ethogram: {}".format(", ".join(sorted(conflicts[obsId]["behaviors"]))))
+                            if conflicts[obsId]["subjects"]:
+                                problems.append("subjects not defined in the project: {}".format(", ".join(sorted(conflicts[obsId]["subjects"]))))
+                            if conflicts[obsId]["exists"]:
+                                problems.append("already exists in the current project (it will be renamed)")
+                            report.append("<b>{}</b>: {}".format(obsId, "; ".join(problems)))
+                        if len(conflicts) > observations_import.REPORT_MAX_OBSERVATIONS:
+                            report.append("and {} other observations".format(len(conflicts) - observations_import.REPORT_MAX_OBSERVATIONS))
+
+                        diag_result = dialog.MessageDialog(programName,
+                                                           ("Some observations to import are not compatible with the current project:<br><br>"
+                                                            "{}").format("<br>".join(report)),
+                                                           ["Interrupt import", "Skip these observations", "Import all observations"])
+                        if diag_result == "Interrupt import":
+                            return
+                        if diag_result == "Skip these observations":
+                            observations = {obsId: observations[obsId] for obsId in observations if obsId not in conflicts}
 
-                    if flagImported:
+                    if observations_import.merge_observations(self.pj, observations):
+                        self.projectChanged = True
                         QMessageBox.information(self, programName, "Observations imported successfully")
 
 
@@ -9507,7 +9294,7 @@ item []:
 
                 elif self.media_list.count() > 1:
 
-                    newTime = (sum(self.duration[0: self.media_list.index_of_item(self.mediaplayer.get_media())]) +
+                    newTime = (self.media_offsets_index[PLAYER1].offset(self.media_list.index_of_item(self.mediaplayer.get_media())) +
                                self.mediaplayer.get_time()) - self.fast * 1000
                     if newTime < self.fast * 1000:
                         newTime = 0
@@ -9529,7 +9316,7 @@ item []:
                                 self.mediaListPlayer.pause()
 
                             self.mediaplayer.set_time(newTime -
-                                                      sum(self.duration[0: self.media_list.index_of_item(self.mediaplayer.get_media())]))
+                                                      self.media_offsets_index[PLAYER1].offset(self.media_list.index_of_item(self.mediaplayer.get_media())))
 
                             break
                         tot += d
@@ -9555,10 +9342,10 @@ item []:
 
                 self.FFmpegGlobalFrame += self.fast * list(self.fps.values())[0]
 
-                if self.FFmpegGlobalFrame * (1000 / list(self.fps.values())[0]) >= sum(self.duration):
+                if self.FFmpegGlobalFrame * (1000 / list(self.fps.values())[0]) >= self.media_offsets_index[PLAYER1].total:
                     logging.debug("end of last media")
-                    self.FFmpegGlobalFrame = int(sum(self.duration) * list(self.fps.values())[0] / 1000)-1
-                    logging.debug("FFmpegGlobalFrame {}  sum duration {}".format(self.FFmpegGlobalFrame, sum(self.duration)))
+                    self.FFmpegGlobalFrame = int(self.media_offsets_index[PLAYER1].total * list(self.fps.values())[0] / 1000)-1
+                    logging.debug("FFmpegGlobalFrame {}  sum duration {}".format(self.FFmpegGlobalFrame, self.media_offsets_index[PLAYER1].total))
 
                 if self.FFmpegGlobalFrame > 0:
                     self.FFmpegGlobalFrame -= 1
@@ -9566,10 +9353,10 @@ item []:
                 if self.second_player():
 
                     self.FFmpegGlobalFrame2 += self.fast * list(self.fps2.values())[0]
-                    if self.FFmpegGlobalFrame2 * (1000 / list(self.fps2.values())[0]) >= sum(self.duration2):
+                    if self.FFmpegGlobalFrame2 * (1000 / list(self.fps2.values())[0]) >= self.media_offsets_index[PLAYER2].total:
                         logging.debug("end of last media")
-                        self.FFmpegGlobalFrame2 = int(sum(self.duration2) * list(self.fps2.values())[0] / 1000)-1
-                        logging.debug("FFmpegGlobalFrame2 {}  sum duration2 {}".format(self.FFmpegGlobalFrame2, sum(self.duration2)))
+                        self.FFmpegGlobalFrame2 = int(self.media_offsets_index[PLAYER2].total * list(self.fps2.values())[0] / 1000)-1
+                        logging.debug("FFmpegGlobalFrame2 {}  sum duration2 {}".format(self.FFmpegGlobalFrame2, self.media_offsets_index[PLAYER2].total))
 
                     if self.FFmpegGlobalFrame2 > 0:
                         self.FFmpegGlobalFrame2 -= 1
@@ -9589,9 +9376,9 @@ item []:
 
                 elif self.media_list.count() > 1:
 
-                    newTime = (sum(self.duration[0: self.media_list.index_of_item(self.mediaplayer.get_media())]) +
+                    newTime = (self.media_offsets_index[PLAYER1].offset(self.media_list.index_of_item(self.mediaplayer.get_media())) +
                                self.mediaplayer.get_time()) + self.fast * 1000
-                    if newTime < sum(self.duration):
+                    if newTime < self.media_offsets_index[PLAYER1].total:
                         # remember if player paused (go previous will start playing)
                         flagPaused = self.mediaListPlayer.get_state() == vlc.State.Paused
 
@@ -9608,8 +9395,7 @@ item []:
                                 if flagPaused:
                                     self.mediaListPlayer.pause()
 
-                                self.mediaplayer.set_time(newTime - sum(
-                                    self.duration[0: self.media_list.index_of_item(self.mediaplayer.get_media())]))
+                                self.mediaplayer.set_time(newTime - self.media_offsets_index[PLAYER1].offset(self.media_list.index_of_item(self.mediaplayer.get_media())))
 
                                 break
                             tot += d
@@ -9672,27 +9458,11 @@ if __name__ == "__main__":
             time.sleep(0.001)
             app.processEvents()
 
-    availablePlayers = []
+    if options.profile_startup:
+        startup_profile.mark("splash screen")
 
-    # load VLC
-    import vlc
-    if vlc.dll is None:
-        logging.critical("VLC media player not found")
-        QMessageBox.critical(None, programName, "This program requires the VLC media player.<br>Go to http://www.videolan.org/vlc",
-                             QMessageBox.Ok | QMessageBox.Default, QMessageBox.NoButton)
-        sys.exit(1)
-
-    availablePlayers.append(VLC)
-
-    logging.debug("VLC version {}".format(vlc.libvlc_get_version().decode("utf-8")))
-    if vlc.libvlc_get_version().decode("utf-8") < VLC_MIN_VERSION:
-        QMessageBox.critical(None, programName, ("The VLC media player seems very old ({}).<br>"
-                                                 "Go to http://www.videolan.org/vlc to update it").format(vlc.libvlc_get_version()),
-                             QMessageBox.Ok | QMessageBox.Default, QMessageBox.NoButton)
-
-        logging.critical(("The VLC media player seems a little bit old... ({})."
-                          "Go to http://www.videolan.org/vlc to update it").format(vlc.libvlc_get_version()))
-        sys.exit(2)
+    # VLC is checked before the first media observation (see check_vlc)
+    availablePlayers = [VLC]
 
     # check FFmpeg
     ret, msg = check_ffmpeg_path()
@@ -9703,6 +9473,9 @@ if __name__ == "__main__":
     else:
         ffmpeg_bin = msg
 
+    if options.profile_startup:
+        startup_profile.mark("FFmpeg check")
+
     # check matplotlib
     if not FLAG_MATPLOTLIB_INSTALLED:
         QMessageBox.warning(None, programName,
@@ -9713,6 +9486,9 @@ if __name__ == "__main__":
     app.setApplicationName(programName)
     window = MainWindow(availablePlayers, ffmpeg_bin)
 
+    if options.profile_startup:
+        startup_profile.mark("main window")
+
     # open project/start observation on command line
     project_to_open = ""
     observation_to_open = ""
@@ -9756,6 +9532,10 @@ if __name__ == "__main__":
     window.show()
     window.raise_()
 
+    if options.profile_startup:
+        startup_profile.mark("project opening and main window display")
+        startup_profile.report()
+
     # connect events filter when app focus changes
     app.focusChanged.connect(window.changedFocusSlot)
 
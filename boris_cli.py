@@ -19,224 +19,448 @@ Copyright 2012-2018 Olivier Friard
   along with this program; if not, write to the Free Software
   Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
   MA 02110-1301, USA.
+
+
+Headless batch analysis: one subcommand by analysis, e.g.
+
+    python3 boris_cli.py -p project.boris -o "obs*" -o "test 1" --jobs 4 time_budget
+    python3 boris_cli.py -p project.boris -r json -O checks.json check
+    python3 boris_cli.py -p project.boris export --format parquet --output-dir exports
+
+The observations are selected by id or shell-style pattern ("all" for all observations)
+and are analyzed in parallel with a pool of processes (--jobs).
+The results are written as TSV or JSON on stdout or in a file.
+
+Exit codes:
+    0: OK
+    1: the analysis of at least one observation failed (e.g. unpaired state events, export error)
+    2: usage error (invalid arguments, observation not found)
+    3: project not found or invalid
 """
 
 import argparse
-import sys
+import csv
+import decimal
+import fnmatch
+import itertools
+import json
+import multiprocessing
+import os
 import re
+import sys
+
 import utilities
 import project_functions
 from config import *
 import db_functions
 import export_observation
 import irr
-
+import time_budget_functions
+import behavioral_sequences
+import transitions
 
 
 __version__ = "6.1"
 __version_date__ = "2018-02-23"
 
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_PROJECT_ERROR = 3
+
+RESULTS_FORMATS = ["tsv", "json"]
+
+
 def cleanhtml(raw_html):
     raw_html = raw_html.replace("<br>", "\n")
     cleanr = re.compile("<.*?>")
     cleantext = re.sub(cleanr, "", raw_html)
     return cleantext
 
-commands_list = ["check_state_events", "export_events", "irr", "subtitles"]
 
-parser = argparse.ArgumentParser(description="BORIS CLI")
-parser.add_argument("-v", "--version", action="store_true", dest='version', help='BORIS version')
+class CliError(Exception):
+    """
+    error stopping the command with an exit code
+    """
+    def __init__(self, message, exit_code=EXIT_USAGE):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+def select_observations(pj, patterns):
+    """
+    id of observations matching the patterns
+
+    Args:
+        pj (dict): project
+        patterns (list): observations id or shell-style patterns ("all" for all observations)
 
-parser.add_argument("-p", "--project", action="store", dest='project_file', help='Project file path')
+    Returns:
+        list: sorted list of observations id
+    """
 
-parser.add_argument("-o", "--observation", nargs = '*', action="store", default=[], dest='observation_id', help='Observation id')
+    observations = sorted(pj[OBSERVATIONS].keys())
+    if not patterns or "all" in patterns:
+        return observations
 
-parser.add_argument("-i", "--info", action="store_true", dest='project_info', help='Project information')
+    selected = []
+    for pattern in patterns:
+        matching = [obs_id for obs_id in observations if fnmatch.fnmatchcase(obs_id, pattern)]
+        if not matching:
+            raise CliError("Observation not found: {}".format(pattern))
+        selected.extend([obs_id for obs_id in matching if obs_id not in selected])
 
-parser.add_argument("--command", nargs = '*', action="store", dest='command', help='Command to execute')
+    return selected
 
-args = parser.parse_args()
 
-pj = {}
-observations_id_list = []
+def all_subjects_behaviors(pj):
+    """
+    parameters with all subjects (and no focal subject) and all behaviors of project
 
-if args.version:
-    print("version {}".format(__version__))
-    sys.exit()
+    Args:
+        pj (dict): project
 
-if args.project_file:
+    Returns:
+        dict: parameters (selected subjects, selected behaviors)
+    """
+    return {"selected subjects": [pj[SUBJECTS][k]["name"] for k in utilities.sorted_keys(pj[SUBJECTS])] + [NO_FOCAL_SUBJECT],
+            "selected behaviors": [pj[ETHOGRAM][k]["code"] for k in utilities.sorted_keys(pj[ETHOGRAM])]}
 
-    if not args.command:
-        print("Project path: {}".format(args.project_file))
+
+def project_subset(pj, observations_id):
+    """
+    project restricted to the observations (sent to the workers)
+    """
+    subset = {key: pj[key] for key in pj if key != OBSERVATIONS}
+    subset[OBSERVATIONS] = {obs_id: pj[OBSERVATIONS][obs_id] for obs_id in observations_id}
+    return subset
+
+
+def run_parallel(function, tasks, jobs):
+    """
+    results of function for each task with a pool of processes (in order of tasks).
+    For windows exe (created with pyinstaller) multiprocessing can not be used: the tasks are run in sequence.
+
+    Args:
+        function (function): function with one argument (module level function)
+        tasks (list): arguments of function
+        jobs (int): number of processes (0 for number of CPU)
+
+    Returns:
+        list: results
+    """
+
+    if jobs <= 0:
+        jobs = multiprocessing.cpu_count()
+    if jobs == 1 or len(tasks) < 2 or (sys.platform.startswith("win") and getattr(sys, "frozen", False)):
+        return [function(task) for task in tasks]
+
+    with multiprocessing.Pool(min(jobs, len(tasks))) as pool:
+        return pool.map(function, tasks)
+
+
+def _json_default(value):
+    """
+    JSON conversion of Decimal (and other values)
+    """
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return str(value)
+
+
+def write_results(command, fields, rows, results_format, results_file):
+    """
+    write the results
+
+    Args:
+        command (str): command
+        fields (list): fields of rows
+        rows (list): list of dict
+        results_format (str): "tsv" or "json"
+        results_file (str): path of file ("-" for stdout)
+    """
+
+    f_out = sys.stdout if results_file == "-" else open(results_file, "w", newline="", encoding="utf-8")
+    try:
+        if results_format == "json":
+            f_out.write(json.dumps({"command": command, "results": [{field: row.get(field, "") for field in fields}
+                                                                    for row in rows]},
+                                   default=_json_default, indent=1) + "\n")
+        else:
+            writer = csv.writer(f_out, delimiter="\t", lineterminator="\n")
+            writer.writerow(fields)
+            for row in rows:
+                writer.writerow([row.get(field, "") for field in fields])
+    finally:
+        if f_out is not sys.stdout:
+            f_out.close()
+
+
+def _check_worker(args):
+    pj, obs_id = args
+    ok, msg = project_functions.check_state_events_obs(obs_id, pj[ETHOGRAM], pj[OBSERVATIONS][obs_id], HHMMSS)
+    return {"observation": obs_id, "ok": ok, "message": cleanhtml(msg).strip()}
+
+
+def _irr_worker(args):
+    pj, parameters, obs_id1, obs_id2, interval, include_modifiers = args
+    ok, msg, db_connector = db_functions.load_aggregated_events_in_db(pj, parameters["selected subjects"], [obs_id1, obs_id2],
+                                                                      parameters["selected behaviors"])
+    if not ok:
+        return {"observation 1": obs_id1, "observation 2": obs_id2, "ok": False, "message": cleanhtml(msg).strip()}
+    K, _ = irr.cohen_kappa(db_connector.cursor(), obs_id1, obs_id2, interval, parameters["selected subjects"], include_modifiers)
+    return {"observation 1": obs_id1, "observation 2": obs_id2, "interval": interval, "kappa": K, "ok": True, "message": ""}
+
+
+def _subtitles_worker(args):
+    pj, obs_id, parameters, export_dir = args
+    ok, msg = project_functions.create_subtitles(pj, [obs_id], parameters, export_dir)
+    return {"observation": obs_id, "ok": ok, "message": cleanhtml(msg).strip()}
+
+
+def _transitions_worker(args):
+    pj, observations_id, subject, include_modifiers, mode = args
+    sequences, vocabulary = behavioral_sequences.encode_sequences(pj, observations_id, subject, include_modifiers)
+    matrix = transitions.transitions_view(transitions.transitions_counts(sequences, len(vocabulary)), mode)
+    return [{"subject": subject, "from": vocabulary[from_], "to": vocabulary[to], mode: matrix[from_, to].item()}
+            for from_, to in zip(*matrix.nonzero())]
+
+
+def command_info(pj, observations_id, args):
+    """
+    project information and list of observations
+    """
+    rows = [{"observation": obs_id,
+             "date": pj[OBSERVATIONS][obs_id].get("date", ""),
+             "type": pj[OBSERVATIONS][obs_id].get(TYPE, ""),
+             "events": len(pj[OBSERVATIONS][obs_id][EVENTS]),
+             "description": utilities.eol2space(pj[OBSERVATIONS][obs_id].get("description", ""))}
+            for obs_id in observations_id]
+    return ["observation", "date", "type", "events", "description"], rows, EXIT_OK
+
+
+def command_check(pj, observations_id, args):
+    """
+    check state events of observations
+    """
+    rows = run_parallel(_check_worker, [(project_subset(pj, [obs_id]), obs_id) for obs_id in observations_id], args.jobs)
+    return ["observation", "ok", "message"], rows, EXIT_OK if all([row["ok"] for row in rows]) else EXIT_FAILURE
+
+
+def command_export(pj, observations_id, args):
+    """
+    export events of observations (one file by observation)
+    """
+    kind = export_observation.EVENTS_EXPORT if args.command == "export" else export_observation.AGGREGATED_EVENTS_EXPORT
+    results = [result for result in export_observation.parallel_export(pj, all_subjects_behaviors(pj), observations_id, kind,
+                                                                       args.output_dir, args.format,
+                                                                       compression=args.compression, max_workers=args.jobs)
+               if result is not None]
+    order = {obs_id: idx for idx, obs_id in enumerate(observations_id)}
+    rows = [{"observation": obs_id, "file": file_name, "ok": ok, "message": msg}
+            for obs_id, file_name, ok, msg in sorted(results, key=lambda result: order[result[0]])]
+    return ["observation", "file", "ok", "message"], rows, EXIT_OK if all([row["ok"] for row in rows]) else EXIT_FAILURE
+
+
+def command_aggregated(pj, observations_id, args):
+    """
+    export aggregated events of observations in one file (one file by observation with --split)
+    """
+    # the aggregation of events requires paired state events
+    checks = project_functions.check_state_events(pj, observations_id, HHMMSS)
+    rows = [{"observation": obs_id, "ok": False, "message": cleanhtml(checks[obs_id][1]).strip()}
+            for obs_id in observations_id if not checks[obs_id][0]]
+
+    if args.split:
+        # the observations with unpaired state events are not exported
+        paired = [obs_id for obs_id in observations_id if checks[obs_id][0]]
+        fields, export_rows, exit_code = command_export(pj, paired, args) if paired else (None, [], EXIT_OK)
+        results = {row["observation"]: row for row in rows + export_rows}
+        return (["observation", "file", "ok", "message"], [results[obs_id] for obs_id in observations_id if obs_id in results],
+                EXIT_FAILURE if rows else exit_code)
+
+    if rows:
+        return ["observation", "ok", "message"], rows, EXIT_FAILURE
+
+    parameters = all_subjects_behaviors(pj)
+    file_name = args.file if args.file else os.path.join(args.output_dir, "aggregated_events." + args.format)
+    if args.format in export_observation.ARROW_FORMATS:
+        ok, msg = export_observation.write_arrow(export_observation.aggregated_events_columns(pj),
+                                                 (export_observation.export_aggregated_events(pj, parameters, obs_id)
+                                                  for obs_id in observations_id),
+                                                 file_name, args.format, args.compression)
+    else:
+        ok, msg = export_observation.write_rows(itertools.chain([export_observation.aggregated_events_header(pj)],
+                                                                *[export_observation.export_aggregated_events(pj, parameters, obs_id)
+                                                                  for obs_id in observations_id]),
+                                                file_name, args.format, title="Aggregated events")
+    return ["file", "ok", "message"], [{"file": file_name, "ok": ok, "message": msg}], EXIT_OK if ok else EXIT_FAILURE
+
+
+def command_time_budget(pj, observations_id, args):
+    """
+    time budget of each observation (of all observations with --grouped)
+    """
+    parameters = all_subjects_behaviors(pj)
+    parameters.update({"include modifiers": args.include_modifiers,
+                       "exclude behaviors": True,
+                       "time": TIME_FULL_OBS})
+
+    if args.grouped:
+        out, _, total_length = time_budget_functions.time_budget(pj, observations_id, parameters)
+        rows = [dict(row, observation="", **{"total length": total_length}) for row in out]
+    else:
+        results = {}
+        for obs_id, out, _, min_time, max_time in time_budget_functions.parallel_time_budget(pj, observations_id, parameters,
+                                                                                           max_workers=args.jobs):
+            results[obs_id] = [dict(row, observation=obs_id, **{"total length": max_time - min_time}) for row in out]
+        rows = [row for obs_id in observations_id for row in results[obs_id]]
+
+    return (["observation", "total length"] + time_budget_functions.TIME_BUDGET_FIELDS, rows,
+            EXIT_FAILURE if [row for row in rows if row["number"] == UNPAIRED] else EXIT_OK)
+
+
+def command_transitions(pj, observations_id, args):
+    """
+    transitions between behaviors of each subject (non-zero transitions)
+    """
+    subjects = all_subjects_behaviors(pj)["selected subjects"]
+    results = run_parallel(_transitions_worker,
+                           [(project_subset(pj, observations_id), observations_id, subject, args.include_modifiers, args.mode)
+                            for subject in subjects],
+                           args.jobs)
+    return ["subject", "from", "to", args.mode], [row for rows in results for row in rows], EXIT_OK
+
+
+def command_irr(pj, observations_id, args):
+    """
+    Cohen's kappa between each pair of observations
+    """
+    if len(observations_id) < 2:
+        raise CliError("Select at least 2 observations")
+    parameters = all_subjects_behaviors(pj)
+    interval = utilities.float2decimal(args.interval)
+    rows = run_parallel(_irr_worker,
+                        [(project_subset(pj, [obs_id1, obs_id2]), parameters, obs_id1, obs_id2, interval, args.include_modifiers)
+                         for obs_id1, obs_id2 in itertools.combinations(observations_id, 2)],
+                        args.jobs)
+    return (["observation 1", "observation 2", "interval", "kappa", "ok", "message"], rows,
+            EXIT_OK if all([row["ok"] for row in rows]) else EXIT_FAILURE)
+
+
+def command_subtitles(pj, observations_id, args):
+    """
+    subtitles of observations
+    """
+    parameters = all_subjects_behaviors(pj)
+    parameters["include modifiers"] = True
+    rows = run_parallel(_subtitles_worker,
+                        [(project_subset(pj, [obs_id]), obs_id, parameters, args.output_dir) for obs_id in observations_id],
+                        args.jobs)
+    return ["observation", "ok", "message"], rows, EXIT_OK if all([row["ok"] for row in rows]) else EXIT_FAILURE
+
+
+COMMANDS = {"info": command_info,
+            "check": command_check,
+            "export": command_export,
+            "aggregated": command_aggregated,
+            "time_budget": command_time_budget,
+            "transitions": command_transitions,
+            "irr": command_irr,
+            "subtitles": command_subtitles}
+
+
+def arguments_parser():
+    """
+    parser of command line arguments
+
+    Returns:
+        argparse.ArgumentParser: parser
+    """
+
+    parser = argparse.ArgumentParser(description="BORIS CLI - headless batch analysis")
+    parser.add_argument("-v", "--version", action="version", version="version {}".format(__version__), help="BORIS version")
+    parser.add_argument("-p", "--project", action="store", dest="project_file", required=True, help="Project file path")
+    parser.add_argument("-o", "--observation", action="append", default=[], dest="observations",
+                        help="Observation id or shell-style pattern, can be repeated (default: all observations)")
+    parser.add_argument("-j", "--jobs", action="store", type=int, default=1,
+                        help="Number of observations analyzed in parallel (0 for number of CPU)")
+    parser.add_argument("-r", "--results-format", action="store", choices=RESULTS_FORMATS, default="tsv",
+                        help="Format of results (default: tsv)")
+    parser.add_argument("-O", "--results-file", action="store", default="-",
+                        help="File for results (default: standard output)")
+
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    subparsers.required = True
+
+    subparsers.add_parser("info", help="List of observations")
+
+    subparsers.add_parser("check", help="Check state events")
+
+    export_formats = ["tsv", "csv", "ods", "xlsx", "xls", "html"] + export_observation.ARROW_FORMATS
+    for command, help_ in [("export", "Export events (one file by observation)"),
+                           ("aggregated", "Export aggregated events")]:
+        subparser = subparsers.add_parser(command, help=help_)
+        subparser.add_argument("-f", "--format", choices=export_formats, default="tsv", help="Format of files (default: tsv)")
+        subparser.add_argument("-d", "--output-dir", default=".", help="Directory for files (default: current directory)")
+        subparser.add_argument("-c", "--compression", default=None, help="Compression of Parquet and Feather files")
+        if command == "aggregated":
+            subparser.add_argument("--file", default="", help="File name (default: aggregated_events.FORMAT)")
+            subparser.add_argument("--split", action="store_true", help="One file by observation in output directory")
+
+    subparser = subparsers.add_parser("time_budget", help="Time budget")
+    subparser.add_argument("-m", "--include-modifiers", action="store_true", help="Include modifiers")
+    subparser.add_argument("-g", "--grouped", action="store_true", help="Time budget of all selected observations")
+
+    subparser = subparsers.add_parser("transitions", help="Transitions between behaviors by subject")
+    subparser.add_argument("-m", "--include-modifiers", action="store_true", help="Include modifiers")
+    subparser.add_argument("--mode", choices=transitions.MODES, default="frequency", help="Values of transitions")
+
+    subparser = subparsers.add_parser("irr", help="Cohen's kappa between each pair of observations")
+    subparser.add_argument("-i", "--interval", type=float, default=1, help="Interval of time (in seconds)")
+    subparser.add_argument("-m", "--include-modifiers", action="store_true", help="Include modifiers")
+
+    subparser = subparsers.add_parser("subtitles", help="Create subtitles")
+    subparser.add_argument("-d", "--output-dir", default=".", help="Directory for subtitles (default: current directory)")
+
+    return parser
+
+
+def main(argv=None):
+    """
+    run the command
+
+    Args:
+        argv (list): command line arguments (default: sys.argv[1:])
+
+    Returns:
+        int: exit code
+    """
+
+    args = arguments_parser().parse_args(argv)
 
     project_path, project_changed, pj, msg = project_functions.open_project_json(args.project_file)
     if "error" in pj:
-        print(pj["error"])
-        sys.exit()
+        print(pj["error"], file=sys.stderr)
+        return EXIT_PROJECT_ERROR
     if msg:
-        print(msg)
-
-if args.observation_id:
-    observations_id_list = args.observation_id
-
-    if not args.command:
-        print("\nObservations:")
-        for observation_id in observations_id_list:
-            if observation_id in pj[OBSERVATIONS]:
-                print("Id: {}".format(observation_id))
-            else:
-                print("{}: NOT FOUND in project".format(observation_id))
-        print()
-
-if args.project_info:
-    if not args.command:
-        if pj:
-            print("Project name: {}".format(pj[PROJECT_NAME]))
-            print("Project date: {}".format(pj[PROJECT_DATE]))
-            print("Project description: {}".format(pj[PROJECT_DESCRIPTION]))
-            print()
-    
-            if not observations_id_list:
-                print("Ethogram\n========")
-                print("Number of behaviors in ethogram: {}".format(len(pj[ETHOGRAM])))
-                for idx in utilities.sorted_keys(pj[ETHOGRAM]):
-                    print("Code: {}\tDescription: {}\tType: {}".format(pj[ETHOGRAM][idx][BEHAVIOR_CODE],
-                                                                       pj[ETHOGRAM][idx]["description"],
-                                                                       pj[ETHOGRAM][idx][TYPE]
-                                                                       ))
-                '''print("Behaviors: {}".format(",".join([pj[ETHOGRAM][k]["code"] for k in utilities.sorted_keys(pj[ETHOGRAM])])))'''
-                print()
-                
-                print("Subjects\n========")
-                print("Number of subjects: {}".format(len(pj[SUBJECTS])))
-                for idx in utilities.sorted_keys(pj[SUBJECTS]):
-                    print("Name: {}\tDescription: {}".format(pj[SUBJECTS][idx]["name"], pj[SUBJECTS][idx]["description"]))
-                print()
-
-                print("Observations\n============")
-                print("Number of observations: {}".format(len(pj[OBSERVATIONS])))
-                print("List of observations:")
-                for observation_id in sorted(pj[OBSERVATIONS].keys()):
-                    print("Id: {}\tDate: {}".format(observation_id, pj[OBSERVATIONS][observation_id]["date"]))
-                #print("Observations' id: {}".format(",".join(sorted(pj[OBSERVATIONS].keys()))))
-            else:
-                for observation_id in observations_id_list:
-                    print("Observation id: {}".format(observation_id))
-                    if pj[OBSERVATIONS][observation_id][EVENTS]:
-                        
-                        for event in pj[OBSERVATIONS][observation_id][EVENTS]:
-                            print("\t".join([str(x) for x in event]))
-                    else:
-                        print("No events recorded")
-                    print()
-        else:
-            print("No project")
-        sys.exit()
-
-
-
-if args.command:
-
-    print("Command: {}\n".format(" ".join(args.command)))
-    
-    if not pj:
-        print("No project")
-        sys.exit()
-
-    if not observations_id_list:
-        print("No observation")
-        sys.exit()
-    
-    if "check_state_events" in args.command:
-        for observation_id in observations_id_list:
-            ret, msg = project_functions.check_state_events_obs(observation_id, pj[ETHOGRAM], pj[OBSERVATIONS][observation_id], HHMMSS)
-            print("{}: {}".format(observation_id, cleanhtml(msg)))
-        sys.exit()
-
-    if "export_events" in args.command:
-        behaviors = [pj[ETHOGRAM][k]["code"] for k in utilities.sorted_keys(pj[ETHOGRAM])]
-        subjects = [pj[SUBJECTS][k]["name"] for k in utilities.sorted_keys(pj[SUBJECTS])] + [NO_FOCAL_SUBJECT]
-
-        output_format = "tsv"
-        if len(args.command) > 1:
-            output_format = args.command[1]
-        
-        for observation_id in observations_id_list:
-            ok, msg = export_observation.export_events({"selected subjects": subjects,
-                                              "selected behaviors": behaviors},
-                                              observation_id,
-                                              pj[OBSERVATIONS][observation_id],
-                                              pj[ETHOGRAM],
-                                              utilities.safeFileName(observation_id + "." + output_format),
-                                              output_format)
-            if not ok:
-                print(msg)
-            
-        sys.exit()
-
-
-    if "irr" in args.command:
-        if len(observations_id_list) != 2:
-            print("select 2 observations")
-            sys.exit()
-
-        behaviors = [pj[ETHOGRAM][k]["code"] for k in utilities.sorted_keys(pj[ETHOGRAM])]
-        subjects = [pj[SUBJECTS][k]["name"] for k in utilities.sorted_keys(pj[SUBJECTS])] + [NO_FOCAL_SUBJECT]
-        
-        ok, msg, db_connector = db_functions.load_aggregated_events_in_db(pj,
-                                                           subjects,
-                                                           observations_id_list,
-                                                           behaviors)
-
-        if not ok:
-            print(cleanhtml(msg))
-            sys.exit()
-
-        cursor = db_connector.cursor()
-
-        interval = 1
-        if len(args.command) > 1:
-            interval = utilities.float2decimal(args.command[1])
-
-        include_modifiers = True
-        if len(args.command) > 2:
-            include_modifiers =  "TRUE" in args.command[2].upper()
-
-        K, out = irr.cohen_kappa(cursor,
-                                  observations_id_list[0], observations_id_list[1],
-                                  interval,
-                                  subjects,
-                                  include_modifiers)
-
-        print(("Cohen's Kappa - Index of Inter-Rater Reliability\n\n"
-              "Interval time: {interval:.3f} s\n").format(interval=interval))
-
-        print(out)
-        sys.exit()
-
-    if "subtitles" in args.command:
-        behaviors = [pj[ETHOGRAM][k]["code"] for k in utilities.sorted_keys(pj[ETHOGRAM])]
-        subjects = [pj[SUBJECTS][k]["name"] for k in utilities.sorted_keys(pj[SUBJECTS])] + [NO_FOCAL_SUBJECT]
-
-        export_dir = "."
-        if len(args.command) > 1:
-            export_dir = args.command[1]
-
-        ok, msg = project_functions.create_subtitles(pj,
-                                           observations_id_list,
-                                           {"selected subjects": subjects,
-                                           "selected behaviors": behaviors,
-                                           "include modifiers": True},
-                                           export_dir)
-        if not ok:
-            print(cleanhtml(msg))
-        sys.exit()
-
-    if "list" in args.command:
-        print("Available commands:\n{}".format("\n".join(commands_list)))
-        sys.exit()
-
-    print("Command not found")
-    
-    
-    
+        print(cleanhtml(msg), file=sys.stderr)
+
+    try:
+        observations_id = select_observations(pj, args.observations)
+        if not observations_id and args.command != "info":
+            raise CliError("No observation")
+        fields, rows, exit_code = COMMANDS[args.command](pj, observations_id, args)
+        write_results(args.command, fields, rows, args.results_format, args.results_file)
+    except CliError as error:
+        print(str(error), file=sys.stderr)
+        return error.exit_code
+    except BrokenPipeError:
+        # standard output closed (e.g. results piped to head)
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -369,6 +369,8 @@ class Ui_MainWindow(object):
         self.actionAll_transitions.setObjectName(_fromUtf8("actionAll_transitions"))
         self.actionNumber_of_transitions = QtGui.QAction(MainWindow)
         self.actionNumber_of_transitions.setObjectName(_fromUtf8("actionNumber_of_transitions"))
+        self.actionLag_sequential_analysis = QtGui.QAction(MainWindow)
+        self.actionLag_sequential_analysis.setObjectName(_fromUtf8("actionLag_sequential_analysis"))
         self.actionFrequencies_of_transitions_after_behaviors = QtGui.QAction(MainWindow)
         self.actionFrequencies_of_transitions_after_behaviors.setObjectName(_fromUtf8("actionFrequencies_of_transitions_after_behaviors"))
         self.actionFind_replace_events = QtGui.QAction(MainWindow)
@@ -429,6 +431,8 @@ class Ui_MainWindow(object):
         self.actionCohen_s_kappa.setObjectName(_fromUtf8("actionCohen_s_kappa"))
         self.actionTime_budget_report = QtGui.QAction(MainWindow)
         self.actionTime_budget_report.setObjectName(_fromUtf8("actionTime_budget_report"))
+        self.actionTime_budget_by_time_windows = QtGui.QAction(MainWindow)
+        self.actionTime_budget_by_time_windows.setObjectName(_fromUtf8("actionTime_budget_by_time_windows"))
         self.actionCheckStateEventsSingleObs = QtGui.QAction(MainWindow)
         self.actionCheckStateEventsSingleObs.setObjectName(_fromUtf8("actionCheckStateEventsSingleObs"))
         self.actionSubjects_pad = QtGui.QAction(MainWindow)
@@ -463,6 +467,8 @@ class Ui_MainWindow(object):
         self.menuCreate_transitions_matrix.addAction(self.actionAll_transitions)
         self.menuCreate_transitions_matrix.addAction(self.actionFrequencies_of_transitions_after_behaviors)
         self.menuCreate_transitions_matrix.addAction(self.actionNumber_of_transitions)
+        self.menuCreate_transitions_matrix.addSeparator()
+        self.menuCreate_transitions_matrix.addAction(self.actionLag_sequential_analysis)
         self.menuObservations.addAction(self.actionNew_observation)
         self.menuObservations.addAction(self.actionOpen_observation)
         self.menuObservations.addAction(self.actionView_observation)
@@ -501,6 +507,7 @@ class Ui_MainWindow(object):
         self.menuAnalyze.addAction(self.actionTime_budget)
         self.menuAnalyze.addAction(self.actionTime_budget_report)
         self.menuAnalyze.addAction(self.actionTime_budget_by_behaviors_category)
+        self.menuAnalyze.addAction(self.actionTime_budget_by_time_windows)
         self.menuAnalyze.addAction(self.menuPlot_events.menuAction())
         self.menuAnalyze.addAction(self.menuInter_rater_reliability.menuAction())
         self.menuZoom1.addAction(self.actionZoom1_fitwindow)
@@ -703,6 +710,7 @@ class Ui_MainWindow(object):
         self.actionCreate_transitions_flow_diagram_2.setText(_translate("MainWindow", "Create transitions flow diagram", None))
         self.actionAll_transitions.setText(_translate("MainWindow", "Frequencies of transitions", None))
         self.actionNumber_of_transitions.setText(_translate("MainWindow", "Number of transitions", None))
+        self.actionLag_sequential_analysis.setText(_translate("MainWindow", "Lag sequential analysis", None))
         self.actionFrequencies_of_transitions_after_behaviors.setText(_translate("MainWindow", "Frequencies of transitions after behaviors", None))
         self.actionFind_replace_events.setText(_translate("MainWindow", "Find/replace in events", None))
         self.actionFind_events.setText(_translate("MainWindow", "Find in events", None))
@@ -732,6 +740,7 @@ class Ui_MainWindow(object):
         self.actionPlot_events2.setText(_translate("MainWindow", "Plot events", None))
         self.actionCohen_s_kappa.setText(_translate("MainWindow", "Cohen\'s kappa", None))
         self.actionTime_budget_report.setText(_translate("MainWindow", "Synthetic time budget", None))
+        self.actionTime_budget_by_time_windows.setText(_translate("MainWindow", "Time budget by time windows", None))
         self.actionCheckStateEventsSingleObs.setText(_translate("MainWindow", "Check state events", None))
         self.actionSubjects_pad.setText(_translate("MainWindow", "Subjects pad", None))
         self.actionShow_data_files.setText(_translate("MainWindow", "Show data files", None))
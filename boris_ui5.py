@@ -355,6 +355,8 @@ class Ui_MainWindow(object):
         self.actionAll_transitions.setObjectName("actionAll_transitions")
         self.actionNumber_of_transitions = QtWidgets.QAction(MainWindow)
         self.actionNumber_of_transitions.setObjectName("actionNumber_of_transitions")
+        self.actionLag_sequential_analysis = QtWidgets.QAction(MainWindow)
+        self.actionLag_sequential_analysis.setObjectName("actionLag_sequential_analysis")
         self.actionFrequencies_of_transitions_after_behaviors = QtWidgets.QAction(MainWindow)
         self.actionFrequencies_of_transitions_after_behaviors.setObjectName("actionFrequencies_of_transitions_after_behaviors")
         self.actionFind_replace_events = QtWidgets.QAction(MainWindow)
@@ -415,6 +417,8 @@ class Ui_MainWindow(object):
         self.actionCohen_s_kappa.setObjectName("actionCohen_s_kappa")
         self.actionTime_budget_report = QtWidgets.QAction(MainWindow)
         self.actionTime_budget_report.setObjectName("actionTime_budget_report")
+        self.actionTime_budget_by_time_windows = QtWidgets.QAction(MainWindow)
+        self.actionTime_budget_by_time_windows.setObjectName("actionTime_budget_by_time_windows")
         self.actionCheckStateEventsSingleObs = QtWidgets.QAction(MainWindow)
         self.actionCheckStateEventsSingleObs.setObjectName("actionCheckStateEventsSingleObs")
         self.actionSubjects_pad = QtWidgets.QAction(MainWindow)
@@ -449,6 +453,8 @@ class Ui_MainWindow(object):
         self.menuCreate_transitions_matrix.addAction(self.actionAll_transitions)
         self.menuCreate_transitions_matrix.addAction(self.actionFrequencies_of_transitions_after_behaviors)
         self.menuCreate_transitions_matrix.addAction(self.actionNumber_of_transitions)
+        self.menuCreate_transitions_matrix.addSeparator()
+        self.menuCreate_transitions_matrix.addAction(self.actionLag_sequential_analysis)
         self.menuObservations.addAction(self.actionNew_observation)
         self.menuObservations.addAction(self.actionOpen_observation)
         self.menuObservations.addAction(self.actionView_observation)
@@ -487,6 +493,7 @@ class Ui_MainWindow(object):
         self.menuAnalyze.addAction(self.actionTime_budget)
         self.menuAnalyze.addAction(self.actionTime_budget_report)
         self.menuAnalyze.addAction(self.actionTime_budget_by_behaviors_category)
+        self.menuAnalyze.addAction(self.actionTime_budget_by_time_windows)
         self.menuAnalyze.addAction(self.menuPlot_events.menuAction())
         self.menuAnalyze.addAction(self.menuInter_rater_reliability.menuAction())
         self.menuZoom1.addAction(self.actionZoom1_fitwindow)
@@ -690,6 +697,7 @@ class Ui_MainWindow(object):
         self.actionCreate_transitions_flow_diagram_2.setText(_translate("MainWindow", "Create transitions flow diagram"))
         self.actionAll_transitions.setText(_translate("MainWindow", "Frequencies of transitions"))
         self.actionNumber_of_transitions.setText(_translate("MainWindow", "Number of transitions"))
+        self.actionLag_sequential_analysis.setText(_translate("MainWindow", "Lag sequential analysis"))
         self.actionFrequencies_of_transitions_after_behaviors.setText(_translate("MainWindow", "Frequencies of transitions after behaviors"))
         self.actionFind_replace_events.setText(_translate("MainWindow", "Find/replace in events"))
         self.actionFind_events.setText(_translate("MainWindow", "Find in events"))
@@ -719,6 +727,7 @@ class Ui_MainWindow(object):
         self.actionPlot_events2.setText(_translate("MainWindow", "Plot events"))
         self.actionCohen_s_kappa.setText(_translate("MainWindow", "Cohen\'s kappa"))
         self.actionTime_budget_report.setText(_translate("MainWindow", "Synthetic time budget"))
+        self.actionTime_budget_by_time_windows.setText(_translate("MainWindow", "Time budget by time windows"))
         self.actionCheckStateEventsSingleObs.setText(_translate("MainWindow", "Check state events"))
         self.actionSubjects_pad.setText(_translate("MainWindow", "Subjects pad"))
         self.actionShow_data_files.setText(_translate("MainWindow", "Show data files"))
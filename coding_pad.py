@@ -31,6 +31,7 @@ except:
 
 import sys
 from config import *
+import ethogram_index
 from utilities import *
 
 
@@ -89,7 +90,7 @@ class CodingPad(QWidget):
         if widget is not None:
             widget.pushButton.setText(behaviorCode)
             if self.colors_dict:
-                color = self.colors_dict[[self.pj[ETHOGRAM][x]["category"] for x in self.pj[ETHOGRAM] if self.pj[ETHOGRAM][x]["code"] == behaviorCode][0]]
+                color = self.colors_dict[ethogram_index.get_index(self.pj[ETHOGRAM]).categories[behaviorCode]]
             else:
                 color = CATEGORY_COLORS_LIST[0]
             widget.pushButton.setStyleSheet("background-color: {}; border-radius: 0px; min-width: 50px;max-width: 200px; min-height:50px; max-height:200px; font-weight: bold;".format(color))
@@ -33,6 +33,9 @@ CHECK_NEW_VERSION_DELAY = 15 * 24 * 60 * 60
 
 #FFMPEG_BIN = 'ffmpeg'
 
+# state of re-encoding queue (in home directory)
+RECODE_QUEUE_STATE_FILE = ".boris_recode_queue"
+
 function_keys = {16777264: 'F1', 16777265: 'F2', 16777266: 'F3', 16777267: 'F4', 16777268: 'F5',
                  16777269: 'F6', 16777270: 'F7', 16777271: 'F8', 16777272: 'F9', 16777273: 'F10',
                  16777274: 'F11', 16777275: 'F12'}
@@ -69,6 +72,8 @@ REMOVE = "Remove"
 SAVE = "Save"
 DISCARD = "Discard"
 OK = "OK"
+COPY_STREAMS = "Copy streams"
+RE_ENCODE = "Re-encode"
 
 NO_FOCAL_SUBJECT = 'No focal subject'
 
@@ -31,7 +31,9 @@ except:
     from PyQt4.QtCore import *
 
 import os
+import sys
 import dialog
+import external_data
 import json
 import urllib.parse
 import urllib.request
@@ -88,8 +90,10 @@ class Converters(QDialog, Ui_converters):
                      "A time value like 00:23:59 must be converted into seconds before to be plotted synchronously with your media.<br>"
                      "For this you can use BORIS native converters or write your own converter.<br>"
                      "A converter must be written using the <a href=\"www.python.org\">Python3</a> language.<br>"
-
-))
+                     "The value to convert is in the INPUT variable and the result must be assigned to the OUTPUT variable.<br>"
+                     "If the first line of code is <b>{}</b> the converter receives the whole column "
+                     "(numpy array of strings) in INPUT and must return an array of numbers in OUTPUT.<br>"
+                    ).format(external_data.VECTORIZED_CONVERTER_TAG))
 
         #msg.setInformativeText("This is additional information")
 
@@ -134,12 +138,7 @@ class Converters(QDialog, Ui_converters):
             str: string containing Python function
         """
 
-        function = """def {}(INPUT):\n""".format(name)
-        function += """    INPUT = INPUT.decode("utf-8") if isinstance(INPUT, bytes) else INPUT\n"""
-        function += "\n".join(["    " + row for row in code.split("\n")])
-        function += """\n    return OUTPUT"""
-        
-        return function
+        return external_data.converter_source(name, code)
 
 
     def save_converter(self):
@@ -161,10 +160,8 @@ class Converters(QDialog, Ui_converters):
             QMessageBox.critical(self, "BORIS", "The converter must have Python code")
             return
 
-        function = self.code_2_func(self.le_converter_name.text(), code)
-
         try:
-            exec(function)
+            external_data.compile_converter(self.le_converter_name.text(), code)
         except:
             QMessageBox.critical(self, "BORIS", "The code produces an error:<br><b>{}</b>".format(sys.exc_info()[1]))
             return
@@ -307,10 +304,8 @@ class Converters(QDialog, Ui_converters):
                             else:
                                 continue
                         # test if code does not produce error
-                        function = self.code_2_func(converter_name, converters_from_file[converter]["code"])
-
                         try:
-                            exec(function)
+                            external_data.compile_converter(converter_name, converters_from_file[converter]["code"])
                         except:
                             QMessageBox.critical(self, "BORIS", "The code of {} converter produces an error:<br><b>{}</b>".format(converter_name,
                                                                                                                                   sys.exc_info()[1]))
@@ -385,8 +380,6 @@ OUTPUT = int(h) * 3600 + int(m) * 60 + int(s)
 }
 
 
-    import sys
-
     app = QApplication(sys.argv)
 
     class_ = Converters(CONVERTERS["BORIS converters"])
@@ -24,6 +24,7 @@ Copyright 2012-2018 Olivier Friard
 import sqlite3
 import os
 from config import *
+import ethogram_index
 import project_functions
 
 
@@ -44,14 +45,11 @@ def load_events_in_db(pj, selectedSubjects, selectedObservations, selectedBehavi
     """
     
     # selected behaviors defined as state event
-    state_behaviors_codes = [pj[ETHOGRAM][x]["code"] for x in pj[ETHOGRAM]
-                                 if STATE in pj[ETHOGRAM][x][TYPE].upper()
-                                    and pj[ETHOGRAM][x]["code"] in selectedBehaviors]
+    index = ethogram_index.get_index(pj[ETHOGRAM])
+    state_behaviors_codes = [code for code in index.state_codes if code in selectedBehaviors]
 
     # selected behaviors defined as point event
-    point_behaviors_codes = [pj[ETHOGRAM][x]["code"] for x in pj[ETHOGRAM]
-                                 if POINT in pj[ETHOGRAM][x][TYPE].upper()
-                                    and pj[ETHOGRAM][x]["code"] in selectedBehaviors]
+    point_behaviors_codes = [code for code in index.point_codes if code in selectedBehaviors]
     
     db = sqlite3.connect(":memory:", isolation_level=None)
 
@@ -124,24 +122,20 @@ def load_aggregated_events_in_db(pj, selectedSubjects, selectedObservations, sel
 
     # check if state events are paired
     out = ""
+    checks = project_functions.check_state_events(pj, selectedObservations, HHMMSS)
     for obsId in selectedObservations:
-        r, msg = project_functions.check_state_events_obs(obsId, pj[ETHOGRAM],
-                                                          pj[OBSERVATIONS][obsId],
-                                                          HHMMSS)
+        r, msg = checks[obsId]
         if not r:
             out += "Observation: <strong>{obsId}</strong><br>{msg}<br>".format(obsId=obsId, msg=msg)
     if out:
         return False, out, None
 
     # selected behaviors defined as state event
-    state_behaviors_codes = [pj[ETHOGRAM][x]["code"] for x in pj[ETHOGRAM]
-                                 if STATE in pj[ETHOGRAM][x][TYPE].upper()
-                                    and pj[ETHOGRAM][x]["code"] in selectedBehaviors]
+    index = ethogram_index.get_index(pj[ETHOGRAM])
+    state_behaviors_codes = [code for code in index.state_codes if code in selectedBehaviors]
 
     # selected behaviors defined as point event
-    point_behaviors_codes = [pj[ETHOGRAM][x]["code"] for x in pj[ETHOGRAM]
-                                 if POINT in pj[ETHOGRAM][x][TYPE].upper()
-                                    and pj[ETHOGRAM][x]["code"] in selectedBehaviors]
+    point_behaviors_codes = [code for code in index.point_codes if code in selectedBehaviors]
 
     cursor1 = load_events_in_db(pj, selectedSubjects, selectedObservations, selectedBehaviors)
 
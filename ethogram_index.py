@@ -0,0 +1,136 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+
+Lookup indexes of the ethogram and of the subjects of a project
+
+The ethogram and the subjects are dicts indexed by position ("0", "1", ...):
+finding a behavior by key or by code requires to scan them.
+The index is built once for an ethogram and is kept until the ethogram or the subjects
+are replaced (open project, edit project) or until invalidate is called.
+"""
+
+from config import *
+
+# last built index
+_index = None
+
+
+class EthogramIndex:
+    """
+    lookup indexes of ethogram and subjects
+
+    Attributes:
+        ethogram (dict): indexed ethogram
+        subjects (dict): indexed subjects
+        behaviors_by_key (dict): ethogram indexes of behaviors by key
+        behaviors_by_code (dict): ethogram index of behavior by code
+        types (dict): type of behavior by code (STATE or POINT event, upper case)
+        categories (dict): category of behavior by code
+        modifiers (dict): modifiers of behavior by code
+        exclusions (dict): set of behavior codes excluded by behavior code
+        state_codes (list): codes of state events (ethogram order)
+        point_codes (list): codes of point events (ethogram order)
+        subject_by_name (dict): subjects index of subject by name
+        subjects_by_key (dict): subjects indexes of subjects by key
+    """
+
+    def __init__(self, ethogram, subjects=None):
+        self.ethogram = ethogram
+        self.subjects = {} if subjects is None else subjects
+
+        self.behaviors_by_key, self.behaviors_by_code = {}, {}
+        self.types, self.categories, self.modifiers, self.exclusions = {}, {}, {}, {}
+        self.state_codes, self.point_codes = [], []
+        for idx in ethogram:
+            behavior = ethogram[idx]
+            code = behavior[BEHAVIOR_CODE]
+            self.behaviors_by_key.setdefault(behavior.get("key", ""), []).append(idx)
+            if code in self.behaviors_by_code:
+                continue
+            self.behaviors_by_code[code] = idx
+            self.types[code] = behavior[TYPE].upper()
+            self.categories[code] = behavior.get("category", "")
+            self.modifiers[code] = behavior.get("modifiers", {})
+            self.exclusions[code] = set([x for x in behavior.get("excluded", "").split(",") if x])
+            if STATE in self.types[code]:
+                self.state_codes.append(code)
+            if POINT in self.types[code]:
+                self.point_codes.append(code)
+
+        self.subject_by_name, self.subjects_by_key = {}, {}
+        for idx in self.subjects:
+            self.subject_by_name.setdefault(self.subjects[idx]["name"], idx)
+            self.subjects_by_key.setdefault(self.subjects[idx].get("key", ""), []).append(idx)
+
+
+    def behavior(self, code):
+        """
+        behavior of ethogram with code
+
+        Args:
+            code (str): behavior code
+
+        Returns:
+            dict: behavior (None if code not found in ethogram)
+        """
+        return self.ethogram[self.behaviors_by_code[code]] if code in self.behaviors_by_code else None
+
+
+    def event_type(self, code):
+        """
+        type of behavior
+
+        Args:
+            code (str): behavior code
+
+        Returns:
+            str: STATE, POINT or None if code not found in ethogram
+        """
+        return self.types.get(code, None)
+
+
+def get_index(ethogram, subjects=None):
+    """
+    index of ethogram and subjects (built if the ethogram or the subjects changed)
+
+    Args:
+        ethogram (dict): ethogram of project
+        subjects (dict): subjects of project (None to accept the subjects of the current index)
+
+    Returns:
+        EthogramIndex: index
+    """
+    global _index
+
+    if (_index is None or _index.ethogram is not ethogram
+       or (subjects is not None and _index.subjects is not subjects)):
+        _index = EthogramIndex(ethogram, subjects)
+    return _index
+
+
+def invalidate():
+    """
+    discard the current index (the ethogram or the subjects were modified in place)
+    """
+    global _index
+
+    _index = None
@@ -19,18 +19,51 @@ Copyright 2012-2018 Olivier Friard
   MA 02110-1301, USA.
 """
 
-import tablib
+import csv
+import itertools
 import logging
+import multiprocessing
 import os
+import pathlib
 import sys
 
 from config import *
 import utilities
 import project_functions
 import db_functions
+import media_offsets
+from lazy_modules import lazy_import
 
+tablib = lazy_import("tablib", required=True)
 
-def export_events(parameters, obsId, observation, ethogram, file_name, output_format):
+openpyxl = lazy_import("openpyxl")
+flag_openpyxl = openpyxl is not None
+if not flag_openpyxl:
+    logging.info("openpyxl not installed: XLSX files will be written with tablib")
+
+# the pyarrow.ipc and pyarrow.parquet submodules are imported by write_arrow
+pyarrow = lazy_import("pyarrow")
+flag_pyarrow = pyarrow is not None
+if not flag_pyarrow:
+    logging.info("pyarrow not installed: Parquet and Feather formats are not available")
+
+# columnar formats (Apache Arrow) and available compressions (first is default)
+ARROW_FORMATS = ["parquet", "feather"]
+ARROW_COMPRESSIONS = {"parquet": ["snappy", "zstd", "gzip", "none"],
+                      "feather": ["lz4", "zstd", "none"]}
+
+# kinds of export of one file by observation (see parallel_export)
+EVENTS_EXPORT = "events"
+AGGREGATED_EVENTS_EXPORT = "aggregated events"
+
+# kinds of columns in columnar formats
+COLUMN_CATEGORY = "category"
+COLUMN_FLOAT = "float"
+COLUMN_STRING = "string"
+
+
+def export_events(parameters, obsId, observation, ethogram, file_name, output_format,
+                  independent_variables=None, compression=None):
     """
     export events
 
@@ -41,12 +74,19 @@ def export_events(parameters, obsId, observation, ethogram, file_name, output_fo
         ethogram (dict): ethogram of project
         file_name (str): file name for exporting events
         output_format (str): output for exporting events
+        independent_variables (dict): independent variables of project (for types of columns in columnar formats)
+        compression (str): compression for columnar formats (see ARROW_COMPRESSIONS)
 
     Returns:
         bool: result: True if OK else False
         str: error message
     """
 
+    if output_format in ARROW_FORMATS:
+        columns = events_columns(observation, independent_variables)
+        return write_arrow(columns, [events_table_rows(parameters, obsId, observation, ethogram, columns)],
+                           file_name, output_format, compression)
+
     total_length = "{0:.3f}".format(project_functions.observation_total_length(observation))
 
     eventsWithStatus = project_functions.events_start_stop(ethogram, observation[EVENTS])
@@ -121,73 +161,60 @@ def export_events(parameters, obsId, observation, ethogram, file_name, output_fo
 
     rows.append(header)
 
-    duration1 = []   # in seconds
-    if observation["type"] in [MEDIA]:
-        try:
-            for mediaFile in observation[FILE][PLAYER1]:
-                duration1.append(observation["media_info"]["length"][mediaFile])
-        except:
-            pass
+    media_index = media_offsets.observation_media_offsets(observation, PLAYER1)
 
-    for event in eventsWithStatus:
-        
-        if (((event[SUBJECT_EVENT_FIELD] in parameters["selected subjects"]) or
-           (event[SUBJECT_EVENT_FIELD] == "" and NO_FOCAL_SUBJECT in parameters["selected subjects"])) and
-           (event[BEHAVIOR_EVENT_FIELD] in parameters["selected behaviors"])):
-
-            fields = []
-            fields.append(utilities.intfloatstr(str(event[EVENT_TIME_FIELD_IDX])))
-
-            if observation["type"] in [MEDIA]:
+    def event_rows():
+        """
+        rows of selected events (generated one by one)
+        """
+        for event in eventsWithStatus:
 
-                time_ = event[EVENT_TIME_FIELD_IDX] - observation[TIME_OFFSET]
-                if time_ < 0:
-                    time_ = 0
+            if (((event[SUBJECT_EVENT_FIELD] in parameters["selected subjects"]) or
+               (event[SUBJECT_EVENT_FIELD] == "" and NO_FOCAL_SUBJECT in parameters["selected subjects"])) and
+               (event[BEHAVIOR_EVENT_FIELD] in parameters["selected behaviors"])):
 
-                mediaFileIdx = [idx1 for idx1, x in enumerate(duration1) if time_ >= sum(duration1[0:idx1])][-1]
-                fields.append(utilities.intfloatstr(str(observation[FILE][PLAYER1][mediaFileIdx])))
-                fields.append(total_length)
-                fields.append(observation["media_info"]["fps"][observation[FILE][PLAYER1][mediaFileIdx]])  # fps
+                fields = []
+                fields.append(utilities.intfloatstr(str(event[EVENT_TIME_FIELD_IDX])))
 
-            if observation["type"] in [LIVE]:
-                fields.append(LIVE) # media
-                fields.append(total_length) # total length
-                fields.append("NA") # FPS
+                if observation["type"] in [MEDIA]:
 
-            fields.append(event[EVENT_SUBJECT_FIELD_IDX])
-            fields.append(event[EVENT_BEHAVIOR_FIELD_IDX])
+                    time_ = event[EVENT_TIME_FIELD_IDX] - observation[TIME_OFFSET]
+                    if time_ < 0:
+                        time_ = 0
 
-            modifiers = event[EVENT_MODIFIER_FIELD_IDX].split("|")
-            while len(modifiers) < max_modifiers:
-                modifiers.append("")
-
-            for m in modifiers:
-                fields.append(m)
-            fields.append(event[EVENT_COMMENT_FIELD_IDX].replace(os.linesep, " "))
-            # status
-            fields.append(event[-1])
+                    mediaFileIdx = media_index.media_index(time_)
+                    if mediaFileIdx >= 0:
+                        fields.append(utilities.intfloatstr(str(observation[FILE][PLAYER1][mediaFileIdx])))
+                        fields.append(total_length)
+                        fields.append(observation["media_info"]["fps"][observation[FILE][PLAYER1][mediaFileIdx]])  # fps
+                    else:
+                        fields.extend(["-", total_length, "NA"])
 
-            rows.append(fields)
+                if observation["type"] in [LIVE]:
+                    fields.append(LIVE) # media
+                    fields.append(total_length) # total length
+                    fields.append("NA") # FPS
 
-    maxLen = max([len(r) for r in rows])
-    data = tablib.Dataset()
+                fields.append(event[EVENT_SUBJECT_FIELD_IDX])
+                fields.append(event[EVENT_BEHAVIOR_FIELD_IDX])
 
-    data.title = obsId
-    # check if worksheet name will be > 31 char
-    if output_format in ["xls", "xlsx"]:
-        for forbidden_char in r"\/*[]:?":
-            data.title = data.title.replace(forbidden_char, " ")
+                # no modifier column if no event with modifiers
+                modifiers = event[EVENT_MODIFIER_FIELD_IDX].split("|") if max_modifiers else []
+                while len(modifiers) < max_modifiers:
+                    modifiers.append("")
 
-    if output_format in ["xls"]:
-        if len(data.title) > 31:
-            data.title = data.title[0:31]
+                for m in modifiers:
+                    fields.append(m)
+                fields.append(event[EVENT_COMMENT_FIELD_IDX].replace(os.linesep, " "))
+                # status
+                fields.append(event[-1])
 
-    for row in rows:
-        data.append(utilities.complete(row, maxLen))
+                yield utilities.complete(fields, maxLen)
 
-    r, msg = dataset_write(data, file_name, output_format)
+    maxLen = max([len(r) for r in rows])
 
-    return r, msg
+    return write_rows(itertools.chain([utilities.complete(row, maxLen) for row in rows], event_rows()),
+                      file_name, output_format, title=obsId)
 
 
 def dataset_write(dataset, file_name, output_format):
@@ -246,10 +273,91 @@ def dataset_write(dataset, file_name, output_format):
         return False, str(sys.exc_info()[1])
 
 
+def write_rows(rows, file_name, output_format, title=""):
+    """
+    write rows to file in specified format.
+    TSV, CSV and XLSX (openpyxl write-only mode) rows are written one by one:
+    the memory used does not depend on the number of rows.
+    The other formats (ODS, XLS, HTML) are written with a tablib dataset.
+
+    Args:
+        rows (iterable): rows to write (list of values)
+        file_name (str): file name
+        output_format (str): format of output
+        title (str): title of worksheet
+
+    Returns:
+        bool: result
+        str: error message
+    """
+
+    try:
+        if output_format in ["tsv", "csv"]:
+            with open(file_name, "w", newline="", encoding="utf-8") as f_out:
+                writer = csv.writer(f_out, delimiter="\t" if output_format == "tsv" else ",")
+                for row in rows:
+                    writer.writerow(row)
+            return True, ""
+
+        if output_format == "xlsx" and flag_openpyxl:
+            # check worksheet title
+            for forbidden_char in EXCEL_FORBIDDEN_CHARACTERS:
+                title = title.replace(forbidden_char, " ")
+            workbook = openpyxl.Workbook(write_only=True)
+            worksheet = workbook.create_sheet(title=title[:31] if title else None)
+            for row in rows:
+                worksheet.append(row)
+            workbook.save(file_name)
+            return True, ""
+
+        data = tablib.Dataset()
+        data.title = title
+        for row in rows:
+            data.append(row)
+
+    except:
+        return False, str(sys.exc_info()[1])
+
+    return dataset_write(data, file_name, output_format)
+
+
+def aggregated_events_columns(pj):
+    """
+    columns of aggregated events with their kind (for columnar formats)
+
+    Args:
+        pj (dict): BORIS project
+
+    Returns:
+        list: list of (name, kind)
+    """
+
+    return ([("Observation id", COLUMN_CATEGORY), ("Observation date", COLUMN_STRING), ("Media file", COLUMN_CATEGORY),
+             ("Total length", COLUMN_FLOAT), ("FPS", COLUMN_FLOAT)]
+            + independent_variables_columns(pj.get(INDEPENDENT_VARIABLES, {}))
+            + [("Subject", COLUMN_CATEGORY), ("Behavior", COLUMN_CATEGORY), ("Modifiers", COLUMN_CATEGORY),
+               ("Behavior type", COLUMN_CATEGORY), ("Start (s)", COLUMN_FLOAT), ("Stop (s)", COLUMN_FLOAT),
+               ("Duration (s)", COLUMN_FLOAT), ("Comment start", COLUMN_STRING), ("Comment stop", COLUMN_STRING)])
+
+
+def aggregated_events_header(pj):
+    """
+    header of aggregated events
+
+    Args:
+        pj (dict): BORIS project
+
+    Returns:
+        list: header
+    """
+
+    return [name for name, _ in aggregated_events_columns(pj)]
+
 
 def export_aggregated_events(pj, parameters, obsId):
     """
-    export aggregated events
+    export aggregated events.
+    The rows are generated one by one (see write_rows)
 
     Args:
         pj (dict): BORIS project
@@ -257,41 +365,51 @@ def export_aggregated_events(pj, parameters, obsId):
         obsId (str): observation id
 
     Returns:
-        tablib.Dataset:
-
+        generator: rows of aggregated events (see aggregated_events_header)
     """
-    data = tablib.Dataset()
+
     observation = pj[OBSERVATIONS][obsId]
 
-    duration1 = []   # in seconds
-    if observation[TYPE] in [MEDIA]:
-        try:
-            for mediaFile in observation[FILE][PLAYER1]:
-                if "media_info" in observation:
-                    duration1.append(observation["media_info"]["length"][mediaFile])
-        except:
-            duration1 = []
+    media_index = media_offsets.observation_media_offsets(observation, PLAYER1)
 
     total_length = "{0:.3f}".format(project_functions.observation_total_length(observation))
 
+    # values common to all rows of observation
+    observation_data = [obsId, observation["date"].replace("T", " ")]
+    independent_variables = []
+    if INDEPENDENT_VARIABLES in pj:
+        for idx_var in utilities.sorted_keys(pj[INDEPENDENT_VARIABLES]):
+            if pj[INDEPENDENT_VARIABLES][idx_var]["label"] in observation.get(INDEPENDENT_VARIABLES, {}):
+                independent_variables.append(observation[INDEPENDENT_VARIABLES][pj[INDEPENDENT_VARIABLES][idx_var]["label"]])
+            else:
+                independent_variables.append("")
+
     cursor = db_functions.load_events_in_db(pj,
                                             parameters["selected subjects"],
                                             [obsId],
                                             parameters["selected behaviors"])
 
+    # events grouped by subject and behavior with one query
+    cursor.execute(("SELECT subject, code, occurence, modifiers, comment FROM events "
+                    "WHERE observation = ? ORDER BY subject, code, occurence"),
+                   (obsId,))
+    events = {key: list(group) for key, group in itertools.groupby(cursor.fetchall(),
+                                                                   key=lambda row: (row["subject"], row["code"]))}
+
     for subject in parameters["selected subjects"]:
 
         for behavior in parameters["selected behaviors"]:
 
-            cursor.execute("SELECT occurence, modifiers, comment FROM events WHERE observation = ? AND subject = ? AND code = ? ORDER by occurence",
-                           (obsId, subject, behavior))
-            rows = list(cursor.fetchall())
+            rows = events.get((subject, behavior), [])
+            if not rows:
+                continue
+            behavior_type = project_functions.event_type(behavior, pj[ETHOGRAM])
 
             for idx, row in enumerate(rows):
 
                 if observation[TYPE] in [MEDIA]:
-                    if duration1:
-                        mediaFileIdx = [idx1 for idx1, x in enumerate(duration1) if row["occurence"] >= sum(duration1[0:idx1])][-1]
+                    if len(media_index):
+                        mediaFileIdx = media_index.media_index(row["occurence"])
                         mediaFileString = observation[FILE][PLAYER1][mediaFileIdx]
                         fpsString = observation["media_info"]["fps"][observation[FILE][PLAYER1][mediaFileIdx]]
                     else:
@@ -302,53 +420,24 @@ def export_aggregated_events(pj, parameters, obsId):
                     mediaFileString = "LIVE"
                     fpsString = "NA"
 
-                if POINT in project_functions.event_type(behavior, pj[ETHOGRAM]):
-
-                    row_data = []
-                    row_data.extend([obsId,
-                                observation["date"].replace("T", " "),
-                                mediaFileString,
-                                total_length,
-                                fpsString])
-
-                    # independent variables
-                    if INDEPENDENT_VARIABLES in pj:
-                        for idx_var in utilities.sorted_keys(pj[INDEPENDENT_VARIABLES]):
-                            if pj[INDEPENDENT_VARIABLES][idx_var]["label"] in observation[INDEPENDENT_VARIABLES]:
-                               row_data.append(observation[INDEPENDENT_VARIABLES][pj[INDEPENDENT_VARIABLES][idx_var]["label"]])
-                            else:
-                                row_data.append("")
-
-                    row_data.extend([subject,
-                                behavior,
-                                row["modifiers"].strip(),
-                                POINT,
-                                "{0:.3f}".format(row["occurence"]), # start
-                                "NA", # stop
-                                "NA", # duration
-                                row["comment"],
-                                ""
-                                ])
-                    data.append(row_data)
-
-                if STATE in project_functions.event_type(behavior, pj[ETHOGRAM]):
+                if POINT in behavior_type:
+
+                    yield (observation_data + [mediaFileString, total_length, fpsString] + independent_variables +
+                           [subject,
+                            behavior,
+                            row["modifiers"].strip(),
+                            POINT,
+                            "{0:.3f}".format(row["occurence"]), # start
+                            "NA", # stop
+                            "NA", # duration
+                            row["comment"],
+                            ""
+                            ])
+
+                if STATE in behavior_type:
                     if idx % 2 == 0:
-                        row_data = []
-                        row_data.extend([obsId,
-                                observation["date"].replace("T", " "),
-                                mediaFileString,
-                                total_length,
-                                fpsString])
-
-                        # independent variables
-                        if INDEPENDENT_VARIABLES in pj:
-                            for idx_var in utilities.sorted_keys(pj[INDEPENDENT_VARIABLES]):
-                                if pj[INDEPENDENT_VARIABLES][idx_var]["label"] in observation[INDEPENDENT_VARIABLES]:
-                                   row_data.append(observation[INDEPENDENT_VARIABLES][pj[INDEPENDENT_VARIABLES][idx_var]["label"]])
-                                else:
-                                    row_data.append("")
-
-                        row_data.extend([subject,
+                        yield (observation_data + [mediaFileString, total_length, fpsString] + independent_variables +
+                               [subject,
                                 behavior,
                                 row["modifiers"].strip(),
                                 STATE,
@@ -358,7 +447,273 @@ def export_aggregated_events(pj, parameters, obsId):
                                 row["comment"],
                                 rows[idx + 1]["comment"]
                                 ])
-                        data.append(row_data)
 
-    return data
 
+def independent_variables_columns(independent_variables, observation=None):
+    """
+    columns of independent variables with their kind (for columnar formats):
+    numeric variables are float, variables with a set of values are categories, the others are strings
+
+    Args:
+        independent_variables (dict): independent variables of project (None if not available)
+        observation (dict): observation (the variables of observation are strings if
+                            independent variables of project are not available)
+
+    Returns:
+        list: list of (label, kind)
+    """
+
+    if independent_variables is None:
+        return [(label, COLUMN_STRING) for label in observation.get(INDEPENDENT_VARIABLES, {})]
+
+    kinds = {NUMERIC: COLUMN_FLOAT, SET_OF_VALUES: COLUMN_CATEGORY}
+    return [(independent_variables[idx]["label"], kinds.get(independent_variables[idx].get("type", ""), COLUMN_STRING))
+            for idx in utilities.sorted_keys(independent_variables)]
+
+
+def events_columns(observation, independent_variables=None):
+    """
+    columns of events with their kind (for columnar formats)
+
+    Args:
+        observation (dict): observation
+        independent_variables (dict): independent variables of project (None if not available)
+
+    Returns:
+        list: list of (name, kind)
+    """
+
+    return ([("Observation id", COLUMN_CATEGORY), ("Time", COLUMN_FLOAT), ("Media file path", COLUMN_CATEGORY),
+             ("Total length", COLUMN_FLOAT), ("FPS", COLUMN_FLOAT)]
+            + independent_variables_columns(independent_variables, observation)
+            + [("Subject", COLUMN_CATEGORY), ("Behavior", COLUMN_CATEGORY), ("Modifiers", COLUMN_CATEGORY),
+               ("Comment", COLUMN_STRING), ("Status", COLUMN_CATEGORY)])
+
+
+def events_table_rows(parameters, obsId, observation, ethogram, columns):
+    """
+    rows of selected events for columnar formats (generated one by one)
+
+    Args:
+        parameters (dict): subjects, behaviors
+        obsId (str): observation id
+        observation (dict): observation
+        ethogram (dict): ethogram of project
+        columns (list): columns of events (see events_columns)
+
+    Returns:
+        generator: rows of events
+    """
+
+    total_length = project_functions.observation_total_length(observation)
+
+    media_index = media_offsets.observation_media_offsets(observation, PLAYER1)
+
+    # independent variables are the columns between FPS and Subject
+    labels = [name for name, _ in columns[columns.index(("FPS", COLUMN_FLOAT)) + 1:-5]]
+    independent_variables = [observation.get(INDEPENDENT_VARIABLES, {}).get(label, "") for label in labels]
+
+    for event in project_functions.events_start_stop(ethogram, observation[EVENTS]):
+
+        if (((event[SUBJECT_EVENT_FIELD] in parameters["selected subjects"]) or
+           (event[SUBJECT_EVENT_FIELD] == "" and NO_FOCAL_SUBJECT in parameters["selected subjects"])) and
+           (event[BEHAVIOR_EVENT_FIELD] in parameters["selected behaviors"])):
+
+            media_file, fps = LIVE, None
+            if observation[TYPE] in [MEDIA]:
+                media_file = "-"
+                if len(media_index):
+                    mediaFileIdx = media_index.media_index(max(0, event[EVENT_TIME_FIELD_IDX] - observation[TIME_OFFSET]))
+                    media_file = observation[FILE][PLAYER1][mediaFileIdx]
+                    fps = observation["media_info"]["fps"][media_file]
+
+            yield ([obsId, event[EVENT_TIME_FIELD_IDX], media_file, total_length, fps]
+                   + independent_variables
+                   + [event[EVENT_SUBJECT_FIELD_IDX], event[EVENT_BEHAVIOR_FIELD_IDX], event[EVENT_MODIFIER_FIELD_IDX],
+                      event[EVENT_COMMENT_FIELD_IDX], event[-1]])
+
+
+def _column_value(value, kind):
+    """
+    value converted for a column of kind (None for missing values)
+    """
+    if kind == COLUMN_FLOAT:
+        try:
+            return float(value)
+        except (TypeError, ValueError):  # NA, empty string
+            return None
+    return None if value is None else str(value)
+
+
+def write_arrow(columns, observations_rows, file_name, output_format, compression=None):
+    """
+    write rows in a columnar file (Apache Arrow): Parquet or Feather (Arrow IPC file).
+    The rows of each observation are written in a separate row group (record batch for Feather):
+    only the rows of one observation are in memory.
+    The categorical columns are dictionary-encoded with a dictionary shared by all observations.
+
+    Args:
+        columns (list): list of (name, kind) of columns (kind: COLUMN_CATEGORY, COLUMN_FLOAT or COLUMN_STRING)
+        observations_rows (iterable): rows (list of values) of each observation
+        file_name (str): file name
+        output_format (str): output format ("parquet" or "feather")
+        compression (str): compression (see ARROW_COMPRESSIONS, None for default)
+
+    Returns:
+        bool: result
+        str: error message
+    """
+
+    if output_format not in ARROW_FORMATS:
+        return False, "Format {} not found".format(output_format)
+    if not flag_pyarrow:
+        return False, "The pyarrow module is required for the {} format".format(output_format)
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    if compression is None:
+        compression = ARROW_COMPRESSIONS[output_format][0]
+    if compression not in ARROW_COMPRESSIONS[output_format]:
+        return False, "Compression {} not available for the {} format".format(compression, output_format)
+    if compression == "none":
+        compression = None
+
+    types = {COLUMN_CATEGORY: pyarrow.dictionary(pyarrow.int32(), pyarrow.string()),
+             COLUMN_FLOAT: pyarrow.float64(),
+             COLUMN_STRING: pyarrow.string()}
+    schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+    # codes of categories by column. The dictionaries only grow: the Feather file contains dictionary deltas
+    categories = {idx: {} for idx, (_, kind) in enumerate(columns) if kind == COLUMN_CATEGORY}
+
+    writer = None
+    try:
+        if output_format == "parquet":
+            writer = pyarrow.parquet.ParquetWriter(file_name, schema, compression=compression)
+        else:
+            writer = pyarrow.ipc.new_file(file_name, schema,
+                                          options=pyarrow.ipc.IpcWriteOptions(compression=compression,
+                                                                              emit_dictionary_deltas=True))
+
+        for rows in observations_rows:
+            values = [[] for _ in columns]
+            for row in rows:
+                for idx, value in enumerate(row):
+                    values[idx].append(value)
+            if not values[0]:
+                continue
+
+            arrays = []
+            for idx, (_, kind) in enumerate(columns):
+                if kind == COLUMN_CATEGORY:
+                    codes = categories[idx]
+                    indices = [None if value is None else codes.setdefault(str(value), len(codes)) for value in values[idx]]
+                    arrays.append(pyarrow.DictionaryArray.from_arrays(pyarrow.array(indices, type=pyarrow.int32()),
+                                                                      pyarrow.array(list(codes), type=pyarrow.string())))
+                else:
+                    arrays.append(pyarrow.array([_column_value(value, kind) for value in values[idx]], type=types[kind]))
+
+            table = pyarrow.Table.from_arrays(arrays, schema=schema)
+            if output_format == "parquet":
+                writer.write_table(table, row_group_size=table.num_rows)
+            else:
+                writer.write_table(table)
+
+        writer.close()
+        return True, ""
+
+    except:
+        if writer is not None:
+            try:
+                writer.close()
+            except:
+                pass
+        return False, str(sys.exc_info()[1])
+
+
+def export_observation_file(args):
+    """
+    export the events of one observation in a file (worker of parallel_export)
+
+    Args:
+        args (tuple): kind of export (EVENTS_EXPORT or AGGREGATED_EVENTS_EXPORT), project (can be restricted
+                      to the observation), parameters (subjects, behaviors), observation id, file name,
+                      output format, compression (for columnar formats)
+
+    Returns:
+        str: observation id
+        str: file name
+        bool: result
+        str: error message
+    """
+
+    kind, pj, parameters, obsId, file_name, output_format, compression = args
+
+    try:
+        if kind == AGGREGATED_EVENTS_EXPORT:
+            if output_format in ARROW_FORMATS:
+                r, msg = write_arrow(aggregated_events_columns(pj), [export_aggregated_events(pj, parameters, obsId)],
+                                     file_name, output_format, compression)
+            else:
+                r, msg = write_rows(itertools.chain([aggregated_events_header(pj)],
+                                                    export_aggregated_events(pj, parameters, obsId)),
+                                    file_name, output_format, title="Aggregated events")
+        else:
+            r, msg = export_events(parameters, obsId, pj[OBSERVATIONS][obsId], pj[ETHOGRAM], file_name, output_format,
+                                   independent_variables=pj.get(INDEPENDENT_VARIABLES, {}), compression=compression)
+    except:
+        r, msg = False, str(sys.exc_info()[1])
+
+    return obsId, file_name, r, msg
+
+
+def parallel_export(pj, parameters, selected_observations, kind, export_dir, output_format,
+                    compression=None, max_workers=0, poll_interval=0.1):
+    """
+    export the events of each selected observation in its own file with a pool of processes.
+    Each worker receives the project restricted to its observation.
+    For windows exe (created with pyinstaller) multiprocessing can not be used: the observations are exported in sequence.
+    Closing the generator terminates the pool (cancel).
+
+    Args:
+        pj (dict): project
+        parameters (dict): subjects, behaviors
+        selected_observations (list): list of observations id
+        kind (str): EVENTS_EXPORT or AGGREGATED_EVENTS_EXPORT
+        export_dir (str): directory for the exported files (one file by observation)
+        output_format (str): output format
+        compression (str): compression for columnar formats
+        max_workers (int): number of processes (0 for number of CPU)
+        poll_interval (float): time (in seconds) between two yields while waiting for results
+
+    Yields:
+        tuple: results of export_observation_file, in order of completion.
+               None is yielded every poll_interval seconds while waiting (e.g. for keeping a GUI responsive)
+    """
+
+    project = {key: pj[key] for key in pj if key != OBSERVATIONS}
+    tasks = [(kind,
+              dict(project, **{OBSERVATIONS: {obsId: pj[OBSERVATIONS][obsId]}}),
+              parameters,
+              obsId,
+              str(pathlib.Path(pathlib.Path(export_dir) / utilities.safeFileName(obsId)).with_suffix("." + output_format)),
+              output_format,
+              compression) for obsId in selected_observations]
+
+    if len(tasks) < 2 or (sys.platform.startswith("win") and getattr(sys, "frozen", False)):
+        for task in tasks:
+            yield export_observation_file(task)
+        return
+
+    if max_workers <= 0:
+        max_workers = multiprocessing.cpu_count()
+
+    with multiprocessing.Pool(min(max_workers, len(tasks))) as pool:
+        results = pool.imap_unordered(export_observation_file, tasks)
+        for _ in tasks:
+            while True:
+                try:
+                    result = results.next(timeout=poll_interval)
+                    break
+                except multiprocessing.TimeoutError:
+                    yield None
+            yield result
@@ -0,0 +1,613 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+Out-of-core loading of external data files (time, value) to be plotted synchronously with media.
+
+The file is read by blocks of rows, every step (sorting check, duplicates removal, resampling
+and subsampling) works on blocks and the intermediate results are spooled in temporary files
+mapped in memory (numpy.memmap).
+The peak memory usage depends on the block size and not on the file length.
+
+Converters are compiled once (and cached) and applied on whole columns of a block.
+Common converters (HH:MM:SS, strptime formats, negation) are replaced by vectorized built-in functions.
+A user converter whose code starts with the VECTORIZED_CONVERTER_TAG comment receives the whole column
+(numpy array of str) in INPUT and must return an array of numbers in OUTPUT.
+"""
+
+import csv
+import datetime
+import functools
+import itertools
+import logging
+import re
+import sys
+import tempfile
+
+from lazy_modules import lazy_import
+
+np = lazy_import("numpy")
+
+# number of rows read and processed at once
+CHUNK_SIZE = 100000
+
+# minimal time step for plotted data (in seconds). Data sampled at a higher rate are subsampled
+MIN_PLOT_TIME_STEP = 0.04
+
+# maximal time step for resampled data (in seconds)
+MAX_RESAMPLING_TIME_STEP = 1
+
+# first line of code of a converter working on whole columns
+VECTORIZED_CONVERTER_TAG = "# VECTORIZED"
+
+# width of strptime directives for the vectorized parsing of fixed-width date time
+FIXED_WIDTH_DIRECTIVES = {"d": 2, "m": 2, "Y": 4, "y": 2, "H": 2, "M": 2, "S": 2}
+
+# patterns of converters replaced by built-in vectorized functions
+HHMMSS_PATTERN = re.compile(r"""^h\s*,\s*m\s*,\s*s\s*=\s*INPUT\.split\(\s*['"]:['"]\s*\)\n"""
+                            r"""OUTPUT\s*=\s*(?:int|float)\(h\)\s*\*\s*3600\s*\+\s*(?:int|float)\(m\)\s*\*\s*60"""
+                            r"""\s*\+\s*(?:int|float)\(s\)$""")
+NEGATION_PATTERN = re.compile(r"""^OUTPUT\s*=\s*-\s*float\(INPUT\)$""")
+STRPTIME_PATTERN = re.compile(r"""^import datetime\n"""
+                              r"""epoch\s*=\s*datetime\.datetime\.utcfromtimestamp\(0\)\n"""
+                              r"""datetime_format\s*=\s*(?P<quote>['"])(?P<format>[^'"]*)(?P=quote)\n"""
+                              r"""OUTPUT\s*=\s*\(datetime\.datetime\.strptime\(INPUT,\s*datetime_format\)\s*-\s*epoch\)"""
+                              r"""\.total_seconds\(\)$""")
+
+
+def converter_source(name, code):
+    """
+    convert the code of a converter in a Python function
+
+    Args:
+        name (str): function name
+        code (str): Python code
+
+    Returns:
+        str: string containing Python function
+    """
+
+    function = """def {}(INPUT):\n""".format(name)
+    function += """    INPUT = INPUT.decode("utf-8") if isinstance(INPUT, bytes) else INPUT\n"""
+    function += "\n".join(["    " + row for row in code.split("\n")])
+    function += """\n    return OUTPUT"""
+
+    return function
+
+
+def hhmmss_to_seconds(values):
+    """
+    vectorized conversion of HH:MM:SS in seconds
+
+    Args:
+        values (numpy array): array of str
+
+    Returns:
+        numpy array: seconds
+    """
+    values = np.asarray(values, dtype=str)
+    hours_minutes, _, seconds = np.char.rpartition(values, ":").T
+    hours, _, minutes = np.char.rpartition(hours_minutes, ":").T
+    return hours.astype(np.float64) * 3600 + minutes.astype(np.float64) * 60 + seconds.astype(np.float64)
+
+
+def negation(values):
+    """
+    vectorized negation of values
+
+    Args:
+        values (numpy array): array of str
+
+    Returns:
+        numpy array: negated values
+    """
+    return -np.asarray(values).astype(np.float64)
+
+
+def _digits(codes, start, end):
+    """
+    integer value of the digits between start and end columns of a matrix of characters codes
+    return None if a character is not a digit
+    """
+    digits = codes[:, start:end].astype(np.int64) - ord("0")
+    if np.any((digits < 0) | (digits > 9)):
+        return None
+    return digits @ (10 ** np.arange(end - start - 1, -1, -1, dtype=np.int64))
+
+
+def _fixed_width_datetime_to_seconds(values, datetime_format):
+    """
+    vectorized parsing of date time with a fixed width (for example 24/11/2017 10:39:59.123)
+
+    Returns:
+        numpy array: seconds from epoch or None if the values or the format are not compatible
+    """
+
+    lengths = np.char.str_len(values)
+    if not len(values) or np.any(lengths != lengths[0]):
+        return None
+    width = int(lengths[0])
+    try:
+        codes = np.frombuffer(values.astype("S{}".format(width)).tobytes(), dtype=np.uint8).reshape(len(values), width)
+    except (UnicodeEncodeError, ValueError):
+        return None
+
+    fields = {"Y": 1900, "m": 1, "d": 1, "H": 0, "M": 0, "S": 0}
+    fraction = 0
+    pos, idx = 0, 0
+    while idx < len(datetime_format):
+        char = datetime_format[idx]
+        if char == "%" and idx + 1 < len(datetime_format):
+            directive = datetime_format[idx + 1]
+            idx += 2
+            if directive == "f":
+                # microseconds must be the last field
+                if idx != len(datetime_format) or pos >= width:
+                    return None
+                value = _digits(codes, pos, width)
+                if value is None:
+                    return None
+                fraction = value / 10 ** (width - pos)
+                pos = width
+                continue
+            if directive == "%":
+                char = "%"
+            elif directive in FIXED_WIDTH_DIRECTIVES:
+                end = pos + FIXED_WIDTH_DIRECTIVES[directive]
+                if end > width:
+                    return None
+                value = _digits(codes, pos, end)
+                if value is None:
+                    return None
+                if directive == "y":
+                    fields["Y"] = np.where(value < 69, value + 2000, value + 1900)
+                else:
+                    fields[directive] = value
+                pos = end
+                continue
+            else:
+                return None
+        else:
+            idx += 1
+        # literal character
+        if pos >= width or np.any(codes[:, pos] != ord(char)):
+            return None
+        pos += 1
+
+    if pos != width:
+        return None
+
+    year, month, day = np.asarray(fields["Y"]), np.asarray(fields["m"]), np.asarray(fields["d"])
+
+    # out of range fields are rejected by strptime (no roll over)
+    if (np.any((year < 1) | (month < 1) | (month > 12) | (day < 1))
+       or np.any(np.asarray(fields["H"]) > 23) or np.any(np.asarray(fields["M"]) > 59) or np.any(np.asarray(fields["S"]) > 59)):
+        return None
+    months = (year - 1970).astype("datetime64[Y]").astype("datetime64[M]") + (month - 1).astype("timedelta64[M]")
+    if np.any(day > ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64)):
+        return None
+
+    days = months.astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+
+    return (days.astype(np.int64) * 86400 + fields["H"] * 3600 + fields["M"] * 60 + fields["S"] + fraction).astype(np.float64)
+
+
+def strptime_to_seconds(datetime_format):
+    """
+    vectorized conversion of date time in seconds from epoch for the strptime format
+
+    Args:
+        datetime_format (str): strptime format
+
+    Returns:
+        function: function converting an array of str in an array of seconds from epoch
+    """
+
+    epoch = datetime.datetime(1970, 1, 1)
+
+    def convert(values):
+        values = np.asarray(values, dtype=str)
+        seconds = _fixed_width_datetime_to_seconds(values, datetime_format)
+        if seconds is not None:
+            return seconds
+        return np.fromiter(((datetime.datetime.strptime(value, datetime_format) - epoch).total_seconds()
+                            for value in values), dtype=np.float64, count=len(values))
+
+    return convert
+
+
+def builtin_converter(code):
+    """
+    return the built-in vectorized function equivalent to the converter code
+
+    Args:
+        code (str): Python code of converter
+
+    Returns:
+        function: vectorized function or None if no equivalent
+    """
+    code = "\n".join([row.strip() for row in code.split("\n") if row.strip()])
+
+    if HHMMSS_PATTERN.match(code):
+        return hhmmss_to_seconds
+    if NEGATION_PATTERN.match(code):
+        return negation
+    match = STRPTIME_PATTERN.match(code)
+    if match:
+        return strptime_to_seconds(match.group("format"))
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def compile_converter(name, code):
+    """
+    compile the converter code (results are cached)
+
+    Args:
+        name (str): converter name
+        code (str): Python code of converter
+
+    Returns:
+        function: converter function
+        bool: True if the function works on whole columns (numpy array) else on a single value
+
+    Raises:
+        exception raised by the compilation of code
+    """
+
+    function = builtin_converter(code)
+    if function is not None:
+        logging.debug("converter {}: built-in vectorized function".format(name))
+        return function, True
+
+    namespace = {}
+    exec(converter_source(name, code), namespace)
+
+    return namespace[name], code.strip().startswith(VECTORIZED_CONVERTER_TAG)
+
+
+def build_converters(converters, column_converter):
+    """
+    compile the converters associated to columns
+
+    Args:
+        converters (dict): dictionary containing converters
+        column_converter (dict): dictionary key: column index (starting from 1), value: converter name
+
+    Returns:
+        bool: True if converters successfully built else False
+        str: error message. Empty if success
+        dict: key: column index (starting from 0), value: (converter function, vectorized)
+    """
+
+    compiled = {}
+    for column_idx in column_converter:
+        conv_name = column_converter[column_idx]
+        if conv_name not in converters:
+            logging.debug("converter {} not found".format(conv_name))
+            return False, "converter not found", {}
+        try:
+            compiled[int(column_idx) - 1] = compile_converter(conv_name, converters[conv_name]["code"])
+        except:
+            return False, "error in converter", {}
+
+    return True, "", compiled
+
+
+def convert_column(values, converter):
+    """
+    apply converter to a column of values
+
+    Args:
+        values (numpy array): array of str
+        converter (tuple): converter function, vectorized
+
+    Returns:
+        numpy array: converted values (float)
+    """
+    function, vectorized = converter
+    if vectorized:
+        return np.asarray(function(values), dtype=np.float64)
+    return np.fromiter((function(value) for value in values), dtype=np.float64, count=len(values))
+
+
+def sniff_txt_file(file_name):
+    """
+    sniff the delimiter and the presence of header in txt file
+
+    Args:
+        file_name (str): path of file
+
+    Returns:
+        str: delimiter
+        bool: True if file has a header
+    """
+
+    with open(file_name) as csvfile:
+        buff = csvfile.read(1024)
+        snif = csv.Sniffer()
+        dialect = snif.sniff(buff)
+        has_header = snif.has_header(buff)
+
+    return dialect.delimiter, has_header
+
+
+def read_chunks(file_name, columns, delimiter, has_header, column_converters, chunk_size=CHUNK_SIZE):
+    """
+    read the txt file by blocks of rows
+
+    Args:
+        file_name (str): path of file
+        columns (list): indexes of columns to load (starting from 0)
+        delimiter (str): fields delimiter
+        has_header (bool): True if first row must be skipped
+        column_converters (dict): compiled converter by column index (see build_converters)
+        chunk_size (int): number of rows by block
+
+    Yields:
+        numpy array: 2D array of rows
+    """
+
+    with open(file_name) as f_in:
+        if has_header:
+            next(f_in, None)
+        while True:
+            rows = list(itertools.islice(f_in, chunk_size))
+            if not rows:
+                break
+            lines = [row for row in rows if row.strip()]
+            if not lines:
+                continue
+            if not column_converters:
+                yield np.loadtxt(lines, delimiter=delimiter, usecols=columns, ndmin=2)
+                continue
+
+            # columns with converter are loaded as str and converted at once
+            raw = np.loadtxt(lines, delimiter=delimiter, usecols=columns, dtype=str, ndmin=2)
+            block = np.empty(raw.shape, dtype=np.float64)
+            for idx, column in enumerate(columns):
+                if column in column_converters:
+                    block[:, idx] = convert_column(raw[:, idx], column_converters[column])
+                else:
+                    block[:, idx] = raw[:, idx].astype(np.float64)
+            yield block
+
+
+def iter_blocks(data, chunk_size=CHUNK_SIZE):
+    """
+    iterate over an array (or a memmap) by blocks of rows
+
+    Args:
+        data (numpy array): array
+        chunk_size (int): number of rows by block
+
+    Yields:
+        numpy array: block of rows
+    """
+    for start in range(0, len(data), chunk_size):
+        yield np.asarray(data[start:start + chunk_size])
+
+
+def spool(blocks, n_columns=2):
+    """
+    write blocks of rows in a temporary file and map it in memory
+
+    Args:
+        blocks (iterable): blocks of rows (2D arrays of float)
+        n_columns (int): number of columns
+
+    Returns:
+        numpy memmap: array of all rows (read-only). Empty array if no row
+    """
+
+    tmp_file = tempfile.TemporaryFile()
+    n_rows = 0
+    for block in blocks:
+        if not len(block):
+            continue
+        tmp_file.write(np.ascontiguousarray(block, dtype=np.float64).tobytes())
+        n_rows += len(block)
+
+    if not n_rows:
+        tmp_file.close()
+        return np.empty((0, n_columns))
+
+    tmp_file.flush()
+    data = np.memmap(tmp_file, dtype=np.float64, mode="r", shape=(n_rows, n_columns))
+    # the memory map keeps the file content available after closing
+    tmp_file.close()
+    return data
+
+
+def _check_order(blocks, substract_first_value, status):
+    """
+    check if time is ascending and substract the first time value of file to all times if required
+    """
+    first_time, last_time = None, None
+    for block in blocks:
+        if substract_first_value:
+            if first_time is None:
+                first_time = block[0, 0]
+            block[:, 0] -= first_time
+        if (last_time is not None and block[0, 0] < last_time) or np.any(np.diff(block[:, 0]) < 0):
+            status["sorted"] = False
+        last_time = block[-1, 0]
+        yield block
+
+
+def _sort_by_time(data, chunk_size=CHUNK_SIZE):
+    """
+    sort rows by time.
+    Only the index of rows is kept in memory, rows are copied by blocks in a new memory-mapped file
+    """
+    order = np.argsort(data[:, 0], kind="mergesort")
+    return spool(np.asarray(data[order[start:start + chunk_size]])
+                 for start in range(0, len(order), chunk_size))
+
+
+def _remove_duplicates(blocks, stats):
+    """
+    keep only the first row for each time value (data must be sorted by time)
+    and update statistics on time steps and values
+    """
+    last_time = None
+    for block in blocks:
+        keep = np.ones(len(block), dtype=bool)
+        keep[1:] = block[1:, 0] != block[:-1, 0]
+        if last_time is not None:
+            keep[0] = block[0, 0] != last_time
+        block = block[keep]
+        if not len(block):
+            continue
+
+        times = block[:, 0] if last_time is None else np.concatenate(([last_time], block[:, 0]))
+        diff = np.unique(np.round(np.diff(times), 4))
+        if len(diff):
+            stats["time_steps"].update(diff[:2].tolist())
+            if len(stats["time_steps"]) > 1:
+                stats["constant_rate"] = False
+                # only the 2 smallest time steps are required
+                stats["time_steps"] = set(sorted(stats["time_steps"])[:2])
+
+        _update_min_max(block, stats)
+        last_time = block[-1, 0]
+        yield block
+
+
+def _update_min_max(block, stats):
+    """
+    update min and max values of time and variable
+    """
+    for key, idx in (("time", 0), ("value", 1)):
+        min_, max_ = np.nanmin(block[:, idx]), np.nanmax(block[:, idx])
+        stats["min_" + key] = min_ if stats.get("min_" + key) is None else min(stats["min_" + key], min_)
+        stats["max_" + key] = max_ if stats.get("max_" + key) is None else max(stats["max_" + key], max_)
+
+
+def _resample(blocks, time_step, start_time, stats):
+    """
+    linear interpolation of sorted rows on a regular time grid (start_time + k * time_step)
+    the last row of each block is kept to interpolate between consecutive blocks
+    """
+    previous, k = None, 0
+    for block in blocks:
+        if previous is not None:
+            block = np.concatenate((previous, block))
+        k_end = int(np.floor((block[-1, 0] - start_time) / time_step + 1e-9))
+        if k_end >= k:
+            x = start_time + np.arange(k, k_end + 1) * time_step
+            resampled = np.column_stack((x, np.interp(x, block[:, 0], block[:, 1])))
+            _update_min_max(resampled, stats)
+            k = k_end + 1
+            yield resampled
+        previous = block[-1:]
+
+
+def _subsample(blocks, step):
+    """
+    keep one row every step rows
+    """
+    offset = 0
+    for block in blocks:
+        yield block[(-offset) % step::step]
+        offset += len(block)
+
+
+def load_data_file(file_name, columns_str, substract_first_value, converters={}, column_converter={},
+                   chunk_size=CHUNK_SIZE):
+    """
+    load the time and value columns of a txt file (tsv or csv) by blocks of rows.
+    The data are sorted by time, duplicated times are removed, the data are resampled if the sampling
+    rate is not constant and subsampled if the time step is lower than MIN_PLOT_TIME_STEP.
+
+    Args:
+        file_name (str): path of the file
+        columns_str (str): indexes of columns to be loaded. First columns must be the timestamp. Example: "4,5"
+        substract_first_value (str): "True" or "False"
+        converters (dict): dictionary containing converters
+        column_converter (dict): dictionary key: column index, value: converter name
+        chunk_size (int): number of rows processed at once
+
+    Returns:
+        bool: True if data successfully loaded, False in case of error
+        str: error message. Empty if success
+        dict: "data" (numpy memmap of time, value), "min_time_step", "min_time", "max_time", "min_value", "max_value"
+    """
+
+    try:
+        columns = [int(x) - 1 for x in columns_str.split(",")]
+    except:
+        return False, "Problem with columns {}".format(columns_str), {}
+
+    ok, msg, column_converters = build_converters(converters, column_converter)
+    if not ok:
+        return False, msg, {}
+
+    try:
+        delimiter, has_header = sniff_txt_file(file_name)
+    except:
+        return False, str(sys.exc_info()[1]), {}
+
+    status = {"sorted": True}
+    blocks = read_chunks(file_name, columns, delimiter, has_header, column_converters, chunk_size)
+    try:
+        data = spool(_check_order(blocks, substract_first_value == "True", status))
+    except:
+        return False, str(sys.exc_info()[1]), {}
+
+    logging.debug("rows loaded: {} sorted: {}".format(len(data), status["sorted"]))
+
+    if not len(data):
+        return False, "Empty input file", {}
+
+    if not status["sorted"]:
+        data = _sort_by_time(data, chunk_size)
+
+    stats = {"time_steps": set(), "constant_rate": True}
+    data = spool(_remove_duplicates(iter_blocks(data, chunk_size), stats))
+
+    if not stats["time_steps"]:
+        return False, "Only one value found in file", {}
+
+    min_time_step = min(stats["time_steps"])
+    if min_time_step == 0:
+        return False, "more values for same time", {}
+
+    logging.debug("min_time_step: {}".format(min_time_step))
+
+    # check if sampling rate is not constant
+    if not stats["constant_rate"]:
+        # increase value for low sampling rate (> 1 s)
+        min_time_step = min(min_time_step, MAX_RESAMPLING_TIME_STEP)
+        stats_resampled = {}
+        data = spool(_resample(iter_blocks(data, chunk_size), min_time_step, stats["min_time"], stats_resampled))
+        stats.update(stats_resampled)
+
+    # subsampling
+    if min_time_step < MIN_PLOT_TIME_STEP:
+        data = spool(_subsample(iter_blocks(data, chunk_size), int(round(MIN_PLOT_TIME_STEP / min_time_step, 2))))
+        min_time_step = MIN_PLOT_TIME_STEP
+
+    return True, "", {"data": data,
+                      "min_time_step": min_time_step,
+                      "min_time": stats["min_time"],
+                      "max_time": stats["max_time"],
+                      "min_value": stats["min_value"],
+                      "max_value": stats["max_value"]}
@@ -0,0 +1,397 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+Queue of FFmpeg jobs executed by a pool of workers.
+
+Each job is a dictionary with:
+    "command" (list): FFmpeg command (program and arguments)
+    "output" (str): path of the file produced by the job
+    "info" (dict): information about the job (written in the manifest)
+    "input" (str): optional path of the media file processed by the job
+    "duration" (float): optional duration of media (in seconds) for computing the progress of job.
+                        Determined with FFmpeg if None and input is specified
+
+The workers are threads: the work is done by the FFmpeg processes.
+The progress of each job is read from the output of FFmpeg (-progress option).
+The state of the queue can be saved in a JSON file after each change: an interrupted queue can be
+resumed, the jobs already done are skipped.
+"""
+
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+
+# status of jobs
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELED = "canceled"
+
+MANIFEST_FILE_NAME = "manifest.tsv"
+
+# bit rate of re-encoded video
+RECODE_BITRATE = "2000k"
+
+
+def default_jobs_number():
+    """
+    default number of jobs running at the same time
+
+    Returns:
+        int: number of CPU
+    """
+    try:
+        return max(1, multiprocessing.cpu_count())
+    except NotImplementedError:
+        return 1
+
+
+def clip_command(ffmpeg_bin, input_file, start, stop, output_file, stream_copy=False):
+    """
+    FFmpeg command for extracting the clip between start and stop from input file.
+    The seeking is done on input (before -i) to avoid decoding the media from the beginning.
+
+    Args:
+        ffmpeg_bin (str): path of ffmpeg program
+        input_file (str): path of media file
+        start (Decimal): start of clip (in seconds)
+        stop (Decimal): end of clip (in seconds)
+        output_file (str): path of clip
+        stream_copy (bool): True for copying the streams without re-encoding
+                            (the clip starts at the keyframe preceding the start)
+
+    Returns:
+        list: FFmpeg command
+    """
+
+    command = [ffmpeg_bin, "-y", "-loglevel", "error",
+               "-ss", str(start),
+               "-i", input_file,
+               "-t", str(stop - start)]
+    if stream_copy:
+        command.extend(["-c", "copy", "-avoid_negative_ts", "make_zero"])
+    command.append(output_file)
+
+    return command
+
+
+def recode_output(video_path, horiz_resol):
+    """
+    path of the re-encoded video
+
+    Args:
+        video_path (str): path of video
+        horiz_resol (int): horizontal resolution (in pixels)
+
+    Returns:
+        str: path of re-encoded video
+    """
+    return "{input_}.re-encoded.{horiz_resol}px.avi".format(input_=video_path, horiz_resol=horiz_resol)
+
+
+def recode_jobs(video_paths, horiz_resol, ffmpeg_bin):
+    """
+    jobs for re-encoding and resizing videos
+
+    Args:
+        video_paths (list): list of video paths
+        horiz_resol (int): horizontal resolution (in pixels)
+        ffmpeg_bin (str): path of ffmpeg program
+
+    Returns:
+        list: list of jobs
+    """
+    jobs = []
+    for video_path in video_paths:
+        output = recode_output(video_path, horiz_resol)
+        jobs.append({"command": [ffmpeg_bin, "-y", "-loglevel", "error",
+                                 "-i", video_path,
+                                 "-vf", "scale={}:-1".format(horiz_resol),
+                                 "-b:v", RECODE_BITRATE,
+                                 output],
+                     "output": output,
+                     "input": video_path,
+                     "duration": None,
+                     "info": {"media file": video_path, "horizontal resolution": horiz_resol}})
+    return jobs
+
+
+def media_duration(ffmpeg_bin, file_name):
+    """
+    duration of media file read in FFmpeg output
+
+    Args:
+        ffmpeg_bin (str): path of ffmpeg program
+        file_name (str): path of media file
+
+    Returns:
+        float: duration in seconds (0 if not found)
+    """
+    try:
+        p = subprocess.Popen([ffmpeg_bin, "-hide_banner", "-i", file_name], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, error = p.communicate()
+        match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", error.decode("utf-8", errors="replace"))
+        if match:
+            return int(match.group(1)) * 3600 + int(match.group(2)) * 60 + float(match.group(3))
+    except:
+        logging.debug("media duration error: {}".format(sys.exc_info()[1]))
+    return 0
+
+
+def load_state(state_file):
+    """
+    load the jobs of a queue saved in state file
+
+    Args:
+        state_file (str): path of state file
+
+    Returns:
+        list: list of jobs (empty if file not found or invalid)
+    """
+    if not state_file or not os.path.isfile(state_file):
+        return []
+    try:
+        with open(state_file) as f_in:
+            return json.loads(f_in.read())["jobs"]
+    except:
+        logging.warning("Invalid FFmpeg queue state file: {}".format(state_file))
+        return []
+
+
+def unfinished_jobs(jobs):
+    """
+    jobs to be run (not done or output file not found)
+
+    Args:
+        jobs (list): list of jobs
+
+    Returns:
+        list: list of unfinished jobs
+    """
+    return [job for job in jobs if job.get("status") != DONE or not os.path.isfile(job["output"])]
+
+
+class JobQueue():
+    """
+    run FFmpeg jobs with a pool of workers
+    """
+
+    def __init__(self, jobs, max_workers=0, state_file=""):
+        """
+        Args:
+            jobs (list): list of jobs (see module documentation).
+                         Jobs already done (with output file) are skipped, the others are run
+            max_workers (int): maximum number of jobs running at the same time (0 for number of CPU)
+            state_file (str): path of file for saving the state of queue (no saving if empty)
+        """
+        self.jobs = jobs
+        for job in unfinished_jobs(self.jobs):
+            job["status"] = PENDING
+            job["error"] = ""
+            job["progress"] = 0
+        self.state_file = state_file
+        self.max_workers = max_workers if max_workers > 0 else default_jobs_number()
+        self.canceled = False
+        self._next_job = 0
+        self._processes = {}
+        self._lock = threading.Lock()
+        self._workers = []
+
+
+    def start(self):
+        """
+        start the workers
+        """
+        for _ in range(min(self.max_workers, len(self.jobs))):
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+
+    def _save_state(self):
+        """
+        save the state of jobs in state file (must be called with lock acquired)
+        """
+        if not self.state_file:
+            return
+        try:
+            tmp_file_name = self.state_file + ".tmp"
+            with open(tmp_file_name, "w") as f_out:
+                f_out.write(json.dumps({"jobs": self.jobs}, default=str, indent=1))
+            os.replace(tmp_file_name, self.state_file)
+        except:
+            logging.warning("Error saving FFmpeg queue state: {}".format(sys.exc_info()[1]))
+
+
+    def _set_status(self, job, status, error=""):
+        """
+        set status of job and save state
+        """
+        with self._lock:
+            job["status"], job["error"] = status, error
+            if status == DONE:
+                job["progress"] = 1
+            self._save_state()
+
+
+    def _work(self):
+        """
+        worker: run the pending jobs until queue is empty or canceled
+        """
+        while True:
+            with self._lock:
+                while self._next_job < len(self.jobs) and self.jobs[self._next_job]["status"] != PENDING:
+                    self._next_job += 1
+                if self.canceled or self._next_job >= len(self.jobs):
+                    return
+                job_idx = self._next_job
+                self._next_job += 1
+                job = self.jobs[job_idx]
+                job["status"] = RUNNING
+                self._save_state()
+
+            if job.get("duration") is None and job.get("input"):
+                job["duration"] = media_duration(job["command"][0], job["input"])
+
+            # progress information on stdout
+            command = job["command"][:1] + ["-progress", "pipe:1", "-nostats"] + job["command"][1:]
+            logging.debug("ffmpeg command: {}".format(command))
+
+            error_file = tempfile.TemporaryFile()
+            try:
+                p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=error_file)
+            except:
+                error_file.close()
+                self._set_status(job, FAILED, str(sys.exc_info()[1]))
+                continue
+
+            with self._lock:
+                self._processes[job_idx] = p
+            for line in p.stdout:
+                key, _, value = line.decode("utf-8", errors="replace").strip().partition("=")
+                if key in ["out_time_us", "out_time_ms"] and job.get("duration") and value.isdigit():
+                    # out_time_ms is in microseconds too
+                    job["progress"] = min(1, int(value) / 1000000 / job["duration"])
+            p.wait()
+            with self._lock:
+                del self._processes[job_idx]
+
+            error_file.seek(0)
+            error = error_file.read().decode("utf-8", errors="replace").strip()
+            error_file.close()
+
+            if self.canceled and p.returncode:
+                # remove the incomplete file
+                if os.path.isfile(job["output"]):
+                    try:
+                        os.remove(job["output"])
+                    except OSError:
+                        pass
+                self._set_status(job, CANCELED)
+            elif p.returncode:
+                self._set_status(job, FAILED, error)
+            else:
+                self._set_status(job, DONE)
+
+
+    def cancel(self):
+        """
+        cancel the pending jobs and stop the running processes
+        """
+        with self._lock:
+            self.canceled = True
+            for p in self._processes.values():
+                try:
+                    p.terminate()
+                except:
+                    pass
+            for job in self.jobs[self._next_job:]:
+                if job["status"] == PENDING:
+                    job["status"] = CANCELED
+            self._save_state()
+
+
+    def is_finished(self):
+        """
+        Returns:
+            bool: True if all workers are finished
+        """
+        return not any([worker.is_alive() for worker in self._workers])
+
+
+    def wait(self):
+        """
+        wait for the end of all jobs
+        """
+        for worker in self._workers:
+            worker.join()
+
+
+    def count(self, status):
+        """
+        Returns:
+            int: number of jobs with status
+        """
+        return len([job for job in self.jobs if job["status"] == status])
+
+
+    def remove_state(self):
+        """
+        remove the state file
+        """
+        if self.state_file and os.path.isfile(self.state_file):
+            try:
+                os.remove(self.state_file)
+            except OSError:
+                pass
+
+
+def write_manifest(file_name, jobs, fields):
+    """
+    write the manifest (TSV) of the jobs
+
+    Args:
+        file_name (str): path of the manifest
+        jobs (list): list of jobs
+        fields (list): fields of job info to write
+
+    Returns:
+        bool: True if OK else False
+        str: error message
+    """
+    try:
+        with open(file_name, "w", newline="") as f_out:
+            writer = csv.writer(f_out, delimiter="\t")
+            writer.writerow(fields + ["file", "status", "error"])
+            for job in jobs:
+                writer.writerow([job["info"].get(field, "") for field in fields]
+                                + [os.path.basename(job["output"]), job["status"], job["error"].replace("\n", " ")])
+        return True, ""
+    except:
+        return False, str(sys.exc_info()[1])
@@ -24,8 +24,10 @@ Copyright 2012-2018 Olivier Friard
 from decimal import Decimal
 import logging
 import utilities
-import numpy as np
 from config import *
+from lazy_modules import lazy_import
+
+np = lazy_import("numpy")
 
 
 def cohen_kappa(cursor,
@@ -0,0 +1,258 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+Lag sequential analysis of behavioral sequences coded with integers (see behavioral_sequences)
+
+For each lag the observed transitions are compared with the expected transitions
+(from the totals of rows and columns):
+    adjusted residuals (Allison and Liker 1982)
+    z-scores (Sackett 1979)
+    permutation p-values: the sequences are shuffled (the frequencies of behaviors are kept)
+    and the transitions of shuffled sequences are compared with the observed transitions
+"""
+
+import multiprocessing
+import sys
+
+import transitions
+from lazy_modules import lazy_import
+
+np = lazy_import("numpy")
+
+# memory (bytes) used by a worker for a chunk of permutations
+PERMUTATIONS_MEMORY = 64 * 1024 * 1024
+# maximum number of permutations in a chunk (a chunk is shuffled with its own seed)
+PERMUTATIONS_CHUNK = 1000
+
+
+def expected_transitions(observed):
+    """
+    expected number of transitions (independence of rows and columns)
+
+    Args:
+        observed (np.array): number of transitions (rows: from, columns: to)
+
+    Returns:
+        np.array: expected number of transitions
+    """
+
+    total = observed.sum()
+    if not total:
+        return np.zeros(observed.shape)
+    return np.outer(observed.sum(axis=1), observed.sum(axis=0)) / total
+
+
+def adjusted_residuals(observed, expected):
+    """
+    adjusted residuals (NaN if not defined)
+
+    Args:
+        observed (np.array): number of transitions
+        expected (np.array): expected number of transitions
+
+    Returns:
+        np.array: adjusted residuals
+    """
+
+    total = observed.sum()
+    rows_p = observed.sum(axis=1, keepdims=True) / total if total else np.zeros((observed.shape[0], 1))
+    columns_p = observed.sum(axis=0, keepdims=True) / total if total else np.zeros((1, observed.shape[1]))
+    variance = expected * (1 - rows_p) * (1 - columns_p)
+
+    return np.divide(observed - expected, np.sqrt(variance), out=np.full(observed.shape, np.nan), where=variance > 0)
+
+
+def z_scores(observed, expected):
+    """
+    z-scores (binomial approximation, NaN if not defined)
+
+    Args:
+        observed (np.array): number of transitions
+        expected (np.array): expected number of transitions
+
+    Returns:
+        np.array: z-scores
+    """
+
+    total = observed.sum()
+    columns_p = observed.sum(axis=0, keepdims=True) / total if total else np.zeros((1, observed.shape[1]))
+    variance = expected * (1 - columns_p)
+
+    return np.divide(observed - expected, np.sqrt(variance), out=np.full(observed.shape, np.nan), where=variance > 0)
+
+
+def _permutations_chunk_size(sequences, n_behaviors, max_lag):
+    """
+    number of permutations of a chunk: fits in PERMUTATIONS_MEMORY.
+    The size does not depend on the number of processes, the p-values computed with a seed are the same on every machine
+
+    Args:
+        sequences (list): list of sequences of behaviors coded with integers
+        n_behaviors (int): number of behaviors
+        max_lag (int): maximum lag
+
+    Returns:
+        int: number of permutations of a chunk
+    """
+
+    n_cells = n_behaviors * n_behaviors
+    # int64 counts of transitions and bincount, shuffled sequence with the temporary arrays of codes
+    permutation_bytes = 8 * (max_lag * n_cells + n_cells + 5 * max([len(seq) for seq in sequences] + [1]))
+
+    return max(1, min(PERMUTATIONS_CHUNK, PERMUTATIONS_MEMORY // permutation_bytes))
+
+
+def _permutation_worker(args):
+    """
+    count the permutations of a chunk with number of transitions greater (less) or equal than observed
+
+    Args:
+        args (tuple): sequences, number of behaviors, maximum lag, number of permutations of chunk, seed of chunk,
+                      observed transitions (max_lag x n_behaviors x n_behaviors)
+
+    Returns:
+        np.array: number of permutations with transitions >= observed
+        np.array: number of permutations with transitions <= observed
+    """
+
+    sequences, n_behaviors, max_lag, n_permutations, seed, observed = args
+
+    rng = np.random.default_rng(seed)
+    n_cells = n_behaviors * n_behaviors
+
+    # index of permutation added to codes of transitions for counting all permutations at once
+    offset = (np.arange(n_permutations, dtype=np.int64) * n_cells)[:, None]
+    counts = np.zeros((n_permutations, max_lag, n_cells), dtype=np.int64)
+    for seq in sequences:
+        shuffled = rng.permuted(np.tile(seq.astype(np.int64), (n_permutations, 1)), axis=1)
+        for lag in range(1, min(max_lag, len(seq) - 1) + 1):
+            codes = offset + shuffled[:, :-lag] * n_behaviors + shuffled[:, lag:]
+            counts[:, lag - 1] += np.bincount(codes.ravel(),
+                                              minlength=n_permutations * n_cells).reshape(n_permutations, n_cells)
+
+    counts = counts.reshape((n_permutations,) + observed.shape)
+
+    return (counts >= observed).sum(axis=0), (counts <= observed).sum(axis=0)
+
+
+def permutation_p_values(sequences, n_behaviors, observed, n_permutations, max_workers=0, seed=None):
+    """
+    two-sided permutation p-values of observed transitions computed with a pool of processes.
+    The permutations are split in chunks with their own seed: with a seed the p-values do not depend on the number of processes.
+    For windows exe (created with pyinstaller) multiprocessing can not be used: the permutations are done in one process.
+
+    Args:
+        sequences (list): list of sequences of behaviors coded with integers
+        n_behaviors (int): number of behaviors
+        observed (np.array): observed transitions (max_lag x n_behaviors x n_behaviors)
+        n_permutations (int): number of permutations
+        max_workers (int): number of processes (0 for number of CPU)
+        seed (int): seed of random generator (None for random seed)
+
+    Returns:
+        np.array: p-values (max_lag x n_behaviors x n_behaviors)
+    """
+
+    max_lag = observed.shape[0]
+    chunk_size = _permutations_chunk_size(sequences, n_behaviors, max_lag)
+    n_chunks = -(-n_permutations // chunk_size)
+
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    tasks = [(sequences, n_behaviors, max_lag, min(chunk_size, n_permutations - idx * chunk_size), seeds[idx], observed)
+             for idx in range(n_chunks)]
+
+    if max_workers <= 0:
+        max_workers = multiprocessing.cpu_count()
+    if sys.platform.startswith("win") and getattr(sys, "frozen", False):
+        max_workers = 1
+    max_workers = max(1, min(max_workers, n_chunks))
+
+    if max_workers == 1:
+        results = [_permutation_worker(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(max_workers) as pool:
+            results = pool.map(_permutation_worker, tasks, chunksize=1)
+
+    greater = sum([result[0] for result in results])
+    less = sum([result[1] for result in results])
+
+    return np.minimum(1, 2 * (np.minimum(greater, less) + 1) / (n_permutations + 1))
+
+
+def lag_sequential_analysis(sequences, n_behaviors, max_lag=1, n_permutations=0, max_workers=0, seed=None):
+    """
+    lag sequential analysis for lags 1 to max_lag
+
+    Args:
+        sequences (list): list of sequences of behaviors coded with integers
+        n_behaviors (int): number of behaviors (size of vocabulary)
+        max_lag (int): maximum lag
+        n_permutations (int): number of permutations for p-values (0 for no permutation test)
+        max_workers (int): number of processes for permutations (0 for number of CPU)
+        seed (int): seed of random generator (None for random seed)
+
+    Returns:
+        list: one dict by lag with keys "lag", "observed", "expected", "adjusted residuals", "z-scores",
+              "p-values" (None if no permutation)
+    """
+
+    observed = np.array([transitions.transitions_counts(sequences, n_behaviors, lag) for lag in range(1, max_lag + 1)])
+
+    p_values = [None] * max_lag
+    if n_permutations:
+        p_values = permutation_p_values(sequences, n_behaviors, observed, n_permutations,
+                                        max_workers=max_workers, seed=seed)
+
+    results = []
+    for lag in range(1, max_lag + 1):
+        expected = expected_transitions(observed[lag - 1])
+        results.append({"lag": lag,
+                        "observed": observed[lag - 1],
+                        "expected": expected,
+                        "adjusted residuals": adjusted_residuals(observed[lag - 1], expected),
+                        "z-scores": z_scores(observed[lag - 1], expected),
+                        "p-values": p_values[lag - 1]})
+
+    return results
+
+
+def results_to_tsv(results, behaviors):
+    """
+    results of lag sequential analysis as TSV text (one matrix by lag and parameter)
+
+    Args:
+        results (list): results of lag_sequential_analysis
+        behaviors (list): text of behaviors
+
+    Returns:
+        str: TSV text
+    """
+
+    out = ""
+    for result in results:
+        for parameter in ["observed", "expected", "adjusted residuals", "z-scores", "p-values"]:
+            if result[parameter] is None:
+                continue
+            values = result[parameter] if parameter == "observed" else np.round(result[parameter], 4)
+            out += "Lag {}\t{}\n".format(result["lag"], parameter)
+            out += transitions.matrix_to_tsv(behaviors, behaviors, values) + "\n"
+
+    return out
@@ -0,0 +1,67 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+Lazy import of heavy modules (numpy, matplotlib, tablib, VLC bindings...)
+
+The module returned by lazy_import is registered in sys.modules but its code is executed
+when one of its attributes is accessed for the first time (see importlib.util.LazyLoader).
+The following imports of the module (import numpy as np) return the same lazy module.
+"""
+
+import importlib.util
+import sys
+
+
+def lazy_import(name, required=False):
+    """
+    import a module that will be loaded at its first use
+
+    Args:
+        name (str): module name (the parent package of a submodule is loaded)
+        required (bool): raise ModuleNotFoundError if the module is not installed
+
+    Returns:
+        module: lazy module (None if the module is not installed and not required)
+    """
+
+    if name in sys.modules:
+        return sys.modules[name]
+
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        spec = None
+    if spec is None:
+        if required:
+            raise ModuleNotFoundError("No module named {!r}".format(name), name=name)
+        return None
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    if "." in name:
+        parent, _, child = name.rpartition(".")
+        setattr(sys.modules[parent], child, module)
+
+    return module
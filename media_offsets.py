@@ -0,0 +1,133 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+Index of the media files played one after the other by a player.
+
+The global time (time from the beginning of the first media file) is mapped to the media file
+and to the time in this media file with the cumulative durations of media files (offsets)
+and a binary search.
+The unit of time is the unit of the durations (seconds for the media info of observation,
+milliseconds for the players).
+"""
+
+import bisect
+import itertools
+
+from config import *
+
+
+class MediaOffsets():
+    """
+    cumulative offsets of media files
+    """
+
+    def __init__(self, media_files, durations):
+        """
+        Args:
+            media_files (list): list of media files (in playing order)
+            durations (list): durations of media files
+        """
+        self.media_files = list(media_files)
+        self.durations = list(durations)
+        # offsets[idx] is the global time of the beginning of media file idx (sum(durations[0:idx]))
+        self.offsets = list(itertools.accumulate([0] + self.durations))
+
+
+    def __len__(self):
+        return len(self.durations)
+
+
+    @property
+    def total(self):
+        """
+        Returns:
+            total duration of media files
+        """
+        return self.offsets[-1]
+
+
+    def offset(self, idx):
+        """
+        Args:
+            idx (int): index of media file
+
+        Returns:
+            global time of the beginning of media file
+        """
+        return self.offsets[idx]
+
+
+    def media_index(self, global_time):
+        """
+        index of the media file playing at global time.
+        The last media file is returned if global time is after the end of media,
+        the first one if global time is negative.
+
+        Args:
+            global_time: global time
+
+        Returns:
+            int: index of media file (-1 if no media file)
+        """
+        if not self.durations:
+            return -1
+        return max(0, bisect.bisect_right(self.offsets, global_time, 0, len(self.durations)) - 1)
+
+
+    def locate(self, global_time):
+        """
+        media file and time in this media file at global time
+
+        Args:
+            global_time: global time
+
+        Returns:
+            str: media file ("" if global time is after the end of media)
+            time in media file (0 if global time is after the end of media)
+        """
+        if global_time >= self.total:
+            return "", 0
+        idx = self.media_index(global_time)
+        return self.media_files[idx], global_time - self.offsets[idx]
+
+
+def observation_media_offsets(observation, player=PLAYER1):
+    """
+    index of media files of player with durations (in seconds) from the media info of observation
+
+    Args:
+        observation (dict): observation
+        player (str): player
+
+    Returns:
+        MediaOffsets: index of media files (empty if the duration of a media file is not available)
+    """
+
+    if observation.get(TYPE) != MEDIA:
+        return MediaOffsets([], [])
+
+    media_files = observation[FILE].get(player, [])
+    try:
+        durations = [observation["media_info"]["length"][media_file] for media_file in media_files]
+    except (KeyError, TypeError):
+        return MediaOffsets([], [])
+
+    return MediaOffsets(media_files, durations)
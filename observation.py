@@ -38,14 +38,16 @@ import tempfile
 import glob
 import logging
 from pathlib import Path
-import numpy
 
 from config import *
 from utilities import *
 import dialog
 import plot_spectrogram
 import recode_widget
-import plot_data_module
+from lazy_modules import lazy_import
+
+numpy = lazy_import("numpy")
+plot_data_module = lazy_import("plot_data_module")
 
 
 if QT_VERSION_STR[0] == "4":
@@ -261,12 +263,6 @@ class Observation(QDialog, Ui_Form):
         user select a data file to be plotted synchronously with media file
         """
         
-        # limit to 2 files
-        if self.tw_data_files.rowCount() >= 2:
-            QMessageBox.warning(self, programName , ("It is not yet possible to plot more than 2 external data"
-                                                     "This limitation will be removed in future"))
-            return
-        
         QMessageBox.warning(self, programName, "This function is experimental.<br>Please report any bug")            
         
         os.chdir(os.path.expanduser("~"))
@@ -0,0 +1,284 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+
+Import of observations from a BORIS project file
+
+The project file is read by chunks: the observations are decoded one by one, so the whole source project
+is never loaded in memory. The position of each observation in the file is recorded when the list of observations
+is read: the selected observations are then decoded without decoding the other observations.
+The events of the imported observations are checked against the ethogram and the subjects of the project
+and the conflicts of all observations are reported at once.
+"""
+
+import json
+import re
+
+from config import *
+import ethogram_index
+import utilities
+
+# size of chunks read from project file
+READ_SIZE = 1024 * 1024
+
+# number of observations listed in the report of conflicts
+REPORT_MAX_OBSERVATIONS = 20
+
+_NOT_WHITESPACE = re.compile(r"\S")
+
+
+class _JSONStream:
+    """
+    sequential reader of the JSON values of a file read by chunks
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        # number of characters of file before buffer
+        self.offset = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+
+    def _read(self, size=READ_SIZE):
+        """
+        add a chunk of file to buffer (the part of buffer before pos is discarded)
+
+        Returns:
+            bool: False if end of file
+        """
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+
+    def next_char(self):
+        """
+        next character that is not a whitespace (not consumed)
+        """
+        while True:
+            match = _NOT_WHITESPACE.search(self.buffer, self.pos)
+            if match:
+                self.pos = match.start()
+                return self.buffer[self.pos]
+            self.pos = len(self.buffer)
+            if not self._read():
+                raise ValueError("Unexpected end of file")
+
+
+    def expect(self, chars):
+        """
+        consume the next character that must be one of chars
+
+        Returns:
+            str: character
+        """
+        char = self.next_char()
+        if char not in chars:
+            raise ValueError("Expecting one of {} at position {}".format(chars, self.pos))
+        self.pos += 1
+        return char
+
+
+    def position(self):
+        """
+        position (number of characters) in file
+        """
+        return self.offset + self.pos
+
+
+    def value(self):
+        """
+        decode the next JSON value (more chunks are read if the value is not complete)
+        """
+        self.next_char()
+        size = READ_SIZE
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number at the end of buffer may continue in next chunk
+                if end == len(self.buffer) and not self.eof:
+                    raise ValueError("Incomplete value")
+                self.pos = end
+                return value
+            except ValueError:
+                if self.eof:
+                    raise
+                self._read(size)
+                size *= 2
+
+
+def iter_observations(file_name, selected_observations=None):
+    """
+    iterate over the observations of a project file
+
+    Args:
+        file_name (str): path of project file
+        selected_observations (list): id of observations to return (None for all)
+
+    Returns:
+        generator: (observation id, observation, position of observation in file (start, end))
+                   (observation is None if not selected)
+    """
+
+    with open(file_name, "r") as f:
+        stream = _JSONStream(f)
+        stream.expect("{")
+        if stream.next_char() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if key != OBSERVATIONS:
+                stream.value()
+            else:
+                stream.expect("{")
+                if stream.next_char() == "}":
+                    return
+                while True:
+                    obs_id = stream.value()
+                    stream.expect(":")
+                    start = stream.position()
+                    observation = stream.value()
+                    if selected_observations is not None and obs_id not in selected_observations:
+                        observation = None
+                    yield obs_id, observation, (start, stream.position())
+                    if stream.expect(",}") == "}":
+                        return
+            if stream.expect(",}") == "}":
+                return
+
+
+def observations_positions(file_name):
+    """
+    id and position in file of the observations of a project file
+
+    Args:
+        file_name (str): path of project file
+
+    Returns:
+        dict: position in file (start, end) by observation id
+    """
+    return {obs_id: position for obs_id, _, position in iter_observations(file_name, [])}
+
+
+def read_observations(file_name, selected_observations, positions=None):
+    """
+    read the selected observations of a project file. The times are converted to Decimal.
+
+    Args:
+        file_name (str): path of project file
+        selected_observations (list): id of observations
+        positions (dict): positions of observations in file (see observations_positions).
+                          If None the file is read entirely.
+
+    Returns:
+        dict: observations
+    """
+
+    observations = {}
+
+    if positions is None:
+        for obs_id, observation, _ in iter_observations(file_name, set(selected_observations)):
+            if observation is not None:
+                observations[obs_id] = utilities.observation_time_to_decimal(observation)
+        return observations
+
+    decoder = json.JSONDecoder()
+    with open(file_name, "r") as f:
+        current = 0
+        for obs_id in sorted(selected_observations, key=lambda x: positions[x]):
+            start, end = positions[obs_id]
+            # skip the characters before observation
+            while current < start:
+                skipped = len(f.read(min(start - current, READ_SIZE)))
+                if not skipped:
+                    raise ValueError("Unexpected end of file")
+                current += skipped
+            text = f.read(end - start)
+            current += len(text)
+            observation = decoder.decode(text)
+            if not isinstance(observation, dict) or EVENTS not in observation:
+                raise ValueError("Observation {} not found".format(obs_id))
+            observations[obs_id] = utilities.observation_time_to_decimal(observation)
+
+    return observations
+
+
+def check_observations(pj, observations):
+    """
+    check the compatibility of observations with the ethogram and the subjects of project
+
+    Args:
+        pj (dict): BORIS project
+        observations (dict): observations to import
+
+    Returns:
+        dict: conflicts by observation id (only observations with conflicts):
+              "behaviors": behaviors not in ethogram (set)
+              "subjects": subjects not defined in project (set)
+              "exists": True if the observation id exists in project
+    """
+
+    index = ethogram_index.get_index(pj[ETHOGRAM], pj[SUBJECTS])
+    # No focal subject is always accepted
+    known_subjects = set(index.subject_by_name) | {""}
+
+    conflicts = {}
+    for obs_id in observations:
+        events = observations[obs_id][EVENTS]
+        behaviors = {event[EVENT_BEHAVIOR_FIELD_IDX] for event in events}.difference(index.behaviors_by_code)
+        subjects = {event[EVENT_SUBJECT_FIELD_IDX] for event in events}.difference(known_subjects)
+        exists = obs_id in pj[OBSERVATIONS]
+        if behaviors or subjects or exists:
+            conflicts[obs_id] = {"behaviors": behaviors, "subjects": subjects, "exists": exists}
+
+    return conflicts
+
+
+def merge_observations(pj, observations):
+    """
+    add observations to project. The observations with an id existing in project are renamed
+    "<id> (imported at <date>)"
+
+    Args:
+        pj (dict): BORIS project
+        observations (dict): observations to import
+
+    Returns:
+        list: id of imported observations in project
+    """
+
+    imported_at = utilities.datetime_iso8601()
+    imported = {}
+    for obs_id in observations:
+        new_id = "{} (imported at {})".format(obs_id, imported_at) if obs_id in pj[OBSERVATIONS] else obs_id
+        imported[new_id] = dict(observations[obs_id])
+    pj[OBSERVATIONS].update(imported)
+
+    return list(imported)
@@ -32,25 +32,233 @@ except:
     from PyQt4.QtGui import *
     from PyQt4.QtCore import *
 
+import operator
 import os
 import dialog
 import config
 from utilities import *
+from lazy_modules import lazy_import
+
+np = lazy_import("numpy")
+
+# number of rows used to compute the width of columns
+RESIZE_CONTENTS_PRECISION = 100
+
+# delay (ms) between the last modification of the filter text and the filtering
+FILTER_DELAY = 250
+
+# filter logics
+CONTAINS = "contains"
+NOT_CONTAINS = "does not contain"
+BETWEEN = "between (use and to separate terms)"
+FILTER_LOGICS = [CONTAINS, NOT_CONTAINS, "=", "!=", ">", "<", ">=", "<=", BETWEEN]
+
+
+def str2float(s):
+    """
+    convert str in float or return None
+    """
+    try:
+        return float(s)
+    except:
+        return None
+
+
+def filter_mask(text, number, logic, search):
+    """
+    rows of a column matching the filter
+
+    The values are compared as numbers if the value and the searched term are numbers else as text.
+
+    Args:
+        text (numpy.array): values of column (upper case str)
+        number (numpy.array): values of column as float (nan if not numeric)
+        logic (str): filter logic (see FILTER_LOGICS)
+        search (str): searched term (upper case)
+
+    Returns:
+        numpy.array: True for matching rows
+    """
+
+    is_number = ~np.isnan(number)
+
+    if logic == CONTAINS:
+        return np.char.find(text, search) >= 0
+
+    if logic == NOT_CONTAINS:
+        return np.char.find(text, search) < 0
+
+    if logic == BETWEEN:
+        if len(search.split(" AND ")) != 2:
+            return np.zeros(len(text), dtype=bool)
+        s1, s2 = search.split(" AND ")
+        s1_num, s2_num = str2float(s1), str2float(s2)
+        if (s1_num is None) != (s2_num is None):
+            return np.zeros(len(text), dtype=bool)
+        mask = (text >= s1) & (text <= s2)
+        if s1_num is not None:
+            with np.errstate(invalid="ignore"):
+                mask = np.where(is_number, (number >= s1_num) & (number <= s2_num), mask)
+        return mask
+
+    compare = {"=": operator.eq,
+               "!=": operator.ne,
+               ">": operator.gt,
+               "<": operator.lt,
+               ">=": operator.ge,
+               "<=": operator.le}[logic]
+
+    mask = compare(text, search)
+    search_num = str2float(search)
+    if search_num is not None:
+        with np.errstate(invalid="ignore"):
+            mask = np.where(is_number, compare(number, search_num), mask)
+    return mask
+
+
+class ObservationsTableModel(QAbstractTableModel):
+    """
+    model of observations list: rows of data are displayed in order of self.order (sorted)
+
+    The sort keys and the columnar copy of data used for filtering are computed at first use of a column.
+    """
+
+    def __init__(self, data, header, column_type, set_values=None, parent=None):
+        super(ObservationsTableModel, self).__init__(parent)
+        self._data = data
+        self._header = header
+        self.column_type = column_type
+        self.set_values = set_values if set_values is not None else {}
+        self.order = np.arange(len(data))
+        self._ranks, self._text, self._number = {}, {}, {}
+
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._data)
+
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._header)
+
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role == Qt.DisplayRole:
+            return self._data[self.order[index.row()]][index.column()]
+        return None
+
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return self._header[section]
+            return section + 1
+        return None
+
+
+    def sort_key(self, value, column):
+        """
+        typed key for sorting a value of column:
+            numeric: float (values that are not numbers first)
+            timestamp: date and time in ISO format
+            value from set: position in set of values (values not in set last)
+            text: value
+        """
+        if self.column_type[column] == config.NUMERIC:
+            number = str2float(value)
+            return (0, 0) if number is None or number != number else (1, number)
+        if self.column_type[column] == config.TIMESTAMP:
+            return value.replace("T", " ")
+        if self.column_type[column] == config.SET_OF_VALUES:
+            values = self.set_values.get(column, [])
+            return (values.index(value), "") if value in values else (len(values), value)
+        return value
+
+
+    def ranks(self, column):
+        """
+        rank of rows of data sorted by column
+        """
+        if column not in self._ranks:
+            ranks = np.empty(len(self._data), dtype=int)
+            ranks[sorted(range(len(self._data)), key=lambda row: self.sort_key(self._data[row][column], column))] = np.arange(len(self._data))
+            self._ranks[column] = ranks
+        return self._ranks[column]
 
 
-class MyTableWidgetItem(QTableWidgetItem):
-    def __init__(self, text, sortKey):
-            QTableWidgetItem.__init__(self, text, QTableWidgetItem.UserType)
-            self.sortKey = sortKey
+    def columns(self, column):
+        """
+        columnar copy of column for filtering
 
-    #Qt uses a simple < check for sorting items, override this to use the sortKey
-    def __lt__(self, other):
-            return self.sortKey < other.sortKey
+        Returns:
+            numpy.array: values (upper case str)
+            numpy.array: values as float (nan if not numeric)
+        """
+        if column not in self._text:
+            values = [row[column] for row in self._data]
+            self._text[column] = np.array([str(x).upper() for x in values], dtype=str)
+            numbers = [str2float(x) for x in values]
+            self._number[column] = np.array([np.nan if x is None else x for x in numbers], dtype=float)
+        return self._text[column], self._number[column]
+
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column < 0 or column >= len(self._header):
+            return
+        self.layoutAboutToBeChanged.emit()
+        ranks = self.ranks(column)
+        new_order = np.argsort(ranks if order == Qt.AscendingOrder else -ranks, kind="stable")
+
+        # rows of persistent indexes (selection) follow the data
+        new_row = np.empty(len(self._data), dtype=int)
+        new_row[new_order] = np.arange(len(self._data))
+        old_indexes = self.persistentIndexList()
+        new_indexes = [self.index(int(new_row[self.order[idx.row()]]), idx.column()) for idx in old_indexes]
+        self.order = new_order
+        self.changePersistentIndexList(old_indexes, new_indexes)
+
+        self.layoutChanged.emit()
+
+
+    def data_row(self, row):
+        """
+        row of data displayed at row
+        """
+        return self.order[row]
+
+
+class ObservationsFilterProxyModel(QSortFilterProxyModel):
+    """
+    filter of observations list: rows of data are accepted with a mask computed with filter_mask.
+    The sorting is done by the source model (precomputed sort keys).
+    """
+
+    def __init__(self, parent=None):
+        super(ObservationsFilterProxyModel, self).__init__(parent)
+        self.mask = None
+
+
+    def set_mask(self, mask):
+        """
+        set the rows of data to display
+
+        Args:
+            mask (numpy.array): True for rows of data to display (None for all rows)
+        """
+        self.mask = mask
+        self.invalidateFilter()
+
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self.mask is None or bool(self.mask[self.sourceModel().data_row(source_row)])
+
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)
 
 
 class observationsList_widget(QDialog):
 
-    def __init__(self, data, header, column_type, parent=None):
+    def __init__(self, data, header, column_type, set_values=None, parent=None):
         super(observationsList_widget, self).__init__(parent)
 
         self.data = data
@@ -61,9 +269,19 @@ class observationsList_widget(QDialog):
 
         self.mode = config.SINGLE
 
+        # filtering starts when the text is not modified during FILTER_DELAY
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DELAY)
+        self.filter_timer.timeout.connect(self.view_filter)
+
         self.lineEdit = QLineEdit(self)
-        self.lineEdit.textChanged.connect(self.view_filter)
-        self.view = QTableWidget(self)
+        self.lineEdit.textChanged.connect(self.filter_timer.start)
+        self.model = ObservationsTableModel(self.data, header, column_type, set_values, self)
+        self.proxy_model = ObservationsFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.model)
+        self.view = QTableView(self)
+        self.view.setModel(self.proxy_model)
         self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.view.setSortingEnabled(True)
 
@@ -71,16 +289,7 @@ class observationsList_widget(QDialog):
         self.comboBox.currentIndexChanged.connect(self.view_filter)
 
         self.cbLogic = QComboBox(self)
-        self.cbLogic.addItems(["contains",
-                               "does not contain",
-                               "=",
-                               "!=",
-                               ">",
-                               "<",
-                               ">=",
-                               "<=",
-                               "between (use and to separate terms)"
-                              ])
+        self.cbLogic.addItems(FILTER_LOGICS)
         self.cbLogic.currentIndexChanged.connect(self.view_filter)
 
         self.label = QLabel(self)
@@ -127,21 +336,17 @@ class observationsList_widget(QDialog):
 
         self.view.doubleClicked.connect(self.view_doubleClicked)
 
-        self.view.setRowCount(len(self.data))
-        self.view.setColumnCount(len(self.data[0]))
-
-        self.view.setHorizontalHeaderLabels(header)
-
-        for r in range(len(self.data)):
-            for c in range(len(self.data[0])):
-                self.view.setItem(r, c, self.set_item(r, c))
-
+        # width of columns computed on the first rows
+        try:
+            self.view.horizontalHeader().setResizeContentsPrecision(RESIZE_CONTENTS_PRECISION)
+        except:
+            pass
         self.view.resizeColumnsToContents()
 
         self.comboBox.addItems(header)
 
-        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers);
-        self.label.setText("{} observation{}".format(self.view.rowCount(), "s" * (self.view.rowCount()>1)))
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.label.setText("{} observation{}".format(self.proxy_model.rowCount(), "s" * (self.proxy_model.rowCount() > 1)))
 
 
 
@@ -171,9 +376,10 @@ class observationsList_widget(QDialog):
         select or unselect all filtered observations
         """
 
-        for idx in range(self.view.rowCount()):
-            table_item = self.view.item(idx, 0)
-            table_item.setSelected(mode == "select")
+        if mode == "select":
+            self.view.selectAll()
+        else:
+            self.view.clearSelection()
 
 
     def pbCancel_clicked(self):
@@ -188,133 +394,17 @@ class observationsList_widget(QDialog):
     def pbEdit_clicked(self):
         self.done(3)
 
-    def set_item(self, r, c):
-
-        if self.column_type[c] == config.NUMERIC:
-            try:
-                item = MyTableWidgetItem(self.data[r][c], float(self.data[r][c]))
-            except:
-                item = MyTableWidgetItem(self.data[r][c], 0)
-        else:
-            item = MyTableWidgetItem(self.data[r][c], self.data[r][c])
-        return item
-
-
     def view_filter(self):
         """
         filter
         """
 
-        def str2float(s):
-            """
-            convert str in float or return str
-            """
-            try:
-                return float(s)
-            except:
-                return s
-
-        def in_(s, l):
-            return s in l
-
-        def not_in(s, l):
-            return s not in l
-
-        def equal(s, l):
-            l_num, s_num = str2float(l), str2float(s)
-            if type(l_num) == type(s_num):
-                return l_num == s_num
-            else:
-                return l == s
-
-        def not_equal(s, l):
-            l_num, s_num = str2float(l), str2float(s)
-            if type(l_num) == type(s_num):
-                return l_num != s_num
-            else:
-                return l != s
-
-        def gt(s, l):
-            l_num, s_num = str2float(l), str2float(s)
-            if type(l_num) == type(s_num):
-                return l_num > s_num
-            else:
-                return l > s
-
-        def lt(s, l):
-            l_num, s_num = str2float(l), str2float(s)
-            if type(l_num) == type(s_num):
-                return l_num < s_num
-            else:
-                return l < s
-
-        def gt_or_equal(s, l):
-            l_num, s_num = str2float(l), str2float(s)
-            if type(l_num) == type(s_num):
-                return l_num >= s_num
-            else:
-                return l >= s
-
-        def lt_or_equal(s, l):
-            l_num, s_num = str2float(l), str2float(s)
-            if type(l_num) == type(s_num):
-                return l_num <= s_num
-            else:
-                return l <= s
-
-        def between(s, l):
-            if len(s.split(" AND ")) != 2:
-                return None
-            s1, s2 = s.split(" AND ")
-            s1_num, s2_num = str2float(s1), str2float(s2)
-            if type(s1_num) != type(s2_num):
-                return None
-            l_num = str2float(l)
-            if type(s1_num) == type(l_num):
-                return l_num >= s1_num and l_num <= s2_num
-            else:
-                return l >= s1 and l <= s2
-
-
-        #if self.comboBox.currentIndex() <= 4 and len(self.lineEdit.text()) < 3:
-        if not self.lineEdit.text():
-            self.view.setRowCount(len(self.data))
-            #self.view.setColumnCount(len(self.data[0]))
-
-            for r in range(len(self.data)):
-                for c in range(len(self.data[0])):
-                    self.view.setItem(r, c, self.set_item(r, c))
+        self.filter_timer.stop()
 
+        if not self.lineEdit.text():
+            self.proxy_model.set_mask(None)
         else:
+            text, number = self.model.columns(self.comboBox.currentIndex())
+            self.proxy_model.set_mask(filter_mask(text, number, self.cbLogic.currentText(), self.lineEdit.text().upper()))
 
-            if self.cbLogic.currentText() == "contains":
-                logic = in_
-            if self.cbLogic.currentText() == "does not contain":
-                logic = not_in
-            if self.cbLogic.currentText() == "=":
-                logic = equal
-            if self.cbLogic.currentText() == "!=":
-                logic = not_equal
-            if self.cbLogic.currentText() == ">":
-                logic = gt
-            if self.cbLogic.currentText() == "<":
-                logic = lt
-            if self.cbLogic.currentText() == ">=":
-                logic = gt_or_equal
-            if self.cbLogic.currentText() == "<=":
-                logic = lt_or_equal
-            if "between" in self.cbLogic.currentText():
-                logic = between
-
-            self.view.setRowCount(0)
-            search = self.lineEdit.text().upper()
-            try:
-                for r, row in enumerate(self.data):
-                    if logic(search, row[self.comboBox.currentIndex()].upper()):
-                        self.view.setRowCount(self.view.rowCount() + 1)
-                        for c, _ in enumerate(row):
-                            self.view.setItem(self.view.rowCount() - 1, c, self.set_item(r, c))
-            except:
-                pass
-        self.label.setText('{} observation{}'.format(self.view.rowCount(), "s" * (self.view.rowCount() > 1)))
-
+        self.label.setText("{} observation{}".format(self.proxy_model.rowCount(), "s" * (self.proxy_model.rowCount() > 1)))
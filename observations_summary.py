@@ -0,0 +1,171 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+
+Summary of observations for the observations lists
+
+The summary of the events of an observation (observed subjects and behaviors, number of events, duration)
+is cached by observation id. The cached summary is recomputed when the events list of the observation
+was replaced, when its length or its first or last event changed, or after invalidate (events modified in place).
+"""
+
+import os
+
+from config import *
+from utilities import sorted_keys
+
+# observation id: (events list, number of events, first event, last event, summary of events)
+_summaries = {}
+
+
+def _events_summary(events):
+    """
+    summary of events in one pass
+
+    Args:
+        events (list): events of observation
+
+    Returns:
+        dict: observed subjects and behaviors (sorted lists), number of events and duration (time span of events)
+    """
+
+    subjects, behaviors = set(), set()
+    for event in events:
+        subjects.add(event[EVENT_SUBJECT_FIELD_IDX])
+        behaviors.add(event[EVENT_BEHAVIOR_FIELD_IDX])
+
+    times = [event[EVENT_TIME_FIELD_IDX] for event in events]
+
+    return {"subjects": sorted(subjects),
+            "behaviors": sorted(behaviors),
+            "events number": len(events),
+            "duration": max(times) - min(times) if times else 0}
+
+
+def _fingerprint(events):
+    return (len(events), list(events[0]) if events else None, list(events[-1]) if events else None)
+
+
+def media_list(observation):
+    """
+    media files of observation ("#player: media file")
+
+    Args:
+        observation (dict): observation
+
+    Returns:
+        list: media files
+    """
+
+    media = []
+    if observation[TYPE] in [MEDIA] and observation.get(FILE):
+        for player in sorted(observation[FILE].keys()):
+            for media_file in observation[FILE][player]:
+                media.append("#{0}: {1}".format(player, media_file))
+    return media
+
+
+def summary(pj, obs_id):
+    """
+    summary of observation
+
+    Args:
+        pj (dict): BORIS project
+        obs_id (str): observation id
+
+    Returns:
+        dict: summary of events (see _events_summary) and media files (see media_list)
+    """
+
+    observation = pj[OBSERVATIONS][obs_id]
+    events = observation[EVENTS]
+
+    cached = _summaries.get(obs_id)
+    if cached is None or cached[0] is not events or cached[1:4] != _fingerprint(events):
+        cached = (events,) + _fingerprint(events) + (_events_summary(events),)
+        _summaries[obs_id] = cached
+
+    return dict(cached[4], media=media_list(observation))
+
+
+def invalidate(obs_id=None):
+    """
+    discard the cached summary of an observation (events modified in place)
+
+    Args:
+        obs_id (str): observation id (None for all observations)
+    """
+
+    if obs_id is None:
+        _summaries.clear()
+    else:
+        _summaries.pop(obs_id, None)
+
+
+def observations_table(pj):
+    """
+    rows of observations list (id, date, description, subjects, media and independent variables)
+    sorted by observation id
+
+    Args:
+        pj (dict): BORIS project
+
+    Returns:
+        list: header
+        list: type of columns (TEXT, TIMESTAMP for date or type of independent variable)
+        list: rows (list of str)
+        dict: possible values of columns of independent variables with SET_OF_VALUES type
+    """
+
+    header = ["id", "date", "description", "subjects", "media"]
+    column_type = [TEXT, TIMESTAMP, TEXT, TEXT, TEXT]
+
+    indep_var_labels, set_values = [], {}
+    if INDEPENDENT_VARIABLES in pj:
+        for idx in sorted_keys(pj[INDEPENDENT_VARIABLES]):
+            variable = pj[INDEPENDENT_VARIABLES][idx]
+            if variable["type"] == SET_OF_VALUES:
+                set_values[len(column_type)] = variable.get("possible values", "").split(",")
+            indep_var_labels.append(variable["label"])
+            column_type.append(variable["type"])
+
+    # remove summaries of deleted observations
+    for obs_id in [x for x in _summaries if x not in pj[OBSERVATIONS]]:
+        del _summaries[obs_id]
+
+    rows = []
+    for obs_id in sorted(pj[OBSERVATIONS]):
+        observation = pj[OBSERVATIONS][obs_id]
+        obs_summary = summary(pj, obs_id)
+
+        # No focal subject is not listed
+        subjects = ", ".join([x for x in obs_summary["subjects"] if x])
+
+        if observation[TYPE] in [LIVE]:
+            media = LIVE
+        else:
+            media = os.linesep.join(obs_summary["media"])
+
+        indep_var = [observation.get(INDEPENDENT_VARIABLES, {}).get(label, "") for label in indep_var_labels]
+
+        rows.append([obs_id, observation["date"].replace("T", " "), observation["description"], subjects, media] + indep_var)
+
+    return header + indep_var_labels, column_type, rows, set_values
@@ -0,0 +1,200 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+Delta synchronization of observations between BORIS and the mobile app
+
+The version of an observation is the hash of its JSON.
+A client keeps the observations as received (base observations) and sends for each modified observation:
+    a new observation: {"observation": observation}
+    new events only: {"version": version of base observation, "events": new events}
+    other changes (removed events, description...): {"version": version of base observation, "observation": observation}
+
+The new events are merged automatically if they are disjoint from the events of the observation
+(an event is identified by time, subject and behavior). An identical event is not added twice.
+A modified observation replaces the observation if the observation was not changed since the base version.
+"""
+
+import hashlib
+import json
+
+from config import *
+import utilities
+
+# status of synchronization of an observation
+ADDED = "added"
+MERGED = "merged"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+CONFLICT = "conflict"
+
+# precision of event time for identifying events
+EVENT_TIME_DECIMALS = 3
+
+
+def observation_version(observation):
+    """
+    version of observation (MD5 hash of JSON with sorted keys)
+
+    Args:
+        observation (dict): observation
+
+    Returns:
+        str: version
+    """
+    return hashlib.md5(json.dumps(observation, sort_keys=True, separators=(",", ":"),
+                                  default=utilities.decimal_default).encode("utf-8")).hexdigest()
+
+
+def _event_content(event):
+    """
+    event with normalized time (float rounded to EVENT_TIME_DECIMALS)
+    """
+    return (round(float(event[EVENT_TIME_FIELD_IDX]), EVENT_TIME_DECIMALS),) + tuple(event[EVENT_TIME_FIELD_IDX + 1:])
+
+
+def event_key(event):
+    """
+    identifier of event: time, subject and behavior
+    """
+    return _event_content(event)[:EVENT_BEHAVIOR_FIELD_IDX + 1]
+
+
+def new_events(base_observation, observation):
+    """
+    events of observation not in base observation
+
+    Args:
+        base_observation (dict): observation (base version)
+        observation (dict): modified observation
+
+    Returns:
+        list: new events (None if events of base observation were removed or modified)
+    """
+
+    base_contents = set([_event_content(event) for event in base_observation[EVENTS]])
+    if not base_contents <= set([_event_content(event) for event in observation[EVENTS]]):
+        return None
+
+    return [event for event in observation[EVENTS] if _event_content(event) not in base_contents]
+
+
+def merge_events(events, added_events):
+    """
+    merge new events with events
+
+    Args:
+        events (list): events of observation
+        added_events (list): new events
+
+    Returns:
+        list: merged events sorted by time (None if conflict: an event with same time, subject and behavior
+              but different modifiers or comment)
+        int: number of added events
+    """
+
+    contents = {event_key(event): _event_content(event) for event in events}
+    merged = list(events)
+    for event in added_events:
+        key = event_key(event)
+        if key in contents:
+            if contents[key] != _event_content(event):
+                return None, 0
+            continue
+        contents[key] = _event_content(event)
+        merged.append(event)
+
+    merged.sort(key=lambda event: event[EVENT_TIME_FIELD_IDX])
+
+    return merged, len(merged) - len(events)
+
+
+def sync_changes(base_observations, observations):
+    """
+    changes of observations since the base observations (client side)
+
+    Args:
+        base_observations (dict): observations as received from server
+        observations (dict): current observations
+
+    Returns:
+        dict: changes of modified observations (see module documentation)
+    """
+
+    changes = {}
+    for obs_id in observations:
+        if obs_id not in base_observations:
+            changes[obs_id] = {"observation": observations[obs_id]}
+            continue
+
+        version = observation_version(base_observations[obs_id])
+        if observation_version(observations[obs_id]) == version:
+            continue
+
+        base = dict(base_observations[obs_id], **{EVENTS: []})
+        current = dict(observations[obs_id], **{EVENTS: []})
+        events = new_events(base_observations[obs_id], observations[obs_id])
+        if events is not None and observation_version(base) == observation_version(current):
+            changes[obs_id] = {"version": version, "events": events}
+        else:
+            changes[obs_id] = {"version": version, "observation": observations[obs_id]}
+
+    return changes
+
+
+def apply_change(observations, obs_id, change, version=None):
+    """
+    apply the change of an observation (server side). observations is updated.
+
+    Args:
+        observations (dict): observations
+        obs_id (str): observation id
+        change (dict): change of observation (see sync_changes)
+        version (str): current version of observation (computed if None)
+
+    Returns:
+        str: status (ADDED, MERGED, UPDATED, UNCHANGED or CONFLICT)
+        int: number of added events
+    """
+
+    if obs_id not in observations:
+        if "observation" not in change:
+            return CONFLICT, 0
+        observations[obs_id] = change["observation"]
+        return ADDED, len(change["observation"].get(EVENTS, []))
+
+    if "events" in change:
+        merged, added = merge_events(observations[obs_id][EVENTS], change["events"])
+        if merged is None:
+            return CONFLICT, 0
+        if not added:
+            return UNCHANGED, 0
+        observations[obs_id] = dict(observations[obs_id], **{EVENTS: merged})
+        return MERGED, added
+
+    if version is None:
+        version = observation_version(observations[obs_id])
+    if observation_version(change["observation"]) == version:
+        return UNCHANGED, 0
+    if change.get("version") != version:
+        return CONFLICT, 0
+
+    observations[obs_id] = change["observation"]
+    return UPDATED, 0
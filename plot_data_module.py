@@ -31,326 +31,106 @@ from PyQt5.QtWidgets import *
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 import sys
+import bisect
 import numpy as np
 import time
 import logging
-from utilities import check_txt_file, txt2np_array
+import external_data
 
 
 class MyMplCanvas(FigureCanvas):
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, n_axes=1):
         self.fig = Figure()
-        self.axes = self.fig.add_subplot(1, 1, 1)
+        # axes of tracks share the time axis
+        self.axes_list = [self.fig.add_subplot(n_axes, 1, 1)]
+        for idx in range(1, n_axes):
+            self.axes_list.append(self.fig.add_subplot(n_axes, 1, idx + 1, sharex=self.axes_list[0]))
+        self.axes = self.axes_list[0]
         FigureCanvas.__init__(self, self.fig)
         self.setParent(parent)
         FigureCanvas.setSizePolicy(self, QSizePolicy.Expanding, QSizePolicy.Expanding)
         FigureCanvas.updateGeometry(self)
 
 
-class Plot_data(QWidget):
-    send_fig = pyqtSignal(float)
-    
-    # send keypress event to mainwindow
-    sendEvent = pyqtSignal(QEvent)
-
-    def __init__(self, file_name, interval, time_offset, plot_style, plot_title, y_label, columns_to_plot,
-                       substract_first_value, converters, column_converter, log_level="",):
-        super().__init__()
-
-        if log_level:
-            logging.basicConfig(level=log_level)
-
-        self.installEventFilter(self)
-        
-        self.setWindowTitle("External data: " + plot_title)
-
-        d = {}
-        # convert dict keys in int:
-        for k in column_converter:
-            d[int(k)] = column_converter[k]
-        column_converter = dict(d)
-        
-        self.myplot = MyMplCanvas(self)
+class Track():
+    """
+    external data (time, value) loaded from a file and displayed in a plot
+    """
 
-        self.button_plus = QPushButton("+", self)
-        self.button_plus.clicked.connect(lambda: self.zoom(-1))
-        
-        self.button_minus = QPushButton("-", self)
-        self.button_minus.clicked.connect(lambda: self.zoom(1))
+    def __init__(self, loaded, interval, time_offset, plot_style, plot_title, y_label):
+        """
+        Args:
+            loaded (dict): data and parameters returned by external_data.load_data_file
+            interval (int): time interval displayed (in seconds)
+            time_offset (float): time offset between media and data (in seconds)
+            plot_style (str): matplotlib style
+            plot_title (str): title of plot
+            y_label (str): label of variable
+        """
 
-        self.layout = QVBoxLayout()
-        
-        self.hlayout1 = QHBoxLayout()
-        self.hlayout1.addWidget(QLabel("Zoom"))
-        self.hlayout1.addWidget(self.button_plus)
-        self.hlayout1.addWidget(self.button_minus)
-        self.hlayout1.addItem( QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        self.data = loaded["data"]
+        self.min_time_step = loaded["min_time_step"]
+        self.min_time_value, self.max_time_value = loaded["min_time"], loaded["max_time"]
+        self.min_value, self.max_value = loaded["min_value"], loaded["max_value"]
+        self.max_frequency = 1 / self.min_time_step
 
-        self.hlayout2 = QHBoxLayout()
-        self.hlayout2.addWidget(QLabel("Value"))
-        self.lb_value = QLabel("")
-        self.hlayout2.addWidget(self.lb_value)
-        self.hlayout2.addItem( QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
-        
-        self.layout.addLayout(self.hlayout1)
-        self.layout.addLayout(self.hlayout2)
-        self.layout.addWidget(self.myplot)
-        
-        self.setLayout(self.layout)
+        # interval must be even
+        interval += 1 if interval % 2 else 0
+        self.interval = interval
 
+        self.time_offset = time_offset
         self.plot_style = plot_style
         self.plot_title = plot_title
-        self.time_offset = time_offset
         self.y_label = y_label
-        self.error_msg = ""
-
-        result, error_msg, data = txt2np_array(file_name,
-                                               columns_to_plot,
-                                               substract_first_value,
-                                               converters=converters,
-                                               column_converter=column_converter,
-                                               ) # txt2np_array defined in utilities.py
-
-        if not result:
-            self.error_msg = error_msg
-            return
-
-        logging.debug("data[50]: {}".format(data[:50]))
-        logging.debug("shape: {}".format(data.shape))
-
-        if data.shape == (0,):
-            self.error_msg = "Empty input file"
-            return
-
-        # sort data by time ascending
-        data = data[data[:,0].argsort()]
-        
-        # unique
-        u, idx = np.unique(data[:,0], return_index=True)
-        data = data[idx]
-
-        # time
-        min_time_value, max_time_value = min(data[:,0]), max(data[:,0])
-
-        # variable
-        min_var_value, max_var_value = min(data[:,1]), max(data[:,1])
-
-        # check if time is linear
-        diff = set(np.round(np.diff(data, axis=0)[:,0], 4))
-        if min(diff) == 0:
-            self.error_msg = "more values for same time"
-            return
-
-        logging.debug("diff: {}".format(diff))
-        min_time_step = min(diff)
-        logging.debug("min_time_step: {}".format(min_time_step))
-
-
-        # check if sampling rate is not constant
-        if len(diff) != 1:
-            logging.debug("len diff != 1")
-            min_time_step = min(diff)
-            logging.debug("min_time_step: {}".format(min_time_step))
-
-            # increase value for low sampling rate (> 1 s)
-            if min_time_step > 1:
-                min_time_step = 1
-            
-            '''
-            x2 = np.arange(min_time_value, max_time_value + min_time_step, min_time_step)
-            y2 = np.interp(x2, data[:,0], data[:,1])
-            data = np.array((x2, y2)).T
-            del x2, y2
-            '''
-
-            x2 = np.arange(min_time_value, max_time_value + min_time_step, min_time_step)
-            data = np.array((x2, np.interp(x2, data[:,0], data[:,1]))).T
-            del x2
-
-            logging.debug("data[:,0]: {}".format(data[:,0]))
-
-
-            # time
-            min_time_value, max_time_value = min(data[:,0]), max(data[:,0])
-            # variable
-            min_var_value, max_var_value = min(data[:,1]), max(data[:,1])
-
-            diff = set(np.round(np.diff(data, axis=0)[:,0], 4))
-            min_time_step = min(diff)
-
-
-        # subsampling
-        if min_time_step < 0.04:
-            data = data[0::int(round(0.04 / min_time_step, 2))]
-            min_time_step = 0.04
-        
-
-        logging.debug("new data after subsampling: {}".format(data[:50]))
-
-        min_value, max_value = min(data[:, 1]), max(data[:, 1])
-
-        max_frequency = 1 / min_time_step
 
-        self.time_interval = interval * max_frequency
 
-        # plotter and thread are none at the beginning
-        self.plotter = Plotter()
-        self.plotter.data = data
-        self.plotter.max_frequency = max_frequency
-
-        #self.plotter.time_interval = time_interval
-        self.plotter.min_value = min_var_value
-        self.plotter.max_value = max_var_value
-
-        self.plotter.min_time_value = min_time_value
-        self.plotter.max_time_value = max_time_value
-
-        self.plotter.min_time_step = min_time_step
-        
-        # interval must be even
-        interval += 1 if interval % 2 else 0
-        self.plotter.interval = interval
-
-        self.thread = QThread()
-
-        # connect signals
-        self.send_fig.connect(self.plotter.replot)
-        self.plotter.return_fig.connect(self.plot)
-        #move to thread and start
-        self.plotter.moveToThread(self.thread)
-        self.thread.start()
-        
-        if min_time_step < .2:
-            self.time_out = 200
-        else:
-            self.time_out = min_time_step * 1000
-        
-
-
-
-
-    def eventFilter(self, receiver, event):
+    def discrete_time(self, current_time):
         """
-        send event (if keypress) to main window
+        current time rounded to the time step of data
         """
-        if(event.type() == QEvent.KeyPress):
-            self.sendEvent.emit(event)
-            return True
-        else:
-            return False
-
-
-    def zoom(self, z):
-        if z == -1 and self.plotter.interval <= 10:
-            return
-            
-        if z == 1 and self.plotter.interval > 3600:
-            return
-
-        new_interval = round(self.plotter.interval + z * self.plotter.interval/2)
-        new_interval += 1 if new_interval % 2 else 0
-
-        self.plotter.interval = new_interval
-
-
-    def timer_plot_data_out(self, time_):
-        #print(self.plot_title, time_)
-        self.update_plot(time_)
+        return round(round(current_time / self.min_time_step) * self.min_time_step, 2)
 
 
-    def update_plot(self, time_):
+    def window(self, current_time):
         """
-        update plot by signal
+        data of track in the visible window centered on current time
+
+        Args:
+            current_time (float): time (in seconds, time offset included)
+
+        Returns:
+            numpy array: x (time)
+            numpy array: y (values)
+            float: position of data
+            float: position of start of window
+            float: min value
+            float: max value
+            float: position of end of window
         """
-        self.send_fig.emit(time_ + self.time_offset)
-
-
-    def close_plot(self):
-        self.thread.quit()
-        self.thread.wait()
-        self.close()
-
-
-
-    # Slot receives data and plots it
-    def plot(self, x, y, position_data, position_start, min_value, max_value, position_end):
-
-        logging.debug("len x (plot): {}".format(len(x)))
-        logging.debug("len y (plot): {}".format(len(y)))
-
-        # print current value
-        if x[0] == 0:
-            self.lb_value.setText(str(round(y[position_data], 3)))
-        else:
-            self.lb_value.setText(str(round(y[len(y) // 2], 3)))
-
-        try:
-            self.myplot.axes.clear()
-            
-            self.myplot.axes.set_title(self.plot_title)
-            
-            self.myplot.axes.set_xlim(position_start , position_end)
-    
-            self.myplot.axes.set_ylabel(self.y_label, rotation=90, labelpad=10)
-            self.myplot.axes.set_ylim((min_value, max_value))
-    
-            self.myplot.axes.plot(x, y, self.plot_style)
-            self.myplot.axes.axvline(x=position_data, color="red", linestyle='-')
-    
-            self.myplot.draw()
-        except:
-            logging.debug("error")
-            pass # only for protection agains crash
-
-
-class Plotter(QObject):
-    return_fig = pyqtSignal(np.ndarray, # x array
-                            np.ndarray, #y array
-                            float, # position_data
-                            float, #position start
-                            float, #min value
-                            float, #max value
-                            float # position end
-                            )
 
-    @pyqtSlot(float)
-    def replot(self, current_time): # time_ in s
-
-        logging.debug("============================================")
-        
-        '''
-        print("============================================")
-        print("current time", current_time)
-        print("self.min_time_value <= current_time <= self.max_time_value", self.min_time_value <= current_time <= self.max_time_value)
-        '''
+        # data not available for current time
+        d = np.array([np.nan] * int(self.interval / self.min_time_step)).T
 
         logging.debug("current_time: {}".format(current_time))
 
-        current_discrete_time = round(round( current_time / self.min_time_step ) * self.min_time_step, 2)
+        current_discrete_time = self.discrete_time(current_time)
         logging.debug("current_discrete_time: {}".format(current_discrete_time))
         logging.debug("self.interval: {}".format(self.interval))
 
 
         freq_interval = int(round(self.interval / self.min_time_step))
-        '''
-        print("freq interval", freq_interval)
-        '''
 
         if self.min_time_value <= current_discrete_time <= self.max_time_value:
             
                 logging.debug("self.min_time_value <= current_discrete_time <= self.max_time_value")
 
-                idx = np.where(self.data[:,0] == current_discrete_time)[0]
-                '''
-                print("idx 1", idx)
-                print(self.data[:20])
-                '''
-                if not len(idx):
-                    idx = np.where(abs(self.data[:,0] - current_discrete_time) <= 0.02)[0]
-                    '''
-                    print("idx 2", idx)
-                    '''
+                # data are sorted by time: binary search instead of scanning the whole (memory-mapped) array
+                times = self.data[:, 0]
+                idx = bisect.bisect_left(times, current_discrete_time)
+                if not (idx < len(times) and times[idx] == current_discrete_time):
+                    idx = bisect.bisect_left(times, current_discrete_time - 0.02)
+                idx = [idx] if idx < len(times) and abs(times[idx] - current_discrete_time) <= 0.02 else []
 
                 if len(idx):
 
@@ -361,9 +141,6 @@ class Plotter(QObject):
                     #print(current_discrete_time, position_data, self.data[position_data:position_data+1][:,1])
 
                     position_start = int(position_data - freq_interval // 2)
-                    '''
-                    print("position_start", position_start)
-                    '''
 
                     flag_i, flag_j  = False, False
 
@@ -376,15 +153,10 @@ class Plotter(QObject):
                         position_start =0
 
                     position_end = int(position_data + freq_interval // 2)
-                    '''print("position_end", position_end)'''
         
                     if position_end >= len(self.data):
                         j = np.array([np.nan] * abs(position_end - len(self.data))).T
                         flag_j = True
-                        
-                        '''
-                        print("len j", len(j))
-                        '''
         
                         position_end = len(self.data)
         
@@ -395,10 +167,6 @@ class Plotter(QObject):
                 
                     if flag_j:
                         d = np.append(d, j, axis=0)
-                    
-                    '''
-                    print("len d", len(d))
-                    '''
                 else:
                     # not known problem
                     #return nan data
@@ -453,14 +221,7 @@ class Plotter(QObject):
             dim_header = int(round(self.interval / self.min_time_step / 2 + x))
             header = np.array([np.nan] * dim_header ).T
 
-            '''
-            print("len header", len(header))
-            '''
-
             b = int(round(self.interval / self.min_time_step / 2 - x))
-            '''
-            print("b", b)
-            '''
 
             if b >= 0:
                 d = np.append(header, self.data[0:b][:,1],  axis=0)
@@ -481,14 +242,258 @@ class Plotter(QObject):
 
         logging.debug("len x 1: {}".format(len(x)))
 
-        self.return_fig.emit(x, y,
-                             current_discrete_time, #position_data
-                             current_discrete_time - self.interval//2, #position_start
-                             self.min_value,
-                             self.max_value,
-                             current_discrete_time + self.interval//2 #position_end,
-                             )
+        return (x, y,
+                current_discrete_time, #position_data
+                current_discrete_time - self.interval//2, #position_start
+                self.min_value,
+                self.max_value,
+                current_discrete_time + self.interval//2 #position_end,
+                )
+
+
+
+class Plotter(QObject):
+    """
+    compute the visible windows of all tracks (in a worker thread)
+    a track is skipped if its visible window did not change since the last computation
+    """
+
+    # list of (track index, x, y, position_data, position_start, min_value, max_value, position_end)
+    return_fig = pyqtSignal(list)
+
+    def __init__(self, tracks):
+        super().__init__()
+        self.tracks = tracks
+        self.last_windows = {}
+
+
+    @pyqtSlot(float)
+    def replot(self, current_time): # time_ in s
+
+        logging.debug("current_time: {}".format(current_time))
+
+        windows = []
+        for idx, track in enumerate(self.tracks):
+            track_time = current_time + track.time_offset
+            window_key = (track.discrete_time(track_time), track.interval)
+            if self.last_windows.get(idx) == window_key:
+                continue
+            self.last_windows[idx] = window_key
+            windows.append((idx,) + track.window(track_time))
+
+        if windows:
+            self.return_fig.emit(windows)
+
+
+class Plot_data_multi(QWidget):
+    """
+    plot of one or more external data files sharing the time axis (media time)
+    all tracks are updated by one worker thread and redrawn at once
+    """
+
+    send_fig = pyqtSignal(float)
+
+    # send keypress event to mainwindow
+    sendEvent = pyqtSignal(QEvent)
+
+    def __init__(self, plot_data, converters, log_level=""):
+        """
+        Args:
+            plot_data (list): list of dict with parameters of external data files (see DATA_PLOT_FIELDS in config)
+            converters (dict): dictionary containing converters
+            log_level: logging level
+        """
+        super().__init__()
+
+        if log_level:
+            logging.basicConfig(level=log_level)
+
+        self.installEventFilter(self)
+
+        self.setWindowTitle("External data: " + ", ".join([x["title"] for x in plot_data]))
+
+        self.error_msg = ""
+        self.tracks = []
+
+        for parameters in plot_data:
+
+            d = {}
+            # convert dict keys in int:
+            for k in parameters["converters"]:
+                d[int(k)] = parameters["converters"][k]
+            column_converter = dict(d)
+
+            # data are loaded by blocks and stored in a memory-mapped temporary file (see external_data.py)
+            result, error_msg, loaded = external_data.load_data_file(parameters["file_path"],
+                                                                     parameters["columns"],
+                                                                     parameters["substract_first_value"],
+                                                                     converters=converters,
+                                                                     column_converter=column_converter)
+
+            if not result:
+                self.error_msg = "{}: {}".format(parameters["title"], error_msg) if len(plot_data) > 1 else error_msg
+                return
+
+            logging.debug("shape: {}".format(loaded["data"].shape))
+
+            self.tracks.append(Track(loaded,
+                                     int(parameters["time_interval"]),
+                                     int(parameters["time_offset"]),
+                                     parameters["color"],
+                                     parameters["title"],
+                                     parameters["variable_name"]))
+
+        # the time axis is shared: all tracks display the same interval
+        interval = max([track.interval for track in self.tracks])
+        for track in self.tracks:
+            track.interval = interval
+
+        self.myplot = MyMplCanvas(self, n_axes=len(self.tracks))
+
+        self.button_plus = QPushButton("+", self)
+        self.button_plus.clicked.connect(lambda: self.zoom(-1))
+
+        self.button_minus = QPushButton("-", self)
+        self.button_minus.clicked.connect(lambda: self.zoom(1))
+
+        self.layout = QVBoxLayout()
+
+        self.hlayout1 = QHBoxLayout()
+        self.hlayout1.addWidget(QLabel("Zoom"))
+        self.hlayout1.addWidget(self.button_plus)
+        self.hlayout1.addWidget(self.button_minus)
+        self.hlayout1.addItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+
+        self.hlayout2 = QHBoxLayout()
+        self.hlayout2.addWidget(QLabel("Value"))
+        self.lb_values = []
+        for track in self.tracks:
+            self.lb_values.append(QLabel(""))
+            self.hlayout2.addWidget(self.lb_values[-1])
+        self.lb_value = self.lb_values[0]
+        self.hlayout2.addItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+
+        self.layout.addLayout(self.hlayout1)
+        self.layout.addLayout(self.hlayout2)
+        self.layout.addWidget(self.myplot)
+
+        self.setLayout(self.layout)
+
+        # lines are created once and their data are updated
+        self.lines, self.cursors = [], []
+        for track, axes in zip(self.tracks, self.myplot.axes_list):
+            axes.set_title(track.plot_title)
+            axes.set_ylabel(track.y_label, rotation=90, labelpad=10)
+            axes.set_ylim((track.min_value, track.max_value))
+            self.lines.append(axes.plot([], [], track.plot_style)[0])
+            self.cursors.append(axes.axvline(x=0, color="red", linestyle='-'))
+
+        self.plotter = Plotter(self.tracks)
+
+        self.thread = QThread()
+
+        # connect signals
+        self.send_fig.connect(self.plotter.replot)
+        self.plotter.return_fig.connect(self.plot)
+        #move to thread and start
+        self.plotter.moveToThread(self.thread)
+        self.thread.start()
+
+        min_time_step = min([track.min_time_step for track in self.tracks])
+        if min_time_step < .2:
+            self.time_out = 200
+        else:
+            self.time_out = min_time_step * 1000
+
+
+    def eventFilter(self, receiver, event):
+        """
+        send event (if keypress) to main window
+        """
+        if(event.type() == QEvent.KeyPress):
+            self.sendEvent.emit(event)
+            return True
+        else:
+            return False
+
+
+    def zoom(self, z):
+        interval = self.tracks[0].interval
+        if z == -1 and interval <= 10:
+            return
+
+        if z == 1 and interval > 3600:
+            return
+
+        new_interval = round(interval + z * interval / 2)
+        new_interval += 1 if new_interval % 2 else 0
+
+        for track in self.tracks:
+            track.interval = new_interval
+
+
+    def timer_plot_data_out(self, time_):
+        self.update_plot(time_)
+
+
+    def update_plot(self, time_):
+        """
+        update plot by signal
+        """
+        self.send_fig.emit(time_)
+
+
+    def close_plot(self):
+        self.thread.quit()
+        self.thread.wait()
+        self.close()
+
+
+    # Slot receives data of modified tracks and plots them
+    def plot(self, windows):
+
+        try:
+            for idx, x, y, position_data, position_start, min_value, max_value, position_end in windows:
+
+                logging.debug("track {} len x (plot): {} len y (plot): {}".format(idx, len(x), len(y)))
+
+                # print current value
+                self.lb_values[idx].setText("{}{}".format(self.tracks[idx].plot_title + ": " if len(self.tracks) > 1 else "",
+                                                          round(y[len(y) // 2], 3)))
+
+                # media time on the shared axis
+                offset = self.tracks[idx].time_offset
+                n = min(len(x), len(y))
+                self.lines[idx].set_data(x[:n] - offset, y[:n])
+                self.cursors[idx].set_xdata([position_data - offset, position_data - offset])
+                if idx == 0:
+                    self.myplot.axes.set_xlim(position_start - offset, position_end - offset)
+
+            self.myplot.draw_idle()
+        except:
+            logging.debug("error")
+            pass # only for protection agains crash
+
+
+class Plot_data(Plot_data_multi):
+    """
+    plot of one external data file
+    """
+
+    def __init__(self, file_name, interval, time_offset, plot_style, plot_title, y_label, columns_to_plot,
+                       substract_first_value, converters, column_converter, log_level="",):
 
+        super().__init__([{"file_path": file_name,
+                           "time_interval": interval,
+                           "time_offset": time_offset,
+                           "color": plot_style,
+                           "title": plot_title,
+                           "variable_name": y_label,
+                           "columns": columns_to_plot,
+                           "substract_first_value": substract_first_value,
+                           "converters": column_converter}],
+                         converters,
+                         log_level=log_level)
 
 
 if __name__ == '__main__':
@@ -44,11 +44,10 @@ import os
 import wave
 import subprocess
 import multiprocessing
-try:
-    import numpy as np
-    import matplotlib
-except:
-    pass
+from lazy_modules import lazy_import
+
+np = lazy_import("numpy")
+matplotlib = lazy_import("matplotlib")
 
 
 class Spectrogram(QWidget):
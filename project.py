@@ -34,19 +34,18 @@ except:
 import logging
 import json
 import sys
-import tablib
 import copy
 import urllib.parse
-import urllib.request
-import urllib.error
 import pathlib
 
 
 from utilities import sorted_keys
+from lazy_modules import lazy_import
 from config import *
 import add_modifier
 import dialog
 import export_observation
+import external_data
 
 
 if QT_VERSION_STR[0] == "4":
@@ -54,6 +53,8 @@ if QT_VERSION_STR[0] == "4":
 else:
     from project_ui5 import Ui_dlgProject
 
+tablib = lazy_import("tablib", required=True)
+
 
 class ExclusionMatrix(QDialog):
 
@@ -1686,8 +1687,10 @@ class projectDialog(QDialog, Ui_dlgProject):
                      "A time value like 00:23:59 must be converted into seconds before to be plotted synchronously with your media.<br>"
                      "For this you can use BORIS native converters or write your own converter.<br>"
                      "A converter must be written using the <a href=\"www.python.org\">Python3</a> language.<br>"
-
-))
+                     "The value to convert is in the INPUT variable and the result must be assigned to the OUTPUT variable.<br>"
+                     "If the first line of code is <b>{}</b> the converter receives the whole column "
+                     "(numpy array of strings) in INPUT and must return an array of numbers in OUTPUT.<br>"
+                    ).format(external_data.VECTORIZED_CONVERTER_TAG))
 
         #msg.setInformativeText("This is additional information")
 
@@ -1738,12 +1741,7 @@ class projectDialog(QDialog, Ui_dlgProject):
             str: string containing Python function
         """
 
-        function = """def {}(INPUT):\n""".format(name)
-        function += """    INPUT = INPUT.decode("utf-8") if isinstance(INPUT, bytes) else INPUT\n"""
-        function += "\n".join(["    " + row for row in code.split("\n")])
-        function += """\n    return OUTPUT"""
-        
-        return function
+        return external_data.converter_source(name, code)
 
 
     def save_converter(self):
@@ -1765,10 +1763,8 @@ class projectDialog(QDialog, Ui_dlgProject):
             QMessageBox.critical(self, "BORIS", "The converter must have Python code")
             return
 
-        function = self.code_2_func(self.le_converter_name.text(), code)
-
         try:
-            exec(function)
+            external_data.compile_converter(self.le_converter_name.text(), code)
         except:
             QMessageBox.critical(self, "BORIS", "The code produces an error:<br><b>{}</b>".format(sys.exc_info()[1]))
             return
@@ -1868,6 +1864,7 @@ class projectDialog(QDialog, Ui_dlgProject):
         if mode == "repo":
 
             converters_repo_URL = "http://www.boris.unito.it/archive/converters.json"
+            import urllib.request
             try:
                 converters_from_repo = urllib.request.urlopen(converters_repo_URL).read().strip().decode("utf-8")
             except:
@@ -1920,10 +1917,8 @@ class projectDialog(QDialog, Ui_dlgProject):
                             else:
                                 continue
                         # test if code does not produce error
-                        function = self.code_2_func(converter_name, converters_from_file[converter]["code"])
-
                         try:
-                            exec(function)
+                            external_data.compile_converter(converter_name, converters_from_file[converter]["code"])
                         except:
                             QMessageBox.critical(self, "BORIS", "The code of {} converter produces an error:<br><b>{}</b>".format(converter_name,
                                                                                                                                   sys.exc_info()[1]))
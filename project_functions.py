@@ -27,9 +27,13 @@ import pathlib
 from shutil import copyfile
 from decimal import *
 import copy
+import hashlib
+import multiprocessing
+import pickle
 
 from config import *
 import db_functions
+import ethogram_index
 import utilities
 
 
@@ -558,69 +562,164 @@ def event_type(code, ethogram):
         str: STATE, POINT or None if code not found in ethogram
     """
 
-    for idx in ethogram:
-        if ethogram[idx][BEHAVIOR_CODE] == code:
-            return ethogram[idx][TYPE].upper()
-    return None
+    return ethogram_index.get_index(ethogram).event_type(code)
 
 
-def check_state_events_obs(obsId, ethogram, observation, time_format):
+def behaviors_types(ethogram):
     """
-    check state events
-    check if number is odd
-    
+    type of behaviors of ethogram (see event_type)
+
     Args:
-        obsId (str): id of observation to check
         ethogram (dict): ethogram of project
-        observation (dict): observation to be checked
-        time_firmat (str): time format
-        
+
     Returns:
-        set (bool, str): True/False, message
+        dict: type (upper case) by behavior code
     """
-    
-    # check if behaviors are defined as "state event"
-    event_types = {ethogram[idx]["type"] for idx in ethogram}
+    return dict(ethogram_index.get_index(ethogram).types)
 
-    if not event_types or event_types == {"Point event"}:
-        return (True, "No behavior is defined as `State event`")
 
-    out = ""
-    flagStateEvent = False
-    subjects = [event[EVENT_SUBJECT_FIELD_IDX] for event in observation[EVENTS]]
-    ethogram_behaviors = {ethogram[idx]["code"] for idx in ethogram}
+def state_events_pairing(args):
+    """
+    check the pairing of state events of an observation in one pass over events.
+    The state events are paired by subject, behavior and modifiers.
 
-    for subject in sorted(set(subjects)):
+    Args:
+        args (tuple): type of behaviors (see behaviors_types), events of observation
 
-        behaviors = [event[EVENT_BEHAVIOR_FIELD_IDX] for event in observation[EVENTS]
-                     if event[EVENT_SUBJECT_FIELD_IDX] == subject]
+    Returns:
+        dict: "unknown behaviors": sorted list of (subject, behavior) of behaviors not in ethogram
+              "unpaired": list of (subject, behavior, modifiers, time of start) of not paired state events
+                          sorted by subject and behavior
+    """
 
-        for behavior in sorted(set(behaviors)):
-            if behavior not in ethogram_behaviors:
-                return (False, "The behaviour <b>{}</b> is not defined in the ethogram.<br>".format(behavior))
-            else:
-                if STATE in event_type(behavior, ethogram).upper():
-                    flagStateEvent = True
-                    lst, memTime = [], {}
-                    for event in [event for event in observation[EVENTS]
-                                  if event[EVENT_BEHAVIOR_FIELD_IDX] == behavior and
-                                  event[EVENT_SUBJECT_FIELD_IDX] == subject]:
-
-                        behav_modif = [event[EVENT_BEHAVIOR_FIELD_IDX], event[EVENT_MODIFIER_FIELD_IDX]]
-
-                        if behav_modif in lst:
-                            lst.remove(behav_modif)
-                            del memTime[str(behav_modif)]
-                        else:
-                            lst.append(behav_modif)
-                            memTime[str(behav_modif)] = event[EVENT_TIME_FIELD_IDX]
-
-                    for event in lst:
-                        out += ("""The behavior <b>{behavior}</b> {modifier} is not PAIRED for subject"""
-                                """ "<b>{subject}</b>" at <b>{time}</b><br>""").format(
-                                      behavior=behavior,
-                                      modifier=("(modifier "+ event[1] + ") ") if event[1] else "",
-                                      subject=subject if subject else NO_FOCAL_SUBJECT,
-                                      time=memTime[str(event)] if time_format == S else utilities.seconds2time(memTime[str(event)]))
+    types, events = args
+
+    unknown = set()
+    # time of start of open state events by (subject, behavior, modifiers)
+    open_states = {}
+    for event in events:
+        subject, behavior = event[EVENT_SUBJECT_FIELD_IDX], event[EVENT_BEHAVIOR_FIELD_IDX]
+        if behavior not in types:
+            unknown.add((subject, behavior))
+            continue
+        if STATE not in types[behavior]:
+            continue
+        key = (subject, behavior, event[EVENT_MODIFIER_FIELD_IDX])
+        if key in open_states:
+            del open_states[key]
+        else:
+            open_states[key] = event[EVENT_TIME_FIELD_IDX]
+
+    return {"unknown behaviors": sorted(unknown),
+            "unpaired": sorted([key + (open_states[key],) for key in open_states], key=lambda x: (x[0], x[1]))}
+
+
+# results of state_events_pairing by hash of behaviors types and events
+_state_events_pairing_cache = {}
+STATE_EVENTS_PAIRING_CACHE_SIZE = 1000
+
+# minimum number of events for checking observations in parallel
+STATE_EVENTS_PARALLEL_MIN_EVENTS = 1000000
+
+
+def _pairing_key(types, events):
+    """
+    key of state_events_pairing cache
+    """
+    return hashlib.md5(pickle.dumps([types, events], protocol=4)).hexdigest()
+
+
+def state_events_check_message(pairing, time_format):
+    """
+    result and message of the check of state events
+
+    Args:
+        pairing (dict): result of state_events_pairing
+        time_format (str): time format
+
+    Returns:
+        bool: True if all state events are paired
+        str: message
+    """
+
+    if pairing["unknown behaviors"]:
+        return (False, "The behaviour <b>{}</b> is not defined in the ethogram.<br>".format(pairing["unknown behaviors"][0][1]))
+
+    out = ""
+    for subject, behavior, modifiers, time in pairing["unpaired"]:
+        out += ("""The behavior <b>{behavior}</b> {modifier} is not PAIRED for subject"""
+                """ "<b>{subject}</b>" at <b>{time}</b><br>""").format(
+                      behavior=behavior,
+                      modifier=("(modifier "+ modifiers + ") ") if modifiers else "",
+                      subject=subject if subject else NO_FOCAL_SUBJECT,
+                      time=time if time_format == S else utilities.seconds2time(time))
 
     return (False, out) if out else (True, "All state events are PAIRED")
+
+
+def check_state_events(pj, selected_observations, time_format, max_workers=1):
+    """
+    check state events of observations.
+    The results are cached by content of observation. The observations not in cache are checked in parallel
+    if max_workers is not 1 and if they contain more than STATE_EVENTS_PARALLEL_MIN_EVENTS events
+    (the events are copied to the processes).
+    For windows exe (created with pyinstaller) multiprocessing can not be used.
+
+    Args:
+        pj (dict): project
+        selected_observations (list): list of observations id
+        time_format (str): time format
+        max_workers (int): number of processes (0 for number of CPU, 1 for no parallel check)
+
+    Returns:
+        dict: (bool, message) by observation id (see check_state_events_obs)
+    """
+
+    # check if behaviors are defined as "state event"
+    event_types = {pj[ETHOGRAM][idx][TYPE] for idx in pj[ETHOGRAM]}
+    if not event_types or event_types == {"Point event"}:
+        return {obs_id: (True, "No behavior is defined as `State event`") for obs_id in selected_observations}
+
+    types = behaviors_types(pj[ETHOGRAM])
+    keys = {obs_id: _pairing_key(types, pj[OBSERVATIONS][obs_id][EVENTS]) for obs_id in selected_observations}
+    pairings = {keys[obs_id]: _state_events_pairing_cache[keys[obs_id]] for obs_id in selected_observations
+                if keys[obs_id] in _state_events_pairing_cache}
+
+    to_check = [obs_id for obs_id in selected_observations if keys[obs_id] not in pairings]
+    tasks = [(types, pj[OBSERVATIONS][obs_id][EVENTS]) for obs_id in to_check]
+
+    if (len(tasks) < 2 or max_workers == 1
+       or sum([len(task[1]) for task in tasks]) < STATE_EVENTS_PARALLEL_MIN_EVENTS
+       or (sys.platform.startswith("win") and getattr(sys, "frozen", False))):
+        new_pairings = [state_events_pairing(task) for task in tasks]
+    else:
+        if max_workers <= 0:
+            max_workers = multiprocessing.cpu_count()
+        with multiprocessing.Pool(min(max_workers, len(tasks))) as pool:
+            new_pairings = pool.map(state_events_pairing, tasks)
+
+    for obs_id, pairing in zip(to_check, new_pairings):
+        pairings[keys[obs_id]] = pairing
+        while len(_state_events_pairing_cache) >= STATE_EVENTS_PAIRING_CACHE_SIZE:
+            del _state_events_pairing_cache[next(iter(_state_events_pairing_cache))]
+        _state_events_pairing_cache[keys[obs_id]] = pairing
+
+    return {obs_id: state_events_check_message(pairings[keys[obs_id]], time_format) for obs_id in selected_observations}
+
+
+def check_state_events_obs(obsId, ethogram, observation, time_format):
+    """
+    check state events
+    check if number is odd
+
+    Args:
+        obsId (str): id of observation to check
+        ethogram (dict): ethogram of project
+        observation (dict): observation to be checked
+        time_format (str): time format
+
+    Returns:
+        set (bool, str): True/False, message
+    """
+
+    return check_state_events({ETHOGRAM: ethogram, OBSERVATIONS: {obsId: observation}}, [obsId], time_format)[obsId]
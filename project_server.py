@@ -0,0 +1,665 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+Project server for the BORIS mobile app (asyncio, concurrent clients)
+
+Framed protocol:
+    the client sends MAGIC and then frames. A frame is a header (flags: 1 byte, length of payload: 4 bytes,
+    network order) followed by the payload. The payload is gzip-compressed if flags contains FLAG_GZIP.
+    The connection is kept open for several requests:
+        "get": the server replies with a frame containing the project (JSON).
+               The project is compressed if the request frame has the FLAG_GZIP flag
+        "put": the client sends a frame with the observations (JSON). The server replies "OK"
+        "stop": the server replies "OK" and stops
+    Delta synchronization of observations (see observations_sync). The replies are JSON, compressed
+    if the request frame has the FLAG_GZIP flag:
+        "versions": the server replies with the versions of observations ({observation id: version})
+        "observations": the client sends a frame with a list of observation id.
+                        The server replies with these observations ({observation id: observation})
+        "sync": the client sends a frame with the changes of observations ({observation id: change}).
+                The server replies with {observation id: {"status": status, "version": new version}}
+
+Legacy protocol (first versions of the mobile app):
+    "get": the server sends the project and closes the connection
+    "put": the server replies "SEND" and closes the connection. The client opens a new connection
+           and sends the observations followed by LEGACY_TERMINATOR
+    "stop": the server stops
+
+Usage for throughput tests (local server and concurrent clients):
+    python3 project_server.py PROJECT_FILE [--clients 8] [--requests 4] [--no-gzip]
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import socket
+import struct
+import sys
+import threading
+import time
+
+import utilities
+import observations_sync
+
+MAGIC = b"BORIS"
+FRAME_HEADER = struct.Struct("!BI")
+FLAG_GZIP = 1
+MAX_FRAME_SIZE = 2 ** 32 - 1
+GZIP_LEVEL = 6
+
+GET, PUT, STOP = b"get", b"put", b"stop"
+VERSIONS, OBSERVATIONS, SYNC = b"versions", b"observations", b"sync"
+OK = b"OK"
+LEGACY_SEND = b"SEND"
+LEGACY_TERMINATOR = b"#####"
+
+# size of socket send/receive buffers
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024
+READ_SIZE = 256 * 1024
+
+# the server stops if no client is connected during this time (seconds)
+SERVER_TIMEOUT = 1800
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def frame(payload, compress=False):
+    """
+    frame of payload
+
+    Args:
+        payload (bytes): payload
+        compress (bool): True for gzip compression of payload
+
+    Returns:
+        bytes: header
+        bytes: payload (compressed if compress)
+    """
+
+    flags = 0
+    if compress:
+        payload = gzip.compress(payload, compresslevel=GZIP_LEVEL)
+        flags = FLAG_GZIP
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError("Payload too large ({} bytes)".format(len(payload)))
+
+    return FRAME_HEADER.pack(flags, len(payload)), payload
+
+
+def decode_payload(flags, payload):
+    """
+    payload of frame (decompressed if FLAG_GZIP)
+    """
+    return gzip.decompress(payload) if flags & FLAG_GZIP else payload
+
+
+class ProjectServer():
+    """
+    asyncio project server.
+    The events are sent to callback as dict (same keys than the signal of the project server thread of BORIS):
+        {"URL": "host:port"}: the server is listening
+        {"MESSAGE": text}: information
+        {"RECEIVED": JSON of observations, "SENDER": (host, port)}: observations received
+        {"SYNCED": {observation id: change}, "SENDER": (host, port)}: observations added, merged or updated
+            by a "sync" request. The change contains the status and the observation of the server
+            ("status", "observation" keys)
+    """
+
+    def __init__(self, project, observations=None, host=None, port=0, timeout=SERVER_TIMEOUT, callback=None):
+        """
+        Args:
+            project (bytes): JSON of project
+            observations (dict): observations for delta synchronization (modified by "sync" requests)
+            host (str): IP address (None for IP address of computer)
+            port (int): TCP port (0 for a free port)
+            timeout (int): the server stops if no client is connected during timeout (seconds)
+            callback (function): function called with events (dict)
+        """
+        self.project = project
+        self.observations = observations if observations is not None else {}
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.callback = callback if callback else (lambda event: None)
+
+        self._project_gzip = None
+        self._versions = {}
+        self._loop = None
+        self._stop_event = None
+        self._activity = None
+        self._clients = set()
+        self._legacy_put_hosts = set()
+        self.ready = threading.Event()
+
+
+    def run(self):
+        """
+        run the server until it is stopped (blocking)
+        """
+        asyncio.run(self.serve())
+
+
+    def stop(self):
+        """
+        stop the server (thread-safe)
+        """
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+
+    async def serve(self):
+        """
+        accept clients until the server is stopped or timeout
+        """
+
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._activity = asyncio.Event()
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # accepted sockets inherit the buffer sizes of the listening socket
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+        sock.bind((self.host if self.host else utilities.get_ip_address(), self.port))
+
+        server = await asyncio.start_server(self._handle_client, sock=sock, limit=READ_SIZE)
+        self.host, self.port = sock.getsockname()[:2]
+        self.callback({"URL": "{}:{}".format(self.host, self.port)})
+        self.ready.set()
+
+        message = "The server is now stopped"
+        async with server:
+            while not self._stop_event.is_set():
+                try:
+                    await asyncio.wait_for(self._wait_activity(), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    if not self._clients:
+                        logging.debug("Project server timeout")
+                        message = "Project server timeout"
+                        break
+            for writer in list(self._clients):
+                writer.close()
+
+        logging.debug("server stopped")
+        self.callback({"MESSAGE": message})
+
+
+    async def _wait_activity(self):
+        """
+        wait for a new client or for the stop of server
+        """
+        stop = asyncio.ensure_future(self._stop_event.wait())
+        activity = asyncio.ensure_future(self._activity.wait())
+        try:
+            await asyncio.wait([stop, activity], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop.cancel()
+            activity.cancel()
+        self._activity.clear()
+
+
+    async def _project_payload(self, compress):
+        """
+        project payload (compressed once in an executor)
+        """
+        if not compress:
+            return self.project
+        if self._project_gzip is None:
+            self._project_gzip = await self._loop.run_in_executor(None, gzip.compress, self.project, GZIP_LEVEL)
+        return self._project_gzip
+
+
+    async def _handle_client(self, reader, writer):
+        """
+        serve a client (framed or legacy protocol)
+        """
+
+        self._clients.add(writer)
+        self._activity.set()
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        address = writer.get_extra_info("peername")
+        logging.debug("Got connection from {}".format(address))
+        try:
+            data = await reader.read(READ_SIZE)
+            while data and len(data) < len(MAGIC) and MAGIC.startswith(data):
+                more = await reader.read(READ_SIZE)
+                if not more:
+                    break
+                data += more
+
+            if data.startswith(MAGIC):
+                await self._handle_framed(reader, writer, data[len(MAGIC):], address)
+            else:
+                await self._handle_legacy(reader, writer, data, address)
+
+        except (ProtocolError, asyncio.IncompleteReadError, ConnectionError, OSError, EOFError) as error:
+            logging.debug("project server: error with {}: {}".format(address, error))
+        finally:
+            writer.close()
+            self._clients.discard(writer)
+            self._activity.set()
+
+
+    async def _read_frame(self, reader, buffered):
+        """
+        read a frame
+
+        Args:
+            reader (asyncio.StreamReader): reader
+            buffered (bytearray): bytes already read (consumed by the frame)
+
+        Returns:
+            int: flags (None if the connection is closed)
+            bytes: payload
+        """
+
+        async def read_exactly(n):
+            chunk = bytes(buffered[:n])
+            del buffered[:n]
+            if len(chunk) < n:
+                chunk += await reader.readexactly(n - len(chunk))
+            return chunk
+
+        if not buffered and reader.at_eof():
+            return None, b""
+        try:
+            header = await read_exactly(FRAME_HEADER.size)
+        except asyncio.IncompleteReadError as error:
+            if not error.partial:
+                return None, b""
+            raise
+        flags, length = FRAME_HEADER.unpack(header)
+        return flags, await read_exactly(length)
+
+
+    async def _write_frame(self, writer, payload, flags=0):
+        """
+        write a frame (the payload is already compressed if flags contains FLAG_GZIP)
+        """
+        writer.write(FRAME_HEADER.pack(flags, len(payload)))
+        writer.write(payload)
+        await writer.drain()
+
+
+    async def _read_payload(self, reader, buffered):
+        """
+        read a frame with data (decompressed)
+        """
+        flags, payload = await self._read_frame(reader, buffered)
+        if flags is None:
+            raise ProtocolError("No data received")
+        if flags & FLAG_GZIP:
+            payload = await self._loop.run_in_executor(None, decode_payload, flags, payload)
+        return payload
+
+
+    async def _write_json(self, writer, obj, compress):
+        """
+        write a frame with JSON of obj
+        """
+        payload = json.dumps(obj, separators=(",", ":"), default=utilities.decimal_default).encode("utf-8")
+        if compress:
+            payload = await self._loop.run_in_executor(None, gzip.compress, payload, GZIP_LEVEL)
+        await self._write_frame(writer, payload, FLAG_GZIP if compress else 0)
+
+
+    def _version(self, obs_id):
+        """
+        version of observation (cached)
+        """
+        if obs_id not in self._versions:
+            self._versions[obs_id] = observations_sync.observation_version(self.observations[obs_id])
+        return self._versions[obs_id]
+
+
+    def _sync(self, changes, address):
+        """
+        apply the changes of observations sent by a client
+
+        Args:
+            changes (dict): changes of observations ({observation id: change})
+            address (tuple): address of client
+
+        Returns:
+            dict: status and new version by observation id
+        """
+
+        results, synced = {}, {}
+        for obs_id in changes:
+            status, added = observations_sync.apply_change(self.observations, obs_id, changes[obs_id],
+                                                           self._version(obs_id) if obs_id in self.observations else None)
+            if status in [observations_sync.ADDED, observations_sync.MERGED, observations_sync.UPDATED]:
+                self._versions.pop(obs_id, None)
+                synced[obs_id] = dict(changes[obs_id], status=status, observation=self.observations[obs_id])
+                self.callback({"MESSAGE": "Observation {} {} ({} new events) by {}".format(obs_id, status, added, address[0])})
+            results[obs_id] = {"status": status,
+                               "version": self._version(obs_id) if obs_id in self.observations else None}
+
+        if synced:
+            self.callback({"SYNCED": synced, "SENDER": address})
+
+        return results
+
+
+    async def _handle_framed(self, reader, writer, data, address):
+        """
+        serve the requests of a client using the framed protocol
+        """
+
+        buffered = bytearray(data)
+        while True:
+            flags, request = await self._read_frame(reader, buffered)
+            if flags is None:
+                return
+            logging.debug("request: {}".format(request))
+
+            if request == GET:
+                compress = bool(flags & FLAG_GZIP)
+                await self._write_frame(writer, await self._project_payload(compress), FLAG_GZIP if compress else 0)
+                logging.debug("Project sent")
+                self.callback({"MESSAGE": "Project sent to {}".format(address[0])})
+
+            elif request == PUT:
+                payload = await self._read_payload(reader, buffered)
+                await self._write_frame(writer, OK)
+                self.callback({"RECEIVED": payload.decode("utf-8"), "SENDER": address})
+
+            elif request == VERSIONS:
+                await self._write_json(writer, {obs_id: self._version(obs_id) for obs_id in self.observations},
+                                       bool(flags & FLAG_GZIP))
+
+            elif request == OBSERVATIONS:
+                obs_ids = json.loads((await self._read_payload(reader, buffered)).decode("utf-8"))
+                await self._write_json(writer, {obs_id: self.observations[obs_id] for obs_id in obs_ids
+                                                if obs_id in self.observations},
+                                       bool(flags & FLAG_GZIP))
+
+            elif request == SYNC:
+                changes = json.loads((await self._read_payload(reader, buffered)).decode("utf-8"))
+                await self._write_json(writer, self._sync(changes, address), bool(flags & FLAG_GZIP))
+
+            elif request == STOP:
+                await self._write_frame(writer, OK)
+                self._stop_event.set()
+                return
+
+            else:
+                raise ProtocolError("Unknown request: {}".format(request[:20]))
+
+
+    async def _handle_legacy(self, reader, writer, data, address):
+        """
+        serve a client using the legacy protocol
+        """
+
+        logging.debug("request: {}".format(data[:20]))
+
+        if data == GET:
+            writer.write(self.project)
+            await writer.drain()
+            logging.debug("Project sent")
+            self.callback({"MESSAGE": "Project sent to {}".format(address[0])})
+
+        elif data == STOP:
+            self._stop_event.set()
+
+        elif data == PUT:
+            self._legacy_put_hosts.add(address[0])
+            writer.write(LEGACY_SEND)
+            await writer.drain()
+
+        # observations sent after a put request
+        elif address[0] in self._legacy_put_hosts:
+            self._legacy_put_hosts.discard(address[0])
+            received = bytearray(data)
+            while not received.endswith(LEGACY_TERMINATOR):
+                chunk = await reader.read(READ_SIZE)
+                if not chunk:
+                    break
+                received += chunk
+            if received.endswith(LEGACY_TERMINATOR):
+                del received[-len(LEGACY_TERMINATOR):]
+            self.callback({"RECEIVED": received.decode("utf-8"), "SENDER": address})
+
+
+class ProjectClient():
+    """
+    client of the framed protocol (used for tests)
+    """
+
+    def __init__(self, host, port, compress=True, timeout=60):
+        self.compress = compress
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.sendall(MAGIC)
+        # number of bytes received on the network
+        self.received = 0
+
+
+    def close(self):
+        self.sock.close()
+
+
+    def _send(self, payload, compress=False, flags=0):
+        header, payload = frame(payload, compress)
+        if flags:
+            header = FRAME_HEADER.pack(FRAME_HEADER.unpack(header)[0] | flags, len(payload))
+        # small frames are sent in one segment
+        if len(payload) < READ_SIZE:
+            self.sock.sendall(header + payload)
+        else:
+            self.sock.sendall(header)
+            self.sock.sendall(payload)
+
+
+    def _recv_exactly(self, n):
+        buffer = bytearray(n)
+        view = memoryview(buffer)
+        idx = 0
+        while idx < n:
+            size = self.sock.recv_into(view[idx:], min(n - idx, READ_SIZE))
+            if not size:
+                raise EOFError("Connection closed by server")
+            idx += size
+        self.received += n
+        return bytes(buffer)
+
+
+    def _recv(self):
+        flags, length = FRAME_HEADER.unpack(self._recv_exactly(FRAME_HEADER.size))
+        return decode_payload(flags, self._recv_exactly(length))
+
+
+    def get_project(self):
+        """
+        Returns:
+            bytes: JSON of project
+        """
+        # the FLAG_GZIP flag of the request asks for a compressed project
+        self._send(GET, flags=FLAG_GZIP if self.compress else 0)
+        return self._recv()
+
+
+    def put_observations(self, observations):
+        """
+        Args:
+            observations (bytes): JSON of observations
+        """
+        self._send(PUT)
+        self._send(observations, self.compress)
+        if self._recv() != OK:
+            raise ProtocolError("Observations not received")
+
+
+    def _request_json(self, request, obj=None):
+        """
+        send a request (followed by JSON of obj if not None) and return the decoded JSON reply
+        """
+        self._send(request, flags=FLAG_GZIP if self.compress else 0)
+        if obj is not None:
+            self._send(json.dumps(obj, separators=(",", ":"), default=utilities.decimal_default).encode("utf-8"),
+                       self.compress)
+        return json.loads(self._recv().decode("utf-8"))
+
+
+    def versions(self):
+        """
+        Returns:
+            dict: version of observations of server
+        """
+        return self._request_json(VERSIONS)
+
+
+    def get_observations(self, obs_ids):
+        """
+        Args:
+            obs_ids (list): observations id
+
+        Returns:
+            dict: observations
+        """
+        return self._request_json(OBSERVATIONS, list(obs_ids))
+
+
+    def sync(self, changes):
+        """
+        Args:
+            changes (dict): changes of observations (see observations_sync.sync_changes)
+
+        Returns:
+            dict: status and new version by observation id
+        """
+        return self._request_json(SYNC, changes)
+
+
+    def synchronize(self, base_observations, observations):
+        """
+        send the changes of observations since the base observations and fetch the observations
+        modified on the server (the observations in conflict are not fetched)
+
+        Args:
+            base_observations (dict): observations as received from server
+            observations (dict): current observations
+
+        Returns:
+            dict: synchronized observations (base observations of the next synchronization)
+            dict: status by observation id
+        """
+
+        results = self.sync(observations_sync.sync_changes(base_observations, observations))
+        conflicts = [obs_id for obs_id in results if results[obs_id]["status"] == observations_sync.CONFLICT]
+
+        versions = self.versions()
+        synchronized = {obs_id: observations[obs_id] for obs_id in observations
+                        if obs_id in versions and observations_sync.observation_version(observations[obs_id]) == versions[obs_id]}
+        synchronized.update(self.get_observations([obs_id for obs_id in versions
+                                                   if obs_id not in synchronized and obs_id not in conflicts]))
+
+        return synchronized, {obs_id: results[obs_id]["status"] for obs_id in results}
+
+
+    def stop_server(self):
+        self._send(STOP)
+        self._recv()
+
+
+def throughput_test(host, port, clients=8, requests=4, compress=True):
+    """
+    concurrent clients requesting the project
+
+    Args:
+        host (str): server address
+        port (int): server port
+        clients (int): number of concurrent clients
+        requests (int): number of project requests by client
+        compress (bool): True for gzip compression
+
+    Returns:
+        dict: number of projects received ("projects"), bytes of projects ("bytes"),
+              bytes transferred on network ("network bytes"), duration in seconds ("seconds")
+    """
+
+    results = [None] * clients
+
+    def client(idx):
+        c = ProjectClient(host, port, compress=compress)
+        try:
+            size = 0
+            for _ in range(requests):
+                size += len(c.get_project())
+            results[idx] = (size, c.received)
+        finally:
+            c.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(idx,)) for idx in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    done = [result for result in results if result is not None]
+    return {"projects": len(done) * requests,
+            "bytes": sum([result[0] for result in done]),
+            "network bytes": sum([result[1] for result in done]),
+            "seconds": duration}
+
+
+if __name__ == "__main__":
+
+    import argparse
+    import project_functions
+
+    parser = argparse.ArgumentParser(description="Throughput test of the project server")
+    parser.add_argument("project", help="BORIS project file")
+    parser.add_argument("-c", "--clients", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("-n", "--requests", type=int, default=4, help="Number of project requests by client")
+    parser.add_argument("--no-gzip", action="store_true", default=False, help="No compression")
+    args = parser.parse_args()
+
+    _, _, pj, msg = project_functions.open_project_json(args.project)
+    if "error" in pj:
+        print(pj["error"], file=sys.stderr)
+        sys.exit(1)
+
+    server = ProjectServer(str.encode(json.dumps(pj, indent=None, separators=(",", ":"),
+                                                 default=utilities.decimal_default)),
+                           host="127.0.0.1")
+    server_thread = threading.Thread(target=server.run)
+    server_thread.start()
+    server.ready.wait()
+
+    try:
+        result = throughput_test(server.host, server.port, args.clients, args.requests, not args.no_gzip)
+    finally:
+        server.stop()
+        server_thread.join()
+
+    print("{projects} projects ({bytes} bytes, {network bytes} bytes transferred) in {seconds:.3f} s".format(**result))
+    print("{:.1f} MB/s".format(result["bytes"] / result["seconds"] / 1024 / 1024))
+    sys.exit(0 if result["projects"] == args.clients * args.requests else 1)
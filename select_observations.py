@@ -1,8 +1,14 @@
 
+try:
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtWidgets import QAbstractItemView
+except:
+    from PyQt4.QtCore import Qt
+    from PyQt4.QtGui import QAbstractItemView
+
 import observations_list
+import observations_summary
 from config import *
-from utilities import *
-import project_functions
 
 def select_observations(pj, mode):
     """
@@ -15,50 +21,10 @@ def select_observations(pj, mode):
 
     """
 
-    obsListFields = ["id", "date", "description", "subjects", "media"]
-    indepVarHeader, column_type = [], [TEXT] * len(obsListFields)
-
-    if INDEPENDENT_VARIABLES in pj:
-        for idx in sorted_keys(pj[INDEPENDENT_VARIABLES]):
-            indepVarHeader.append(pj[INDEPENDENT_VARIABLES][idx]["label"])
-            column_type.append(pj[INDEPENDENT_VARIABLES][idx]["type"])
-
-    data = []
-    for obs in sorted(list(pj[OBSERVATIONS].keys())):
-        date = pj[OBSERVATIONS][obs]["date"].replace("T", " ")
-        descr = pj[OBSERVATIONS][obs]["description"]
-
-        # subjects
-        observedSubjects = project_functions.extract_observed_subjects(pj, [obs])
-
-        # remove when No focal subject
-        if "" in observedSubjects:
-            observedSubjects.remove("")
-        subjectsList = ", ".join(observedSubjects)
-
-        mediaList = []
-        if pj[OBSERVATIONS][obs][TYPE] in [MEDIA]:
-            if pj[OBSERVATIONS][obs][FILE]:
-                for player in sorted(pj[OBSERVATIONS][obs][FILE].keys()):
-                    for media in pj[OBSERVATIONS][obs][FILE][player]:
-                        mediaList.append("#{0}: {1}".format(player, media))
-
-            media = os.linesep.join(mediaList)
-        elif pj[OBSERVATIONS][obs][TYPE] in [LIVE]:
-            media = LIVE
-
-        # independent variables
-        indepvar = []
-        if INDEPENDENT_VARIABLES in pj[OBSERVATIONS][obs]:
-            for var_label in indepVarHeader:
-                if var_label in pj[OBSERVATIONS][obs][INDEPENDENT_VARIABLES]:
-                    indepvar.append(pj[OBSERVATIONS][obs][INDEPENDENT_VARIABLES][var_label])
-                else:
-                    indepvar.append("")
-
-        data.append([obs, date, descr, subjectsList, media] + indepvar)
+    header, column_type, data, set_values = observations_summary.observations_table(pj)
 
-    obsList = observations_list.observationsList_widget(data, header=obsListFields + indepVarHeader, column_type=column_type)
+    obsList = observations_list.observationsList_widget(data, header=header, column_type=column_type,
+                                                        set_values=set_values)
 
     obsList.pbOpen.setVisible(False)
     obsList.pbEdit.setVisible(False)
@@ -92,7 +58,7 @@ def select_observations(pj, mode):
 
     obsList.resize(900, 600)
 
-    obsList.view.sortItems(0, Qt.AscendingOrder)
+    obsList.view.sortByColumn(0, Qt.AscendingOrder)
 
     selectedObs = []
 
@@ -0,0 +1,123 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+Profiling of the start of BORIS (--profile-startup option)
+
+The imports are timed by replacing builtins.__import__:
+    cumulative time: time of the import including the imports done by the imported module
+    self time: cumulative time minus the cumulative times of these imports
+The steps of the start (creation of the main window...) are timed with mark.
+"""
+
+import builtins
+import importlib.util
+import sys
+import time
+
+# number of modules in the lists of slowest imports
+REPORT_MAX_MODULES = 20
+
+_start = None
+_original_import = None
+# cumulative time of the imports done by each import in progress
+_children_time = []
+# (module name, depth, self time, cumulative time) of timed imports
+_imports = []
+# (step, time from start)
+_steps = []
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """
+    builtins.__import__ replacement recording the import times of the modules not already imported
+    """
+
+    if not level and not fromlist and name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    modules_number = len(sys.modules)
+    _children_time.append(0)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        cumulative = time.perf_counter() - start
+        children = _children_time.pop()
+        if len(sys.modules) > modules_number:
+            if level:
+                try:
+                    name = importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__"))
+                except (ImportError, ValueError):
+                    pass
+            _imports.append((name, len(_children_time), cumulative - children, cumulative))
+            if _children_time:
+                _children_time[-1] += cumulative
+
+
+def start():
+    """
+    start the timing of imports
+    """
+    global _start, _original_import
+
+    _start = time.perf_counter()
+    _original_import = builtins.__import__
+    builtins.__import__ = _timed_import
+
+
+def mark(step):
+    """
+    record the time of a step of the start
+
+    Args:
+        step (str): name of step
+    """
+    _steps.append((step, time.perf_counter() - _start))
+
+
+def report(file=sys.stderr):
+    """
+    stop the timing of imports and print the durations of steps and the slowest imports
+
+    Args:
+        file: file object for output
+    """
+
+    if _original_import is not None:
+        builtins.__import__ = _original_import
+
+    print("Start of BORIS: {:.3f} s".format(time.perf_counter() - _start), file=file)
+
+    print("\nSteps (s)\n{:>10}{:>10}  step".format("duration", "time"), file=file)
+    previous = 0
+    for step, elapsed in _steps:
+        print("{:10.3f}{:10.3f}  {}".format(elapsed - previous, elapsed, step), file=file)
+        previous = elapsed
+
+    print("\nTop level imports (ms)\n{:>10}{:>10}  module".format("cumul.", "self"), file=file)
+    for name, _, self_time, cumulative in sorted([x for x in _imports if x[1] == 0], key=lambda x: -x[3])[:REPORT_MAX_MODULES]:
+        print("{:10.1f}{:10.1f}  {}".format(cumulative * 1000, self_time * 1000, name), file=file)
+
+    print("\nSlowest modules (ms)\n{:>10}{:>10}  module".format("cumul.", "self"), file=file)
+    for name, _, self_time, cumulative in sorted(_imports, key=lambda x: -x[2])[:REPORT_MAX_MODULES]:
+        print("{:10.1f}{:10.1f}  {}".format(cumulative * 1000, self_time * 1000, name), file=file)
+
+    print("\n{} modules imported".format(len(_imports)), file=file)
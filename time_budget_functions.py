@@ -0,0 +1,515 @@
+"""
+BORIS
+Behavioral Observation Research Interactive Software
+Copyright 2012-2018 Olivier Friard
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+  MA 02110-1301, USA.
+
+
+Time budget analysis (without GUI)
+
+The events of all subjects, behaviors and modifiers are extracted with one query
+and the statistics are computed with NumPy grouped reductions.
+"""
+
+import multiprocessing
+import sys
+
+from config import *
+import db_functions
+import ethogram_index
+import project_functions
+from lazy_modules import lazy_import
+
+np = lazy_import("numpy")
+
+# fields of time budget by behavior
+TIME_BUDGET_FIELDS = ["subject", "behavior", "modifiers", "number", "duration", "duration_mean", "duration_stdev",
+                      "inter_duration_mean", "inter_duration_stdev", "percent_total_length"]
+
+
+def observation_interval(observation, parameters):
+    """
+    time interval of observation to analyze
+
+    Args:
+        observation (dict): observation
+        parameters (dict): analysis parameters ("time", "start time", "end time")
+
+    Returns:
+        float: start of interval
+        float: end of interval
+    """
+
+    obs_length = project_functions.observation_total_length(observation)
+    if obs_length == -1:
+        obs_length = 0
+
+    if parameters["time"] == TIME_EVENTS:
+        try:
+            min_time = float(observation[EVENTS][0][0])
+        except:
+            min_time = float(0)
+        try:
+            max_time = float(observation[EVENTS][-1][0])
+        except:
+            max_time = float(obs_length)
+        return min_time, max_time
+
+    if parameters["time"] == TIME_ARBITRARY_INTERVAL:
+        return float(parameters["start time"]), float(parameters["end time"])
+
+    # TIME_FULL_OBS
+    return float(0), float(obs_length)
+
+
+def restrict_events_to_interval(cursor, obs_id, min_time, max_time):
+    """
+    restrict the events of observation to the time interval.
+    The state events that are running at the start (or at the end) of interval are cut.
+
+    Args:
+        cursor (sqlite3.Cursor): cursor on events database (see db_functions.load_events_in_db)
+        obs_id (str): observation id
+        min_time (float): start of interval
+        max_time (float): end of interval
+    """
+
+    # number of events before and after the interval for each state behavior
+    cursor.execute(("SELECT subject, code, modifiers, "
+                    "SUM(occurence < ?) AS n_before, SUM(occurence > ?) AS n_after "
+                    "FROM events WHERE observation = ? AND type = ? "
+                    "GROUP BY subject, code, modifiers"),
+                   (min_time, max_time, obs_id, STATE))
+
+    for row in cursor.fetchall():
+        for n_events, time_ in [(row["n_before"], min_time), (row["n_after"], max_time)]:
+            if n_events % 2:
+                cursor.execute(("INSERT INTO events (observation, subject, code, type, modifiers, occurence) "
+                                "VALUES (?,?,?,?,?,?)"),
+                               (obs_id, row["subject"], row["code"], STATE, row["modifiers"], time_))
+
+    cursor.execute("DELETE FROM events WHERE observation = ? AND (occurence < ? OR occurence > ?)", (obs_id, min_time, max_time))
+
+
+def grouped_stats(values, groups, n_groups):
+    """
+    number, sum, mean and standard deviation (sample) of values by group
+
+    Args:
+        values (np.array): values
+        groups (np.array): group index of values
+        n_groups (int): number of groups
+
+    Returns:
+        np.array: number of values by group
+        np.array: sum of values by group
+        np.array: mean of values by group
+        np.array: standard deviation of values by group
+    """
+
+    number = np.bincount(groups, minlength=n_groups)
+    total = np.bincount(groups, weights=values, minlength=n_groups)
+    mean = np.divide(total, number, out=np.zeros(n_groups), where=number > 0)
+    squares = np.bincount(groups, weights=(values - mean[groups]) ** 2, minlength=n_groups)
+    stdev = np.sqrt(np.divide(squares, number - 1, out=np.zeros(n_groups), where=number > 1))
+
+    return number, total, mean, stdev
+
+
+def _stat_value(value, number, min_number):
+    """
+    rounded value if enough values else "NA"
+    """
+    return round(float(value), 3) if number >= min_number else "NA"
+
+
+def _percent(duration, total_length):
+    """
+    percent of total length
+    """
+    if isinstance(duration, float) and duration and total_length:
+        return round(duration / float(total_length) * 100, 1)
+    return "NA"
+
+
+def event_groups(ethogram, cursor, include_modifiers):
+    """
+    events of database grouped by subject, behavior (and modifiers)
+
+    Args:
+        ethogram (dict): ethogram of project
+        cursor (sqlite3.Cursor): cursor on events database (see db_functions.load_events_in_db)
+        include_modifiers (bool): True for grouping the events by modifiers
+
+    Returns:
+        dict: "group keys": list of (subject, behavior, modifiers) tuples (modifiers is empty if not include_modifiers)
+              "group is state": True for groups of state events
+              "group size": number of events by group
+              "groups", "observations", "times": group index, observation index and time of events
+              (sorted by group, observation and time)
+              "position": position of event in its group (the state events start at even positions)
+              "is state": True for state events
+    """
+
+    behaviors_type = ethogram_index.get_index(ethogram).types
+
+    cursor.execute(("SELECT subject, code, modifiers, observation, occurence FROM events "
+                    "ORDER BY subject, code, {}observation, occurence").format("modifiers, " if include_modifiers else ""))
+    rows = cursor.fetchall()
+
+    # index of group (subject, behavior, modifiers) for each event
+    groups_idx, groups = {}, np.empty(len(rows), dtype=np.int64)
+    observations_idx, observations = {}, np.empty(len(rows), dtype=np.int64)
+    for idx, row in enumerate(rows):
+        groups[idx] = groups_idx.setdefault((row[0], row[1], row[2] if include_modifiers else ""), len(groups_idx))
+        observations[idx] = observations_idx.setdefault(row[3], len(observations_idx))
+
+    group_keys = list(groups_idx.keys())
+    group_is_state = np.array([STATE in behaviors_type.get(key[1], "") for key in group_keys], dtype=bool)
+
+    return {"group keys": group_keys,
+            "group is state": group_is_state,
+            "group size": np.bincount(groups, minlength=len(group_keys)),
+            "groups": groups,
+            "observations": observations,
+            "times": np.array([float(row[4]) for row in rows], dtype=float),
+            # rows are sorted by group
+            "position": np.arange(len(rows)) - np.searchsorted(groups, groups),
+            "is state": group_is_state[groups]}
+
+
+def time_budget_analysis(ethogram, cursor, parameters, by_category=False, total_length=0):
+    """
+    number of occurrences, total duration, mean and standard deviation of durations,
+    mean and standard deviation of inter-event intervals, percent of total length
+    for all subject x behavior (x modifiers) combinations
+
+    Args:
+        ethogram (dict): ethogram of project
+        cursor (sqlite3.Cursor): cursor on events database (see db_functions.load_events_in_db)
+        parameters (dict): analysis parameters ("selected subjects", "selected behaviors",
+                           "include modifiers", "exclude behaviors")
+        by_category (bool): True for computing the results by behavioral category
+        total_length (float): total length of observations (0 if not available)
+
+    Returns:
+        list: list of dict with TIME_BUDGET_FIELDS keys (ordered by subject and behavior)
+        dict: number and total duration by subject and category
+    """
+
+    behaviors_type = ethogram_index.get_index(ethogram).types
+    behaviors_category = {ethogram[idx][BEHAVIOR_CODE]: ethogram[idx].get("category", "") for idx in ethogram}
+
+    include_modifiers = parameters["include modifiers"]
+    events = event_groups(ethogram, cursor, include_modifiers)
+    group_keys, group_is_state, group_size = events["group keys"], events["group is state"], events["group size"]
+    groups, times, position, is_state = events["groups"], events["times"], events["position"], events["is state"]
+    n_groups = len(group_keys)
+
+    # next event in same group and same observation
+    same_next = np.zeros(len(times), dtype=bool)
+    same_next[:-1] = (groups[1:] == groups[:-1]) & (events["observations"][1:] == events["observations"][:-1])
+
+    # durations of states (start at even position)
+    starts = np.flatnonzero(is_state & (position % 2 == 0) & (position + 1 < group_size[groups]))
+    n_durations, sum_durations, mean_durations, stdev_durations = grouped_stats(times[starts + 1] - times[starts],
+                                                                                groups[starts], n_groups)
+
+    # inter-event intervals: between consecutive points or between the stop of a state and the next start
+    inter = np.flatnonzero(same_next & (~is_state | (position % 2 == 1)))
+    n_inter, _, mean_inter, stdev_inter = grouped_stats(times[inter + 1] - times[inter], groups[inter], n_groups)
+
+    subject_behavior_groups = {}
+    for group, key in enumerate(group_keys):
+        subject_behavior_groups.setdefault(key[:2], []).append(group)
+
+    out, categories = [], {}
+    for subject in parameters["selected subjects"]:
+        categories[subject] = {}
+        for behavior in parameters["selected behaviors"]:
+
+            if (subject, behavior) not in subject_behavior_groups:
+                if not parameters["exclude behaviors"]:
+                    is_state_behavior = STATE in behaviors_type.get(behavior, "")
+                    out.append({"subject": subject, "behavior": behavior, "modifiers": "-",
+                                "duration": 0 if is_state_behavior else "NA",
+                                "duration_mean": 0 if is_state_behavior else "NA",
+                                "duration_stdev": "NA",
+                                "number": 0,
+                                "inter_duration_mean": "NA", "inter_duration_stdev": "NA",
+                                "percent_total_length": "NA"})
+                continue
+
+            for group in subject_behavior_groups[(subject, behavior)]:
+                modifiers = group_keys[group][2] if include_modifiers else "-"
+
+                if group_is_state[group] and group_size[group] % 2:
+                    out.append({"subject": subject, "behavior": behavior,
+                                "modifiers": modifiers if include_modifiers else "NA",
+                                "duration": UNPAIRED, "duration_mean": UNPAIRED, "duration_stdev": UNPAIRED,
+                                "number": UNPAIRED, "inter_duration_mean": UNPAIRED,
+                                "inter_duration_stdev": UNPAIRED, "percent_total_length": UNPAIRED})
+                    continue
+
+                if group_is_state[group]:
+                    duration = round(float(sum_durations[group]), 3)
+                    row = {"duration": duration,
+                           "duration_mean": _stat_value(mean_durations[group], n_durations[group], 1),
+                           "duration_stdev": _stat_value(stdev_durations[group], n_durations[group], 2),
+                           "number": int(n_durations[group])}
+                else:
+                    row = {"duration": "NA", "duration_mean": "NA", "duration_stdev": "NA",
+                           "number": int(group_size[group])}
+
+                row.update({"subject": subject, "behavior": behavior, "modifiers": modifiers,
+                            "inter_duration_mean": _stat_value(mean_inter[group], n_inter[group], 1),
+                            "inter_duration_stdev": _stat_value(stdev_inter[group], n_inter[group], 2),
+                            "percent_total_length": _percent(row["duration"], total_length)})
+                out.append(row)
+
+                if by_category:
+                    category = behaviors_category.get(behavior, "")
+                    if category not in categories[subject]:
+                        categories[subject][category] = {"duration": "-", "number": 0}
+                    if isinstance(row["duration"], float):
+                        categories[subject][category]["duration"] = round(
+                            (categories[subject][category]["duration"] if categories[subject][category]["duration"] != "-" else 0)
+                            + row["duration"], 3)
+                    categories[subject][category]["number"] += row["number"]
+
+    return out, categories
+
+
+def time_budget(pj, selected_observations, parameters, by_category=False):
+    """
+    time budget analysis of the selected observations (grouped in one analysis)
+
+    Args:
+        pj (dict): project
+        selected_observations (list): list of observations id
+        parameters (dict): analysis parameters ("selected subjects", "selected behaviors",
+                           "include modifiers", "exclude behaviors", "time", "start time", "end time")
+        by_category (bool): True for computing the results by behavioral category
+
+    Returns:
+        list: list of dict with TIME_BUDGET_FIELDS keys
+        dict: number and total duration by subject and category
+        float: total length of analyzed intervals
+    """
+
+    cursor = db_functions.load_events_in_db(pj, parameters["selected subjects"], selected_observations,
+                                            parameters["selected behaviors"])
+
+    total_length = 0
+    for obs_id in selected_observations:
+        min_time, max_time = observation_interval(pj[OBSERVATIONS][obs_id], parameters)
+        restrict_events_to_interval(cursor, obs_id, min_time, max_time)
+        total_length += max_time - min_time
+
+    out, categories = time_budget_analysis(pj[ETHOGRAM], cursor, parameters,
+                                           by_category=by_category, total_length=total_length)
+
+    return out, categories, total_length
+
+
+def _cumulative_by_group(times, groups, n_groups, edges):
+    """
+    sweep-line on sorted times with prefix sums:
+    for each group and each edge, number of times <= edge and sum of (edge - time) for these times
+
+    Args:
+        times (np.array): times (between edges[0] and edges[-1])
+        groups (np.array): group index of times
+        n_groups (int): number of groups
+        edges (np.array): sorted edges
+
+    Returns:
+        np.array: number of times <= edge (n_groups x n_edges)
+        np.array: sum of (edge - time) for times <= edge (n_groups x n_edges)
+    """
+
+    order = np.lexsort((times, groups))
+    times, groups = times[order], groups[order]
+
+    # the times of each group are shifted in a distinct range for searching all groups at once
+    offset = np.arange(n_groups) * (edges[-1] - edges[0] + 1)
+    keys = offset[groups] + (times - edges[0])
+    prefix = np.concatenate(([0.0], np.cumsum(times)))
+    first = np.searchsorted(groups, np.arange(n_groups))
+
+    idx = np.searchsorted(keys, offset[:, None] + (edges - edges[0])[None, :], side="right")
+    count = idx - first[:, None]
+
+    return count, count * edges[None, :] - (prefix[idx] - prefix[first][:, None])
+
+
+def _count_by_window(times, groups, n_groups, edges):
+    """
+    number of times by group in each window [edges[i], edges[i + 1][ (the last window includes its end)
+
+    Args:
+        times (np.array): times (between edges[0] and edges[-1])
+        groups (np.array): group index of times
+        n_groups (int): number of groups
+        edges (np.array): sorted edges
+
+    Returns:
+        np.array: number of times (n_groups x n_windows)
+
+    >>> _count_by_window(np.array([60.0, 60.0, 0.0, 180.0]), np.array([0, 1, 2, 2]), 3, np.arange(0.0, 181.0, 60.0)).tolist()
+    [[0, 1, 0], [0, 1, 0], [1, 0, 1]]
+    """
+
+    n_windows = len(edges) - 1
+    windows = np.clip(np.searchsorted(edges, times, side="right") - 1, 0, n_windows - 1)
+    return np.bincount(groups * n_windows + windows, minlength=n_groups * n_windows).reshape(n_groups, n_windows)
+
+
+def windowed_time_budget(pj, selected_observations, parameters, window_length):
+    """
+    time budget in consecutive time windows (total duration and number of occurrences)
+    The state intervals are clipped to all windows in one pass (see _cumulative_by_group):
+    a state that straddles the limit of a window is split between the windows.
+    The results of the selected observations are summed (the windows start at the beginning of the analyzed interval)
+
+    Args:
+        pj (dict): project
+        selected_observations (list): list of observations id
+        parameters (dict): analysis parameters (see time_budget)
+        window_length (float): length of time windows (in seconds)
+
+    Returns:
+        np.array: edges of windows (n_windows + 1)
+        list: list of (subject, behavior, modifiers) tuples
+        np.array: total duration by (subject, behavior, modifiers) and window (NaN for point events)
+        np.array: number of occurrences (state starts or point events) by (subject, behavior, modifiers) and window
+        list: list of (subject, behavior, modifiers) with unpaired state events (not analyzed)
+    """
+
+    cursor = db_functions.load_events_in_db(pj, parameters["selected subjects"], selected_observations,
+                                            parameters["selected behaviors"])
+
+    intervals = []
+    for obs_id in selected_observations:
+        min_time, max_time = observation_interval(pj[OBSERVATIONS][obs_id], parameters)
+        restrict_events_to_interval(cursor, obs_id, min_time, max_time)
+        intervals.append((min_time, max_time))
+
+    start = min([interval[0] for interval in intervals])
+    end = max([interval[1] for interval in intervals])
+    n_windows = max(1, int(np.ceil((end - start) / window_length)))
+    edges = start + np.arange(n_windows + 1) * window_length
+
+    events = event_groups(pj[ETHOGRAM], cursor, parameters["include modifiers"])
+    group_keys, groups, times = events["group keys"], events["groups"], events["times"]
+    n_groups = len(group_keys)
+    unpaired = events["group is state"] & (events["group size"] % 2 == 1)
+
+    # state intervals: start at even position, stop at next position
+    starts = np.flatnonzero(events["is state"] & (events["position"] % 2 == 0) & ~unpaired[groups])
+    # covered time at edge = sum(edge - start) for started states - sum(edge - stop) for stopped states
+    _, started = _cumulative_by_group(times[starts], groups[starts], n_groups, edges)
+    _, stopped = _cumulative_by_group(times[starts + 1], groups[starts + 1], n_groups, edges)
+    # rounded as the durations of time budget (differences of cumulative sums leave tiny negative values)
+    duration = np.round(np.diff(started - stopped, axis=1), 3)
+    duration[duration <= 0] = 0
+    duration[~events["group is state"]] = np.nan
+
+    # occurrences in [window start, window end[ (the last window includes its end)
+    onsets = np.concatenate((starts, np.flatnonzero(~events["is state"])))
+    number = _count_by_window(times[onsets], groups[onsets], n_groups, edges)
+
+    # order by selected subjects and behaviors
+    behaviors_type = ethogram_index.get_index(pj[ETHOGRAM]).types
+    keys, rows_duration, rows_number = [], [], []
+    for subject in parameters["selected subjects"]:
+        for behavior in parameters["selected behaviors"]:
+            behavior_groups = [group for group, key in enumerate(group_keys)
+                               if key[:2] == (subject, behavior) and not unpaired[group]]
+            if not behavior_groups and not parameters["exclude behaviors"]:
+                keys.append((subject, behavior, ""))
+                rows_duration.append(np.zeros(n_windows) if STATE in behaviors_type.get(behavior, "")
+                                     else np.full(n_windows, np.nan))
+                rows_number.append(np.zeros(n_windows, dtype=np.int64))
+            for group in behavior_groups:
+                keys.append(group_keys[group])
+                rows_duration.append(duration[group])
+                rows_number.append(number[group])
+
+    return (edges,
+            keys,
+            np.array(rows_duration).reshape(len(keys), n_windows),
+            np.array(rows_number, dtype=np.int64).reshape(len(keys), n_windows),
+            [group_keys[group] for group in np.flatnonzero(unpaired)])
+
+
+def observation_time_budget(args):
+    """
+    time budget analysis of one observation (worker of parallel_time_budget)
+
+    Args:
+        args (tuple): observation id, project restricted to the ethogram and the observation,
+                      analysis parameters, by_category
+
+    Returns:
+        str: observation id
+        list: list of dict with TIME_BUDGET_FIELDS keys
+        dict: number and total duration by subject and category
+        float: start of analyzed interval
+        float: end of analyzed interval
+    """
+
+    obs_id, pj, parameters, by_category = args
+    out, categories, _ = time_budget(pj, [obs_id], parameters, by_category=by_category)
+    min_time, max_time = observation_interval(pj[OBSERVATIONS][obs_id], parameters)
+
+    return obs_id, out, categories, min_time, max_time
+
+
+def parallel_time_budget(pj, selected_observations, parameters, by_category=False, max_workers=0):
+    """
+    time budget analysis of each selected observation with a pool of processes.
+    Each worker receives only the ethogram and the events of its observation.
+    For windows exe (created with pyinstaller) multiprocessing can not be used: the observations are analyzed in sequence.
+
+    Args:
+        pj (dict): project
+        selected_observations (list): list of observations id
+        parameters (dict): analysis parameters (see time_budget)
+        by_category (bool): True for computing the results by behavioral category
+        max_workers (int): number of processes (0 for number of CPU)
+
+    Yields:
+        tuple: results of observation_time_budget, in order of completion
+    """
+
+    tasks = [(obs_id,
+              {ETHOGRAM: pj[ETHOGRAM], OBSERVATIONS: {obs_id: pj[OBSERVATIONS][obs_id]}},
+              parameters,
+              by_category) for obs_id in selected_observations]
+
+    if len(tasks) < 2 or (sys.platform.startswith("win") and getattr(sys, "frozen", False)):
+        for task in tasks:
+            yield observation_time_budget(task)
+        return
+
+    if max_workers <= 0:
+        max_workers = multiprocessing.cpu_count()
+
+    with multiprocessing.Pool(min(max_workers, len(tasks))) as pool:
+        for result in pool.imap_unordered(observation_time_budget, tasks):
+            yield result
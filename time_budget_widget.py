@@ -32,13 +32,16 @@ except:
 
 import logging
 import os
-import tablib
 import pathlib
 
 import dialog
 
 from config import *
 from utilities import intfloatstr
+from lazy_modules import lazy_import
+
+tablib = lazy_import("tablib", required=True)
+
 
 class timeBudgetResults(QWidget):
     """
@@ -22,135 +22,256 @@ This file is part of BORIS.
 
 """
 
-import os
-import sys
+from lazy_modules import lazy_import
 
+np = lazy_import("numpy")
 
-def behavioral_strings_analysis(strings, behaviouralStringsSeparator):
+# separator between the behaviors of a n-gram context
+NGRAM_SEPARATOR = "|"
+
+# over this number of behaviors the matrices are saved as list of transitions (sparse format)
+SPARSE_MIN_BEHAVIORS = 100
+
+SPARSE_HEADER = ["from", "to", "value"]
+
+MODES = ["frequency", "number", "frequencies_after_behaviors"]
+
+
+def ngrams(sequences, ngram=2):
+    """
+    n-grams observed in sequences with their number (sparse format)
+
+    Args:
+        sequences (list): list of sequences of behaviors coded with integers (see behavioral_sequences)
+        ngram (int): length of n-grams (2 for transitions between 2 behaviors)
+
+    Returns:
+        np.array: observed n-grams (n_ngrams x ngram)
+        np.array: number of each n-gram
     """
-    Analyze behavioral strings
+
+    windows = [np.stack([seq[i:len(seq) - ngram + 1 + i] for i in range(ngram)], axis=1)
+               for seq in sequences if len(seq) >= ngram]
+    if not windows:
+        return np.empty((0, ngram), dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    return np.unique(np.concatenate(windows), axis=0, return_counts=True)
+
+
+def transitions_counts(sequences, n_behaviors, lag=1):
     """
+    matrix of the number of transitions between 2 behaviors separated by lag
 
-    rows = strings[:]
-    sequences = []
-    for row in rows:
-        if behaviouralStringsSeparator:
-            r = row.strip().split(behaviouralStringsSeparator)
-        else:
-            r = list(row.strip())
+    Args:
+        sequences (list): list of sequences of behaviors coded with integers
+        n_behaviors (int): number of behaviors (size of vocabulary)
+        lag (int): lag between behaviors (1 for consecutive behaviors)
 
-        sequences.append(r)
+    Returns:
+        np.array: number of transitions from behavior (row) to behavior (column)
+    """
 
-    # extract unique behaviors
-    unique_behaviors = []
+    counts = np.zeros(n_behaviors * n_behaviors, dtype=np.int64)
     for seq in sequences:
-        for c in seq:
-            if not c in unique_behaviors:
-                unique_behaviors.append(c)
+        if len(seq) > lag:
+            counts += np.bincount(seq[:-lag].astype(np.int64) * n_behaviors + seq[lag:], minlength=n_behaviors * n_behaviors)
+
+    return counts.reshape(n_behaviors, n_behaviors)
+
+
+def ngram_counts(sequences, n_behaviors, ngram=2):
+    """
+    matrix of the number of transitions from the observed contexts (n - 1 behaviors) to behaviors
+
+    Args:
+        sequences (list): list of sequences of behaviors coded with integers
+        n_behaviors (int): number of behaviors (size of vocabulary)
+        ngram (int): length of n-grams
+
+    Returns:
+        np.array: observed contexts (n_contexts x (ngram - 1))
+        np.array: number of transitions from context (row) to behavior (column)
+    """
+
+    observed, number = ngrams(sequences, ngram)
+    contexts, rows = np.unique(observed[:, :-1], axis=0, return_inverse=True)
+
+    counts = np.zeros((len(contexts), n_behaviors), dtype=np.int64)
+    np.add.at(counts, (rows.ravel(), observed[:, -1]), number)
+
+    return contexts, counts
+
 
-    unique_behaviors.sort()
+def transitions_view(counts, mode="frequency"):
+    """
+    view of transitions counts
+
+    Args:
+        counts (np.array): number of transitions (rows: from, columns: to)
+        mode (str): "number", "frequency" (fraction of all transitions)
+                    or "frequencies_after_behaviors" (fraction of transitions from the behavior of row)
+
+    Returns:
+        np.array: matrix of transitions
+    """
 
-    return sequences, unique_behaviors
+    if mode == "number":
+        return counts
 
+    if mode == "frequency":
+        return counts / counts.sum() if counts.sum() else counts.astype(float)
 
-def observed_transitions_matrix(sequences, behaviours, mode="frequency"):
+    if mode == "frequencies_after_behaviors":
+        rows_sum = counts.sum(axis=1, keepdims=True)
+        return np.divide(counts, rows_sum, out=counts.astype(float), where=rows_sum > 0)
+
+    raise ValueError("Unknown mode: {}".format(mode))
+
+
+def _value_str(value):
+    """
+    text of matrix value (int or float)
+    """
+    return str(int(value)) if isinstance(value, (np.integer, int)) else str(float(value))
+
+
+def matrix_to_tsv(rows_labels, columns_labels, matrix):
+    """
+    matrix as TSV text (first row and first column contain the labels)
+    """
+
+    out = "\t" + "\t".join(columns_labels) + "\n"
+    for label, row in zip(rows_labels, matrix):
+        out += label + "\t" + "\t".join([_value_str(value) for value in row]) + "\n"
+    return out
+
+
+def sparse_to_tsv(rows_labels, columns_labels, matrix):
+    """
+    not null values of matrix as TSV text (one transition by row: from, to, value)
+    """
+
+    out = "\t".join(SPARSE_HEADER) + "\n"
+    for row_idx, column_idx in zip(*np.nonzero(matrix)):
+        out += "{}\t{}\t{}\n".format(rows_labels[row_idx], columns_labels[column_idx], _value_str(matrix[row_idx, column_idx]))
+    return out
+
+
+def observed_transitions_matrix(sequences, behaviours, mode="frequency", ngram=2, sparse=None):
     """
     create the normalized matrix of observed transitions
     mode:
     * frequency:
     * number
     * frequencies_after_behaviors
-    """
 
-    print("behaviours", behaviours)
+    Args:
+        sequences (list): list of sequences of behaviors coded with integers (see behavioral_sequences)
+        behaviours (list): text of behaviors (behaviours[code])
+        mode (str): see above
+        ngram (int): length of n-grams (2 for transitions between 2 behaviors)
+        sparse (bool): True for list of transitions, False for matrix,
+                       None for list of transitions if more than SPARSE_MIN_BEHAVIORS behaviors
 
-    if "" in behaviours:
-        behaviours.remove("")
+    Returns:
+        str: matrix of transitions (TSV) or False if no transition
+    """
 
-    transitions = {}
-    for behaviour in behaviours:
-        if not behaviour:
-            continue
-        transitions[behaviour] = {}
-        for behaviour2 in behaviours:
-            transitions[behaviour][behaviour2] = 0
+    if ngram == 2:
+        counts = transitions_counts(sequences, len(behaviours))
+        rows_labels = behaviours
+    else:
+        contexts, counts = ngram_counts(sequences, len(behaviours), ngram)
+        rows_labels = [NGRAM_SEPARATOR.join([behaviours[code] for code in context]) for context in contexts]
 
-    for seq in sequences:
-        for i in range(len(seq) - 1):
-            if not seq[i]:
-                continue
-            if seq[i] in behaviours and seq[i + 1] in behaviours:
-                transitions[seq[i]][seq[i + 1]] += 1
+    if not counts.sum():
+        return False
 
-    transitions_total_number = sum([sum(transitions[x].values()) for x in transitions])
+    if sparse is None:
+        sparse = len(behaviours) > SPARSE_MIN_BEHAVIORS
 
-    if not transitions_total_number:
-        return False
+    return (sparse_to_tsv if sparse else matrix_to_tsv)(rows_labels, behaviours, transitions_view(counts, mode))
 
-    out = "\t" + "\t".join(list(behaviours)) + "\n"
-    for behaviour in behaviours:
-        out += "{}\t".format(behaviour)
-        for behaviour2 in behaviours:
-            if mode == "frequency":
-                #out += "{}\t".format(round(transitions[behaviour][behaviour2] / transitions_total_number, 3))
-                out += "{}\t".format(transitions[behaviour][behaviour2] / transitions_total_number)
-            elif mode == "number":
-                out += "{}\t".format(transitions[behaviour][behaviour2])
-            elif mode== "frequencies_after_behaviors":
-                if sum(transitions[behaviour].values()):
-                    #out += "{}\t".format( round(transitions[behaviour][behaviour2] / sum(transitions[behaviour].values()), 3))
-                    out += "{}\t".format( transitions[behaviour][behaviour2] / sum(transitions[behaviour].values()))
-                else:
-                    out += "{}\t".format(transitions[behaviour][behaviour2])
-        out = out[:-1] + "\n"
 
-    return out
+def read_matrix(matrix):
+    """
+    read a matrix of transitions saved as TSV (matrix or list of transitions)
 
+    Args:
+        matrix (str): TSV text
 
+    Returns:
+        list: labels of rows
+        list: labels of columns
+        np.array: matrix
+    """
 
-def create_transitions_gv_from_matrix(matrix, cutoff_all=0, cutoff_behavior=0, edge_label="percent_node"):
-        """
-        create code for GraphViz
-        matrix: matrix of frequency
-        edge_label: (percent_node, fraction_node)
-        return string containing graphviz code
-        """
+    lines = [line.split("\t") for line in matrix.split("\n") if line.strip()]
 
-        behaviours = matrix.split("\n")[0].strip().split("\t")
-        transitions = {}
+    if lines[0] == SPARSE_HEADER:
+        rows_labels, columns_labels = [], []
+        for from_, to, _ in lines[1:]:
+            if from_ not in rows_labels:
+                rows_labels.append(from_)
+            if to not in columns_labels:
+                columns_labels.append(to)
+        values = np.zeros((len(rows_labels), len(columns_labels)))
+        for from_, to, value in lines[1:]:
+            values[rows_labels.index(from_), columns_labels.index(to)] = float(value)
+        return rows_labels, columns_labels, values
 
-        for row in matrix.split("\n")[1:]:
-            if not row:
-                continue
+    return [line[0] for line in lines[1:]], lines[0][1:], np.array([[float(x) for x in line[1:]] for line in lines[1:]])
 
-            transitions[row.split("\t")[0]] = {}
-            for idx, r in enumerate(row.split("\t")[1:]):
-                if '.' in r:
-                    transitions[row.split("\t")[0]][behaviours[idx]] = float(r)
-                else:
-                    transitions[row.split("\t")[0]][behaviours[idx]] = int(r)
 
-        transitions_total_number = sum([sum(transitions[x].values()) for x in transitions])
+def create_transitions_gv(rows_labels, columns_labels, matrix, cutoff_all=0, cutoff_behavior=0, edge_label="percent_node"):
+    """
+    create code for GraphViz
+
+    Args:
+        rows_labels (list): labels of rows (from)
+        columns_labels (list): labels of columns (to)
+        matrix (np.array): matrix of transitions
+        cutoff_all (float): minimal value of transitions (percent_node)
+        cutoff_behavior (float): minimal fraction of transitions from behavior (fraction_node)
+        edge_label (str): percent_node or fraction_node
+
+    Returns:
+        str: graphviz code
+    """
 
-        out = "digraph G { \n"
+    rows_sum = matrix.sum(axis=1)
 
-        for behaviour1 in behaviours:
-            for behaviour2 in behaviours:
+    out = "digraph G { \n"
+    for row_idx, column_idx in zip(*np.nonzero(matrix)):
+        value = matrix[row_idx, column_idx]
 
-                if transitions[behaviour1][behaviour2]:
+        if edge_label == "percent_node" and value > cutoff_all:
+            out += """"{behaviour1}" -> "{behaviour2}" [label="{label:0.3f}"];\n""".format(behaviour1=rows_labels[row_idx],
+                                                                                         behaviour2=columns_labels[column_idx],
+                                                                                         label=value)
 
-                    if edge_label == "percent_node":
-                        if transitions[behaviour1][behaviour2] > cutoff_all:
-                            out += """"{behaviour1}" -> "{behaviour2}" [label="{label:0.3f}"];\n""".format(behaviour1=behaviour1, behaviour2=behaviour2, label=transitions[behaviour1][behaviour2])
+        if edge_label == "fraction_node" and value / rows_sum[row_idx] > cutoff_behavior:
+            out += """"{behaviour1}" -> "{behaviour2}" [label="{label}%"];\n""".format(behaviour1=rows_labels[row_idx],
+                                                                                      behaviour2=columns_labels[column_idx],
+                                                                                      label=round(value / rows_sum[row_idx] * 100, 1))
 
-                    if edge_label == "fraction_node":
-                        transition_sum = sum(transitions[behaviour1].values())
-                        print(transition_sum)
-                        if transitions[behaviour1][behaviour2] / transition_sum > cutoff_behavior:
-                            out += """"{behaviour1}" -> "{behaviour2}" [label="{label}%"];\n""".format(behaviour1=behaviour1, behaviour2=behaviour2, label=round(transitions[behaviour1][behaviour2] / transition_sum * 100, 1))
+    out += '\n}'
+    return out
 
-        out += '\n}'
-        return out
 
+def create_transitions_gv_from_matrix(matrix, cutoff_all=0, cutoff_behavior=0, edge_label="percent_node"):
+    """
+    create code for GraphViz from a matrix of transitions saved as TSV (see read_matrix)
+
+    Args:
+        matrix (str): TSV text
+        cutoff_all (float): see create_transitions_gv
+        cutoff_behavior (float): see create_transitions_gv
+        edge_label (str): percent_node or fraction_node
 
+    Returns:
+        str: graphviz code
+    """
 
+    return create_transitions_gv(*read_matrix(matrix), cutoff_all=cutoff_all, cutoff_behavior=cutoff_behavior,
+                                 edge_label=edge_label)
@@ -21,13 +21,6 @@ Copyright 2012-2018 Olivier Friard
   MA 02110-1301, USA.
 """
 
-try:
-    from PyQt5.QtCore import *
-    from PyQt5.QtWidgets import *
-except:
-    from PyQt4.QtCore import *
-    from PyQt4.QtGui import *
-
 import math
 import csv
 import re
@@ -42,9 +35,13 @@ from decimal import *
 import math
 import datetime
 import socket
-import numpy as np
 
 from config import *
+import external_data
+import ffmpeg_jobs
+from lazy_modules import lazy_import
+
+np = lazy_import("numpy")
 
 
 def bytes_to_str(b):
@@ -68,29 +65,29 @@ def bytes_to_str(b):
         return b
 
 
-def ffmpeg_recode(video_paths, horiz_resol, ffmpeg_bin):
+def ffmpeg_recode(video_paths, horiz_resol, ffmpeg_bin, max_workers=0, state_file=""):
     """
     recode one or more video with ffmpeg
-    
+    The videos are recoded by a queue of concurrent FFmpeg jobs (see ffmpeg_jobs module)
+
     Args:
         video_paths (list): list of video paths
         horiz_resol (int): horizontal resolution (in pixels)
         ffmpeg_bin (str): path of ffmpeg program
-    
+        max_workers (int): number of videos recoded at the same time (0 for number of CPU)
+        state_file (str): path of file for saving the state of queue (for resuming an interrupted queue)
+
     Returns:
-        bool: True
+        bool: True if all videos were recoded
     """
 
-    for video_path in video_paths:
-        ffmpeg_command = ('"{ffmpeg_bin}" -y -i "{input_}" '
-                          '-vf scale={horiz_resol}:-1 -b 2000k '
-                          '"{input_}.re-encoded.{horiz_resol}px.avi" ').format(ffmpeg_bin=ffmpeg_bin,
-                                                                               input_=video_path,
-                                                                               horiz_resol=horiz_resol)
-        p = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        p.communicate()
+    queue = ffmpeg_jobs.JobQueue(ffmpeg_jobs.recode_jobs(video_paths, horiz_resol, ffmpeg_bin),
+                                 max_workers=max_workers,
+                                 state_file=state_file)
+    queue.start()
+    queue.wait()
 
-    return True
+    return queue.count(ffmpeg_jobs.DONE) == len(queue.jobs)
 
 
 def convert_time_to_decimal(pj):
@@ -105,14 +102,30 @@ def convert_time_to_decimal(pj):
     """
 
     for obsId in pj[OBSERVATIONS]:
-        if "time offset" in pj[OBSERVATIONS][obsId]:
-            pj[OBSERVATIONS][obsId]["time offset"] = Decimal(str(pj[OBSERVATIONS][obsId]["time offset"]))
-        for idx, event in enumerate(pj[OBSERVATIONS][obsId][EVENTS]):
-            pj[OBSERVATIONS][obsId][EVENTS][idx][pj_obs_fields["time"]] = Decimal(str(pj[OBSERVATIONS][obsId][EVENTS][idx][pj_obs_fields["time"]]))
+        observation_time_to_decimal(pj[OBSERVATIONS][obsId])
 
     return pj
 
 
+def observation_time_to_decimal(observation):
+    """
+    convert time offset and time of events of observation from float to decimal
+
+    Args:
+        observation (dict): observation
+
+    Returns:
+        dict: observation
+    """
+
+    if "time offset" in observation:
+        observation["time offset"] = Decimal(str(observation["time offset"]))
+    for event in observation[EVENTS]:
+        event[pj_obs_fields["time"]] = Decimal(str(event[pj_obs_fields["time"]]))
+
+    return observation
+
+
 def file_content_md5(file_name):
     hash_md5 = hashlib.md5()
     with open(file_name, "rb") as f:
@@ -143,44 +156,16 @@ def txt2np_array(file_name, columns_str, substract_first_value, converters = {},
     except:
         return False, "Problem with columns {}".format(columns_str), np.array([])
     
-    # check converters
-    np_converters = {}
-    for column_idx in column_converter:
-        if column_converter[column_idx] in converters:
-            
-            conv_name = column_converter[column_idx]
-            
-            function = """def {}(INPUT):\n""".format(conv_name)
-            function += """    INPUT = INPUT.decode("utf-8") if isinstance(INPUT, bytes) else INPUT"""
-            for line in converters[conv_name]["code"].split("\n"):
-                function += "    {}\n".format(line)
-            function += """    return OUTPUT"""
-
-            try:
-                exec(function)
-            except:
-                #print(sys.exc_info()[1])
-                return False, "error in converter", np.array([]) 
-            
-            np_converters[column_idx - 1] = locals()[conv_name]
-
-        else:
-            print("converter {} not found".format(converters_param[column_idx]))
-            return False, "converter not found", np.array([]) 
-
-    # snif txt file
-    with open(file_name) as csvfile:
-        buff = csvfile.read(1024)
-        snif = csv.Sniffer()
-        dialect = snif.sniff(buff)
-        has_header = snif.has_header(buff)
+    # check converters (compiled once and applied on whole columns)
+    ok, msg, column_converters = external_data.build_converters(converters, column_converter)
+    if not ok:
+        return False, msg, np.array([])
 
     try:
-        data = np.loadtxt(file_name,
-                          delimiter=dialect.delimiter,
-                          usecols=columns,
-                          skiprows=has_header,
-                          converters=np_converters)
+        # snif txt file
+        delimiter, has_header = external_data.sniff_txt_file(file_name)
+        chunks = list(external_data.read_chunks(file_name, columns, delimiter, has_header, column_converters))
+        data = np.concatenate(chunks) if chunks else np.array([])
     except:
         return False, sys.exc_info()[1], np.array([])
 
@@ -859,34 +844,3 @@ def behavior_color(colors_list, idx):
     """
 
     return colors_list[idx % len(colors_list)]
-
-
-class ThreadSignal(QObject):
-    sig = pyqtSignal(int, float, float, float, bool, bool, str, str, str)
-
-
-class Process(QThread):
-    """
-    process for accurate video analysis
-    """
-    def __init__(self, parent=None):
-        QThread.__init__(self, parent)
-        self.filePath = ''
-        self.ffmpeg_bin = ''
-        self.fileContentMD5 = ''
-        self.nPlayer = ''
-        self.filePath = ''
-        self.signal = ThreadSignal()
-
-    def run(self):
-        nframe, videoTime, videoDuration, fps, hasVideo, hasAudio = accurate_media_analysis(self.ffmpeg_bin,
-                                                                                            self.filePath)
-        self.signal.sig.emit(nframe,
-                             videoTime,
-                             videoDuration,
-                             fps,
-                             hasVideo,
-                             hasAudio,
-                             self.fileContentMD5,
-                             self.nPlayer,
-                             self.filePath)